@@ -0,0 +1,36 @@
+from django.utils.text import slugify
+
+
+def normalize_postcode(postcode):
+    """The form postcodes are stored and searched in: upper case, single spaces."""
+    return ' '.join((postcode or '').upper().split())
+
+
+def prefix_range(prefix):
+    """
+    Return (lower, upper) bounds matching every string that starts with
+    ``prefix``. Unlike ``startswith`` (a LIKE on most backends) a range
+    comparison can always use a plain b-tree index. Every string starts with
+    an empty prefix, so it has no upper bound: (``''``, None).
+    """
+    if not prefix:
+        return prefix, None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def filter_suppliers(queryset, subcategories=(), company_type=None, postcode=None):
+    slugs = [slug for slug in (slugify(name) for name in subcategories) if slug]
+    if slugs:
+        # Join through the (subcategory, supplier) index of the tag table so
+        # rare tags don't scan the supplier table; a supplier matching
+        # several of the tags must only be returned once.
+        queryset = queryset.filter(subcategory_tags__slug__in=slugs)
+        if len(slugs) > 1:
+            queryset = queryset.distinct()
+    if company_type:
+        queryset = queryset.filter(company_type=company_type)
+    postcode = normalize_postcode(postcode)
+    if postcode:
+        lower, upper = prefix_range(postcode)
+        queryset = queryset.filter(company_postcode__gte=lower, company_postcode__lt=upper)
+    return queryset
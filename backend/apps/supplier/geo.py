@@ -0,0 +1,201 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Q
+
+from apps.users.metrics import record_cache
+from apps.users.models import Supplier
+
+from .filters import normalize_postcode, prefix_range
+from .models import Postcode
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+
+# Precision of Supplier.company_geohash (about 5m); searches use prefixes.
+SUPPLIER_GEOHASH_PRECISION = 9
+# Searches widen no further than precision 3 cells (about 156km across):
+# coarser ones would load most of the table.
+SEARCH_PRECISIONS = (6, 5, 4, 3)
+# Most suppliers a search loads; past it, it returns the nearest of those.
+MAX_NEAREST_CANDIDATES = 10000
+
+NEAREST_CACHE_PREFIX = 'supplier:nearest:'
+NEAREST_VERSION_KEY = 'supplier:nearest:version'
+
+
+def postcode_district(postcode):
+    """
+    The area nearest-supplier results are cached for: the outward code of
+    postcodes written with a space ("SW1A 1AA" -> "SW1A"), otherwise the
+    whole postcode (Australian postcodes already name a district).
+    """
+    return normalize_postcode(postcode).split(' ')[0]
+
+
+def geohash_encode(latitude, longitude, precision):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range, lon_range
+
+
+def geohash_decode(geohash):
+    (lat_min, lat_max), (lon_min, lon_max) = geohash_bounds(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def geohash_cells_around(geohash):
+    """The cell itself and its eight neighbours."""
+    (lat_min, lat_max), (lon_min, lon_max) = geohash_bounds(geohash)
+    height, width = lat_max - lat_min, lon_max - lon_min
+    latitude, longitude = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+    cells = []
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            cell_lat = latitude + d_lat * height
+            if not -90 < cell_lat < 90:
+                continue
+            cell_lon = (longitude + d_lon * width + 180) % 360 - 180
+            cell = geohash_encode(cell_lat, cell_lon, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def covered_radius_km(geohash):
+    """
+    Every point within this distance of any point in ``geohash`` lies in the
+    cell or one of its neighbours: the smaller of the cell's height and width.
+    """
+    (lat_min, lat_max), (lon_min, lon_max) = geohash_bounds(geohash)
+    widest_latitude = max(abs(lat_min), abs(lat_max))
+    height_km = math.radians(lat_max - lat_min) * EARTH_RADIUS_KM
+    width_km = math.radians(lon_max - lon_min) * EARTH_RADIUS_KM * math.cos(math.radians(widest_latitude))
+    return min(height_km, width_km)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def geocode_suppliers(suppliers):
+    """
+    Set company_geohash from the postcode table on the given suppliers where
+    it is out of date ('' for postcodes that aren't in the table).
+    """
+    suppliers = list(suppliers)
+    coordinates = {
+        postcode: (latitude, longitude)
+        for postcode, latitude, longitude in Postcode.objects.filter(
+            postcode__in={normalize_postcode(supplier.company_postcode) for supplier in suppliers},
+        ).values_list('postcode', 'latitude', 'longitude')
+    }
+    changed = 0
+    for supplier in suppliers:
+        point = coordinates.get(normalize_postcode(supplier.company_postcode))
+        geohash = geohash_encode(*point, SUPPLIER_GEOHASH_PRECISION) if point else ''
+        if geohash != supplier.company_geohash:
+            Supplier.objects.filter(pk=supplier.pk).update(company_geohash=geohash)
+            supplier.company_geohash = geohash
+            changed += 1
+    if changed:
+        invalidate_nearest()
+    return changed
+
+
+def district_centre(district):
+    centre = Postcode.objects.filter(district=district).aggregate(
+        latitude=Avg('latitude'), longitude=Avg('longitude'))
+    if centre['latitude'] is None:
+        return None
+    return centre['latitude'], centre['longitude']
+
+
+def find_nearest(latitude, longitude, limit):
+    """
+    Return up to ``limit`` (supplier pk, distance in km) pairs, nearest first.
+
+    Starts with the fine geohash cell around the point and its neighbours
+    and only widens to coarser cells while it has fewer than ``limit``
+    candidates, or while the furthest of them could be beaten by a supplier
+    outside the searched cells. Stops at the coarsest of SEARCH_PRECISIONS
+    or after loading MAX_NEAREST_CANDIDATES suppliers, with what it found.
+    """
+    nearest = []
+    for precision in SEARCH_PRECISIONS:
+        centre = geohash_encode(latitude, longitude, precision)
+        cells = Q()
+        for cell in geohash_cells_around(centre):
+            lower, upper = prefix_range(cell)
+            cells |= Q(company_geohash__gte=lower, company_geohash__lt=upper)
+        candidates = list(Supplier.objects.filter(cells).values_list('pk', 'company_geohash')[:MAX_NEAREST_CANDIDATES])
+        nearest = sorted(
+            (haversine_km(latitude, longitude, *geohash_decode(geohash)), pk) for pk, geohash in candidates
+        )[:limit]
+        if len(candidates) >= MAX_NEAREST_CANDIDATES:
+            break
+        if len(nearest) >= limit and nearest[-1][0] <= covered_radius_km(centre):
+            break
+    return [(pk, round(distance, 3)) for distance, pk in nearest]
+
+
+def nearest_suppliers(postcode, limit):
+    """
+    Nearest suppliers to the centre of ``postcode``'s district, cached per
+    district until a supplier's location changes. None if the district is
+    not in the postcode table.
+    """
+    district = postcode_district(postcode)
+    version = cache.get_or_set(NEAREST_VERSION_KEY, 1, None)
+    key = f'{NEAREST_CACHE_PREFIX}{version}:{district}:{limit}'
+    results = cache.get(key)
+    record_cache('nearest_suppliers', results is not None)
+    if results is None:
+        centre = district_centre(district)
+        if centre is None:
+            return None
+        results = find_nearest(*centre, limit)
+        cache.set(key, results, settings.NEAREST_SUPPLIERS_CACHE_TIMEOUT)
+    return results
+
+
+def invalidate_nearest():
+    # Bumping the version orphans every cached district at once.
+    try:
+        cache.incr(NEAREST_VERSION_KEY)
+    except ValueError:
+        cache.set(NEAREST_VERSION_KEY, 1, None)
@@ -0,0 +1,59 @@
+import random
+
+from django.core.cache import cache
+
+from apps.supplier.search import get_search_backend
+from apps.users.benchmark import BenchmarkCommand, measure
+
+
+SYLLABLES = ['box', 'pak', 'ra', 'to', 'mi', 'ler', 'son', 'cra', 'te', 'pal', 'let', 'wo',
+             'od', 'fre', 'ight', 'an', 'el', 'ca', 'ro', 'lin', 'di', 'ver', 'sa', 'mo']
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark the supplier full-text search backend over synthetic documents.'
+    default_iterations = 200
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--documents', type=int, default=1_000_000)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+
+    def run_benchmark(self, iterations, documents, vocabulary, **options):
+        rng = random.Random(0)
+        words = sorted({
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(vocabulary)
+        })
+
+        def document(pk):
+            name = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            description = ' '.join(rng.choice(words) for _ in range(rng.randint(6, 20)))
+            return pk, name.title(), description
+
+        backend = get_search_backend()
+        self.stdout.write(f'Indexing {documents} documents with {type(backend).__name__}...')
+        backend.index_documents(document(pk) for pk in range(1, documents + 1))
+
+        samples = rng.sample([word for word in words if len(word) >= 6], 50)
+
+        def typo(word):
+            position = rng.randrange(1, len(word))
+            return word[:position] + word[position + 1:]
+
+        queries = {
+            'single term': samples,
+            'prefix': [word[:4] for word in samples],
+            'two terms': [f'{a} {b}' for a, b in zip(samples, reversed(samples))],
+            'typo (one deletion)': [typo(word) for word in samples],
+            'no match': ['zzzzqq'] * len(samples),
+        }
+        # The first typo lookup for a letter loads that part of the
+        # vocabulary into the cache; report it separately from steady state.
+        cache.clear()
+        cold = iter(queries['typo (one deletion)'])
+        self.report('typo, cold vocabulary cache', *measure(lambda: backend.search(next(cold), limit=20), len(samples)))
+
+        for label, terms in queries.items():
+            cycle = iter(terms * (iterations // len(terms) + 1))
+            self.report(label, *measure(lambda: backend.search(next(cycle), limit=20), iterations))
@@ -0,0 +1,75 @@
+import random
+
+from apps.supplier.filters import filter_suppliers
+from apps.supplier.tags import sync_supplier_tags
+from apps.users.benchmark import BenchmarkCommand, measure
+from apps.users.models import CustomUser, Supplier
+
+
+SUBCATEGORIES = [
+    'Cardboard boxes', 'Crates', 'Pallets', 'Bubble wrap', 'Tape', 'Labels', 'Mailers',
+    'Cold chain', 'Freight', 'Couriers', 'Warehousing', 'Shrink wrap', 'Foam inserts',
+]
+COMPANY_TYPES = ['Manufacturer', 'Wholesaler', 'Logistics', 'Retailer', 'Printer']
+
+
+class Command(BenchmarkCommand):
+    help = 'Benchmark supplier search filters over synthetic suppliers.'
+    default_iterations = 100
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--suppliers', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def run_benchmark(self, iterations, suppliers, batch_size, **options):
+        rng = random.Random(0)
+        self.stdout.write(f'Creating {suppliers} suppliers...')
+        for offset in range(0, suppliers, batch_size):
+            count = min(batch_size, suppliers - offset)
+            users = CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=f'supplier{i}@example.com', email=f'supplier{i}@example.com',
+                    user_type='supplier', password='!', first_name='Bench', last_name=str(i),
+                    number='0400000000', address='1 Bench St', postcode=str(rng.randint(2000, 7999)),
+                )
+                for i in range(offset, offset + count)
+            ])
+            user_ids = CustomUser.objects.filter(
+                email__in=[user.email for user in users]).values_list('pk', flat=True)
+            created = Supplier.objects.bulk_create([
+                Supplier(
+                    user_id=user_id, company_name=f'Supplier {user_id}', company_number=str(user_id),
+                    company_address='1 Bench St', company_postcode=str(rng.randint(2000, 7999)),
+                    company_type=rng.choice(COMPANY_TYPES), company_description='Synthetic supplier',
+                    company_logo='', subcategories=', '.join(
+                        rng.sample(SUBCATEGORIES, 3) + (['Anti-static bags'] if rng.random() < 0.001 else [])),
+                )
+                for user_id in user_ids
+            ])
+            sync_supplier_tags(created)
+
+        queryset = Supplier.objects.order_by('pk')
+        cases = [
+            ('rare subcategory', {'subcategories': ['anti-static bags']},
+             queryset.filter(subcategories__icontains='anti-static bags')),
+            ('subcategory', {'subcategories': ['cold chain']},
+             queryset.filter(subcategories__icontains='cold chain')),
+            ('subcategory + type', {'subcategories': ['pallets'], 'company_type': 'Logistics'},
+             queryset.filter(subcategories__icontains='pallets', company_type='Logistics')),
+            ('postcode prefix', {'postcode': '30'},
+             queryset.filter(company_postcode__startswith='30')),
+            ('all filters', {'subcategories': ['crates', 'tape'], 'company_type': 'Wholesaler', 'postcode': '4'},
+             queryset.filter(subcategories__iregex='crates|tape', company_type='Wholesaler',
+                             company_postcode__startswith='4')),
+        ]
+        for label, filters, legacy in cases:
+            indexed = filter_suppliers(queryset, **filters)
+            self.report(f'{label} (LIKE scan)', *measure(lambda: list(legacy[:20]), iterations))
+            self.report(f'{label} (indexed)', *measure(lambda: list(indexed[:20]), iterations))
+
+        # A deep page: OFFSET has to walk every skipped row, the keyset
+        # cursor starts from an index seek.
+        middle = queryset.values_list('pk', flat=True)[suppliers // 2]
+        self.report('page at 50% (OFFSET)', *measure(lambda: list(queryset[suppliers // 2:suppliers // 2 + 20]), iterations))
+        self.report('page at 50% (keyset)', *measure(lambda: list(queryset.filter(pk__gt=middle)[:20]), iterations))
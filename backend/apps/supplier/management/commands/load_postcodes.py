@@ -0,0 +1,79 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.supplier.geo import geocode_suppliers, normalize_postcode, postcode_district
+from apps.supplier.models import Postcode
+from apps.users.importing import chunked
+from apps.users.models import Supplier
+
+
+COLUMN_NAMES = {
+    'postcode': ('postcode', 'pcd', 'zip'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'long', 'lon', 'lng'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Load postcode coordinates from a CSV file and place suppliers on them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with postcode, latitude and longitude columns.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--skip-suppliers', action='store_true',
+                            help="Don't recompute supplier geohashes afterwards.")
+
+    def handle(self, path, chunk_size, skip_suppliers, **options):
+        start = time.perf_counter()
+        loaded = skipped = 0
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            columns = self.resolve_columns(reader.fieldnames or [])
+            for chunk in chunked(reader, chunk_size):
+                postcodes = {}
+                for row in chunk:
+                    try:
+                        postcode = normalize_postcode(row[columns['postcode']])
+                        latitude = float(row[columns['latitude']])
+                        longitude = float(row[columns['longitude']])
+                    except (TypeError, ValueError):
+                        skipped += 1
+                        continue
+                    if not postcode or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                        skipped += 1
+                        continue
+                    postcodes[postcode] = Postcode(
+                        postcode=postcode, district=postcode_district(postcode),
+                        latitude=latitude, longitude=longitude,
+                    )
+                with transaction.atomic():
+                    Postcode.objects.bulk_create(
+                        postcodes.values(), update_conflicts=True, unique_fields=['postcode'],
+                        update_fields=['district', 'latitude', 'longitude'],
+                    )
+                loaded += len(postcodes)
+        self.stdout.write(
+            f'Loaded {loaded} postcodes in {time.perf_counter() - start:.1f}s ({skipped} rows skipped)'
+        )
+
+        if not skip_suppliers:
+            changed = 0
+            queryset = Supplier.objects.only('pk', 'company_postcode', 'company_geohash')
+            for suppliers in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+                changed += geocode_suppliers(suppliers)
+            self.stdout.write(f'Updated the location of {changed} suppliers')
+
+    def resolve_columns(self, fieldnames):
+        lowered = {name.strip().lower(): name for name in fieldnames}
+        columns = {}
+        for column, aliases in COLUMN_NAMES.items():
+            for alias in aliases:
+                if alias in lowered:
+                    columns[column] = lowered[alias]
+                    break
+            else:
+                raise CommandError(f'No {column} column in the CSV header ({", ".join(fieldnames)}).')
+        return columns
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.supplier.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the supplier full-text search index from the Supplier table.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(f'Rebuilt the supplier search index with {type(backend).__name__}.')
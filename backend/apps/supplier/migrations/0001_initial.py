@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0009_supplier_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subcategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('suppliers', models.ManyToManyField(blank=True, related_name='subcategory_tags', to='users.supplier')),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+import re
+
+from django.db import migrations
+from django.utils.text import slugify
+
+
+BATCH_SIZE = 1000
+
+SEPARATORS = re.compile(r'[,;|\n]+')
+
+
+# A frozen copy of apps.supplier.tags.normalize_subcategories, so later
+# changes to it don't change what this migration does.
+def normalize_subcategories(text):
+    tags = {}
+    for part in SEPARATORS.split(text or ''):
+        name = ' '.join(part.split())
+        slug = slugify(name)[:100]
+        if slug and slug not in tags:
+            tags[slug] = name[:100]
+    return tags
+
+
+def backfill_subcategories(apps, schema_editor):
+    Supplier = apps.get_model('users', 'Supplier')
+    Subcategory = apps.get_model('supplier', 'Subcategory')
+    Through = Subcategory.suppliers.through
+
+    tag_ids = {}
+    links = []
+    for supplier_id, text in Supplier.objects.values_list('pk', 'subcategories').iterator(chunk_size=BATCH_SIZE):
+        for slug, name in normalize_subcategories(text).items():
+            if slug not in tag_ids:
+                tag_ids[slug] = Subcategory.objects.get_or_create(slug=slug, defaults={'name': name})[0].pk
+            links.append(Through(supplier_id=supplier_id, subcategory_id=tag_ids[slug]))
+        if len(links) >= BATCH_SIZE:
+            Through.objects.bulk_create(links, ignore_conflicts=True)
+            links = []
+    Through.objects.bulk_create(links, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplier', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_subcategories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Only SQLite gets an FTS5 index; other databases use the
+    # DatabaseSearchBackend fallback (see apps.supplier.search).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE supplier_search_fts USING fts5("
+        "company_name, company_description, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute("CREATE VIRTUAL TABLE supplier_search_vocab USING fts5vocab(supplier_search_fts, 'row')")
+    schema_editor.execute(
+        "INSERT INTO supplier_search_fts (rowid, company_name, company_description) "
+        "SELECT user_id, company_name, company_description FROM users_supplier"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS supplier_search_vocab")
+    schema_editor.execute("DROP TABLE IF EXISTS supplier_search_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplier', '0002_backfill_subcategories'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
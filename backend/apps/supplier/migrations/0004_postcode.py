@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplier', '0003_supplier_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Postcode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postcode', models.CharField(max_length=20, unique=True)),
+                ('district', models.CharField(db_index=True, max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+        ),
+    ]
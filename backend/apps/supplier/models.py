@@ -1,3 +1,30 @@
 from django.db import models
 
-# Create your models here.
+
+class Subcategory(models.Model):
+    """
+    A normalized subcategory tag. Suppliers enter subcategories as free text;
+    apps.supplier.tags splits that into tags so search can filter on an
+    indexed join instead of a LIKE over Supplier.subcategories.
+    """
+    slug = models.SlugField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
+    suppliers = models.ManyToManyField('users.Supplier', related_name='subcategory_tags', blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Postcode(models.Model):
+    """
+    Postcode centroids, loaded from an offline dataset with
+    ``manage.py load_postcodes``. Used to place suppliers and clients for
+    nearest-supplier lookups.
+    """
+    postcode = models.CharField(max_length=20, unique=True)
+    district = models.CharField(max_length=20, db_index=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return self.postcode
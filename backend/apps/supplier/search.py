@@ -0,0 +1,265 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+
+from apps.users.metrics import record_cache
+from apps.users.models import Supplier
+
+from .filters import prefix_range
+
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+VOCABULARY_CACHE_PREFIX = 'supplier:search:vocabulary:'
+
+
+def query_terms(query):
+    return [term.lower() for term in TERM_RE.findall(query or '')]
+
+
+def within_one_edit(a, b):
+    """True if ``a`` and ``b`` differ by at most one insertion, deletion,
+    substitution or adjacent transposition."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) != len(b):
+        return a[i:] == b[i + 1:]
+    return (
+        a[i + 1:] == b[i + 1:]
+        or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+    )
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between ``a`` and ``b`` (insertions,
+    deletions, substitutions and adjacent transpositions), or ``limit + 1``
+    as soon as it is known to exceed ``limit``. Only the diagonal band that
+    can stay within ``limit`` is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous2 = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, start=1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            char_b = b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if previous2 is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = min(value, over)
+        if min(current) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def within_edit_distance(a, b, limit):
+    if limit == 1:
+        return within_one_edit(a, b)
+    return edit_distance(a, b, limit) <= limit
+
+
+def typo_limit(term):
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+class SearchBackend:
+    """
+    Interface for the supplier search index. The index is kept up to date by
+    the signal handlers in apps.supplier.signals; ``search`` returns supplier
+    primary keys, best match first.
+    """
+
+    def index(self, suppliers):
+        self.index_documents(
+            (supplier.pk, supplier.company_name, supplier.company_description) for supplier in suppliers
+        )
+
+    def index_documents(self, documents):
+        """Add or replace (supplier pk, company name, description) documents."""
+
+    def remove(self, supplier_ids):
+        pass
+
+    def rebuild(self):
+        self.clear()
+        queryset = Supplier.objects.values_list('pk', 'company_name', 'company_description')
+        self.index_documents(queryset.iterator(chunk_size=2000))
+
+    def clear(self):
+        pass
+
+    def search(self, query, limit=20):
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Fallback for databases without a full-text index: unindexed icontains,
+    name matches ranked above description matches. No typo tolerance.
+    """
+
+    def search(self, query, limit=20):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        queryset = Supplier.objects.all()
+        name_match = Q()
+        for term in terms:
+            queryset = queryset.filter(Q(company_name__icontains=term) | Q(company_description__icontains=term))
+            name_match &= Q(company_name__icontains=term)
+        queryset = queryset.annotate(
+            name_rank=Case(When(name_match, then=Value(0)), default=Value(1), output_field=IntegerField()),
+        )
+        return list(queryset.order_by('name_rank', 'pk').values_list('pk', flat=True)[:limit])
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    SQLite FTS5 index over company_name and company_description, ranked with
+    bm25 (name weighted over description). Every query term also matches as a
+    prefix. Terms of four or more characters that are not the prefix of any
+    indexed term are widened to the indexed terms within one edit (two for
+    eight or more characters), taken from the fts5vocab table.
+    """
+
+    table = 'supplier_search_fts'
+    vocab_table = 'supplier_search_vocab'
+    weights = (10.0, 1.0)
+    max_candidates = 1000
+    # Typo corrections considered per first letter and term length.
+    vocabulary_size = 5000
+    batch_size = 2000
+
+    def index_documents(self, documents):
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _write(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [(document[0],) for document in documents],
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, company_name, company_description) VALUES (%s, %s, %s)',
+                documents,
+            )
+
+    def remove(self, supplier_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in supplier_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, query, limit=20):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        # Terms nothing in the index starts with are probably typos; widen
+        # those to close vocabulary terms instead of matching nothing.
+        alternatives = [[term] if self._is_indexed_prefix(term) else self._expand(term) for term in terms]
+        # The typed term matches as a prefix, typo corrections as whole terms.
+        match = ' AND '.join(
+            '(' + ' OR '.join([f'"{group[0]}"*'] + [f'"{term}"' for term in group[1:]]) + ')'
+            for group in alternatives
+        )
+        return self._match(match, limit)
+
+    def _match(self, match, limit):
+        # Only the first max_candidates matches are scored, which bounds the
+        # cost of very broad queries (short prefixes) at the price of an
+        # approximate top N for them.
+        name_weight, description_weight = self.weights
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM ('
+                f'SELECT rowid, bm25({self.table}, {name_weight}, {description_weight}) AS score '
+                f'FROM {self.table} WHERE {self.table} MATCH %s LIMIT %s'
+                f') ORDER BY score LIMIT %s',
+                [match, self.max_candidates, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _is_indexed_prefix(self, term):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {self.vocab_table} WHERE term >= %s AND term < %s LIMIT 1',
+                list(prefix_range(term)),
+            )
+            return cursor.fetchone() is not None
+
+    def _expand(self, term):
+        """Return ``term`` followed by indexed terms within its typo limit."""
+        limit = typo_limit(term)
+        if not limit:
+            return [term]
+        vocabulary = self._vocabulary(term[0], range(len(term) - limit, len(term) + limit + 1))
+        # One edit changes the set of characters used by at most two, which
+        # rules out most candidates before the edit distance is computed.
+        characters = set(term)
+        return [term] + [
+            candidate
+            for candidate in vocabulary
+            if len(characters.symmetric_difference(candidate)) <= 2 * limit
+            and within_edit_distance(term, candidate, limit)
+        ]
+
+    def _vocabulary(self, first_letter, lengths):
+        # Typos rarely hit the first letter, so only indexed terms sharing it,
+        # of the lengths within the typo limit, are compared. Each (letter,
+        # length) list is cached on its own and holds at most vocabulary_size
+        # terms, those in the most documents, so entries stay small however
+        # large the index grows. Until an entry expires, new terms are still
+        # found by exact and prefix matching, just not as typo corrections.
+        keys = {f'{VOCABULARY_CACHE_PREFIX}{first_letter}:{length}': length for length in lengths}
+        cached = cache.get_many(list(keys))
+        missing = {}
+        for key, length in keys.items():
+            record_cache('search_vocabulary', key in cached)
+            if key not in cached:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'SELECT term FROM {self.vocab_table} WHERE term >= %s AND term < %s AND length(term) = %s '
+                        f'ORDER BY doc DESC, term LIMIT %s',
+                        list(prefix_range(first_letter)) + [length, self.vocabulary_size],
+                    )
+                    missing[key] = [row[0] for row in cursor.fetchall()]
+        if missing:
+            cache.set_many(missing, settings.SUPPLIER_SEARCH_VOCABULARY_TIMEOUT)
+        return [term for key in keys for term in cached.get(key, missing.get(key, ()))]
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    path = settings.SUPPLIER_SEARCH_BACKEND
+    if path is None:
+        path = (
+            'apps.supplier.search.SQLiteFTS5Backend' if connection.vendor == 'sqlite'
+            else 'apps.supplier.search.DatabaseSearchBackend'
+        )
+    return import_string(path)()
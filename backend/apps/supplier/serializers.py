@@ -0,0 +1,15 @@
+from rest_framework import serializers
+
+from apps.users.logos import LogoVariantsField
+from apps.users.models import Supplier
+
+
+class SupplierSearchSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='pk', read_only=True)
+    subcategory_tags = serializers.SlugRelatedField(slug_field='slug', many=True, read_only=True)
+    company_logo_variants = LogoVariantsField()
+
+    class Meta:
+        model = Supplier
+        fields = ['id', 'company_name', 'company_address', 'company_postcode', 'company_type', 'company_description', 'company_logo', 'company_logo_variants', 'subcategories', 'subcategory_tags']
+        read_only_fields = fields
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.users.models import Supplier
+
+from .geo import geocode_suppliers, invalidate_nearest
+from .search import get_search_backend
+from .tags import sync_supplier_tags
+
+
+SEARCH_FIELDS = {'company_name', 'company_description'}
+
+
+@receiver(post_save, sender=Supplier)
+def update_subcategory_tags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'subcategories' in update_fields:
+        sync_supplier_tags([instance])
+
+
+@receiver(post_save, sender=Supplier)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Supplier)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Supplier)
+def update_geohash(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'company_postcode' in update_fields:
+        geocode_suppliers([instance])
+
+
+@receiver(post_delete, sender=Supplier)
+def forget_nearest(sender, instance, **kwargs):
+    if instance.company_geohash:
+        invalidate_nearest()
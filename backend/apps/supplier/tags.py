@@ -0,0 +1,43 @@
+import re
+
+from django.utils.text import slugify
+
+from .models import Subcategory
+
+
+SEPARATORS = re.compile(r'[,;|\n]+')
+
+
+def normalize_subcategories(text):
+    """Split free-text subcategories into unique {slug: display name} pairs."""
+    tags = {}
+    for part in SEPARATORS.split(text or ''):
+        name = ' '.join(part.split())
+        slug = slugify(name)[:100]
+        if slug and slug not in tags:
+            tags[slug] = name[:100]
+    return tags
+
+
+def get_or_create_tags(tags):
+    """Return {slug: Subcategory} for the given {slug: name} pairs, creating missing ones."""
+    existing = {tag.slug: tag for tag in Subcategory.objects.filter(slug__in=list(tags))}
+    missing = [Subcategory(slug=slug, name=name) for slug, name in tags.items() if slug not in existing]
+    if missing:
+        Subcategory.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update({tag.slug: tag for tag in Subcategory.objects.filter(slug__in=[tag.slug for tag in missing])})
+    return existing
+
+
+def sync_supplier_tags(suppliers):
+    """Replace the subcategory tags of the given suppliers with their parsed subcategories."""
+    parsed = {supplier.pk: normalize_subcategories(supplier.subcategories) for supplier in suppliers}
+    tags = get_or_create_tags({slug: name for supplier_tags in parsed.values() for slug, name in supplier_tags.items()})
+
+    through = Subcategory.suppliers.through
+    through.objects.filter(supplier_id__in=list(parsed)).delete()
+    through.objects.bulk_create([
+        through(supplier_id=supplier_id, subcategory_id=tags[slug].pk)
+        for supplier_id, supplier_tags in parsed.items()
+        for slug in supplier_tags
+    ])
@@ -1,3 +1,149 @@
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import CustomUser, Supplier
+from apps.users.serializers import SupplierImportSerializer
+
+from .filters import filter_suppliers, prefix_range
+from .geo import SUPPLIER_GEOHASH_PRECISION, find_nearest, geohash_encode
+from .search import VOCABULARY_CACHE_PREFIX, SQLiteFTS5Backend
+
+
+class SupplierFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='supplier@example.com', email='supplier@example.com', user_type='supplier')
+        cls.supplier = Supplier.objects.create(
+            user=cls.user, company_name='Pipes & Co', company_number='12345678', company_address='3 Industrial Rd',
+            company_postcode='3000', company_type='plumbing', company_description='Plumbing.',
+            company_logo='logos/pipes.png', subcategories='gas',
+        )
+
+    def test_prefix_range(self):
+        self.assertEqual(prefix_range('30'), ('30', '31'))
+        self.assertEqual(prefix_range(''), ('', None))
+
+    def test_blank_postcode_ignored(self):
+        for postcode in ('', ' ', None):
+            self.assertEqual(list(filter_suppliers(Supplier.objects.all(), postcode=postcode)), [self.supplier])
+        self.assertEqual(list(filter_suppliers(Supplier.objects.all(), postcode=' 30 ')), [self.supplier])
+        self.assertEqual(list(filter_suppliers(Supplier.objects.all(), postcode='31')), [])
+
+    def test_search_blank_postcode(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('supplier-search'), {'postcode': ' '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_postcode_normalized(self):
+        serializer = SupplierImportSerializer(data={
+            'company_name': 'Wires Ltd', 'company_number': '87654321', 'company_address': '1 Mill Lane',
+            'company_postcode': ' sw1a   1aa ', 'company_type': 'electrical', 'company_description': 'Wiring.',
+            'subcategories': 'lighting', 'email': 'wires@example.com', 'first_name': 'Ada', 'last_name': 'Lee',
+            'number': '0400000000', 'address': '1 Mill Lane', 'postcode': 'SW1A 1AA', 'dob': '1990-01-01',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['company_postcode'], 'SW1A 1AA')
+
+    def test_postcode_backfill(self):
+        Supplier.objects.filter(pk=self.supplier.pk).update(company_postcode=' sw1a  1aa')
+        migration = import_module('apps.users.migrations.0018_normalize_company_postcode')
+        migration.normalize_company_postcodes(apps, None)
+        self.assertEqual(list(filter_suppliers(Supplier.objects.all(), postcode='sw1a 1')), [self.supplier])
+
+
+class SQLiteFTS5BackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.suppliers = {}
+        for name, description in [
+            ('Harbour Freight', 'Pallets and crates moved by plumbers.'),
+            ('Plumbers Direct', 'Pipes and fittings.'),
+            ('Pallet Masters', 'Pallets, pallet racking and plumbing for warehouses.'),
+        ]:
+            email = f'{name.split()[0].lower()}@example.com'
+            user = CustomUser.objects.create(username=email, email=email, user_type='supplier')
+            cls.suppliers[name] = Supplier.objects.create(
+                user=user, company_name=name, company_number='12345678', company_address='1 Dock Rd',
+                company_postcode='3000', company_type='logistics', company_description=description,
+                company_logo='logos/logo.png', subcategories='freight',
+            ).pk
+
+    def setUp(self):
+        cache.clear()
+        self.backend = SQLiteFTS5Backend()
+
+    def test_name_matches_ranked_first(self):
+        self.assertEqual(
+            self.backend.search('plumbers'), [self.suppliers['Plumbers Direct'], self.suppliers['Harbour Freight']],
+        )
+
+    def test_prefix_match(self):
+        self.assertEqual(self.backend.search('harb'), [self.suppliers['Harbour Freight']])
+
+    def test_typo_matches_close_terms(self):
+        self.assertEqual(self.backend.search('fittigns'), [self.suppliers['Plumbers Direct']])
+        # Corrected terms match whole, not as prefixes of longer ones.
+        self.assertEqual(self.backend.search('palet'), [self.suppliers['Pallet Masters']])
+        self.assertEqual(self.backend.search('xyzzy'), [])
+
+    def test_vocabulary_bounded(self):
+        # Only the terms in the most documents are kept per letter and length.
+        self.backend.vocabulary_size = 1
+        self.assertEqual(self.backend._vocabulary('p', [7]), ['pallets'])
+        self.assertEqual(cache.get(f'{VOCABULARY_CACHE_PREFIX}p:7'), ['pallets'])
+        self.assertEqual(self.backend._vocabulary('p', [7]), ['pallets'])
+
+
+class FindNearestTests(TestCase):
+    # Melbourne.
+    origin = (-37.8136, 144.9631)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.suppliers = {}
+        for name, latitude, longitude in [
+            ('near', -37.8046, 144.9631),   # 1km north
+            ('town', -37.7236, 144.9631),   # 10km north
+            ('far', -38.2636, 144.9631),    # 50km south
+            ('sydney', -33.8688, 151.2093),  # over 700km away
+        ]:
+            email = f'{name}@example.com'
+            user = CustomUser.objects.create(username=email, email=email, user_type='supplier')
+            supplier = Supplier.objects.create(
+                user=user, company_name=name.title(), company_number='12345678', company_address='1 Main St',
+                company_postcode='3000', company_type='logistics', company_description='Freight.',
+                company_logo='logos/logo.png', subcategories='freight',
+            )
+            Supplier.objects.filter(pk=supplier.pk).update(
+                company_geohash=geohash_encode(latitude, longitude, SUPPLIER_GEOHASH_PRECISION),
+            )
+            cls.suppliers[name] = supplier.pk
+
+    def nearest(self, limit):
+        return [pk for pk, distance in find_nearest(*self.origin, limit)]
+
+    def test_nearest_first(self):
+        self.assertEqual(self.nearest(1), [self.suppliers['near']])
+        results = find_nearest(*self.origin, 2)
+        self.assertEqual([pk for pk, distance in results], [self.suppliers['near'], self.suppliers['town']])
+        self.assertAlmostEqual(results[0][1], 1, delta=0.1)
+
+    def test_widens_to_coarser_cells(self):
+        self.assertEqual(self.nearest(3), [self.suppliers['near'], self.suppliers['town'], self.suppliers['far']])
+
+    def test_stops_at_coarsest_precision(self):
+        self.assertNotIn(self.suppliers['sydney'], self.nearest(10))
 
-# Create your tests here.
+    def test_candidates_capped(self):
+        # Precision 4 loads two candidates, reaching the cap; precision 3
+        # isn't searched.
+        with mock.patch('apps.supplier.geo.MAX_NEAREST_CANDIDATES', 2), self.assertNumQueries(3):
+            self.assertEqual(len(self.nearest(3)), 2)
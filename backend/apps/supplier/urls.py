@@ -1,3 +1,9 @@
 from django.urls import path
 
-urlpatterns = []
\ No newline at end of file
+from .views import NearestSuppliersView, SupplierSearchView, SupplierTextSearchView
+
+urlpatterns = [
+    path('search/', SupplierSearchView.as_view(), name='supplier-search'),
+    path('search/text/', SupplierTextSearchView.as_view(), name='supplier-text-search'),
+    path('nearest/', NearestSuppliersView.as_view(), name='supplier-nearest'),
+]
@@ -1,3 +1,87 @@
-from django.shortcuts import render
+from rest_framework import generics, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from apps.users.models import Supplier
+from apps.users.representation import read_plan, represent
+
+from .filters import filter_suppliers
+from .geo import nearest_suppliers
+from .search import get_search_backend
+from .serializers import SupplierSearchSerializer
+
+
+class SupplierCursorPagination(CursorPagination):
+    # Keyset pagination on the primary key: every page is an index range
+    # scan, however deep the client pages.
+    ordering = 'pk'
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class SupplierSearchView(generics.ListAPIView):
+    """
+    GET /api/supplier/search/?subcategory=<tag>&subcategory=<tag>&company_type=<type>&postcode=<prefix>
+
+    Suppliers tagged with any of the given subcategories, of the given
+    company type, whose postcode starts with the given prefix.
+    """
+    serializer_class = SupplierSearchSerializer
+    pagination_class = SupplierCursorPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = filter_suppliers(
+            Supplier.objects.all(),
+            subcategories=params.getlist('subcategory'),
+            company_type=params.get('company_type'),
+            postcode=params.get('postcode'),
+        )
+        return queryset.prefetch_related('subcategory_tags')
+
+
+class SupplierTextSearchView(APIView):
+    """
+    GET /api/supplier/search/text/?q=<words>&limit=<n>
+
+    Ranked, prefix and typo tolerant search over company name and description.
+    """
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            limit = 20
+        supplier_ids = get_search_backend().search(request.query_params.get('q', ''), limit=limit)
+        suppliers = Supplier.objects.prefetch_related('subcategory_tags').in_bulk(supplier_ids)
+        ranked = [suppliers[pk] for pk in supplier_ids if pk in suppliers]
+        return Response({'results': read_plan(SupplierSearchSerializer).represent_many(ranked)})
+
+
+class NearestSuppliersView(APIView):
+    """
+    GET /api/supplier/nearest/?limit=<n>
+
+    Suppliers nearest to the signed-in user's postcode, closest first, with
+    their distance in km. Results are shared by every user in the same
+    postcode district.
+    """
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            limit = 10
+        nearest = nearest_suppliers(request.user.postcode, limit)
+        if nearest is None:
+            return Response({'detail': 'Your postcode could not be located.'}, status=status.HTTP_404_NOT_FOUND)
+        suppliers = Supplier.objects.prefetch_related('subcategory_tags').in_bulk([pk for pk, _ in nearest])
+        results = []
+        for pk, distance in nearest:
+            if pk in suppliers:
+                results.append(dict(represent(SupplierSearchSerializer, suppliers[pk]), distance_km=distance))
+        return Response({'results': results})
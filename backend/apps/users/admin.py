@@ -1,21 +1,179 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+
+from apps.supplier.search import get_search_backend
+
 from .models import CustomUser, Client, Supplier
 
-class CustomUserAdmin(admin.ModelAdmin):
+
+COMPANY_TYPE_CACHE_KEY = 'users:admin:company-types'
+
+
+def estimated_row_count(model, using='default'):
+    """The database's estimate of ``model``'s row count from its table
+    statistics (kept by autovacuum or ANALYZE), or None without any."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(table)])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # The first number of each of the table's rows is its row count.
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0]) if connection.vendor == 'sqlite' else int(row[0])
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    return estimate if estimate > 0 else None
+
+
+class AtLeast(int):
+    """A row count only known to be at least this many, shown as 10000+."""
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs a full COUNT(*). Unfiltered changelists use
+    the table statistics' row estimate once the table is past
+    ADMIN_EXACT_COUNT_LIMIT rows. Filtered ones, and tables without
+    statistics, count exactly up to that limit, or up to the page after
+    ``page_number`` if that is further; past it the count is an AtLeast,
+    so there is always a next page to go to.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, page_number=1):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.page_number = page_number
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        # Reading the requested page scans that far anyway.
+        limit = max(settings.ADMIN_EXACT_COUNT_LIMIT, (self.page_number + 1) * self.per_page)
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        count = queryset.order_by()[:limit + 1].count()
+        return AtLeast(limit) if count > limit else count
+
+
+class ScalableChangeListMixin:
+    """
+    Changelist settings for tables too big for the admin's defaults: the
+    estimated count paginator, no second COUNT(*) for "x of y selected",
+    and search through indexes only.
+
+    Django's search_fields run icontains on every field, a full scan of the
+    table (joined to the user table for user__ fields). Here a term with an
+    @ is matched case-insensitively against the LOWER(email) index, a number
+    against the primary key, and anything else by search_text().
+    ``search_fields`` only labels the search box.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Path from the admin's model to CustomUser.email.
+    email_field = 'email'
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        page_number = request.GET.get(PAGE_VAR, '')
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            page_number=int(page_number) if page_number.isdigit() else 1,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if '@' in term:
+            queryset = queryset.alias(search_email=Lower(self.email_field))
+            return queryset.filter(search_email=term.lower()), False
+        condition = self.search_text(term)
+        if term.isdigit():
+            condition |= Q(pk=int(term))
+        return queryset.filter(condition), False
+
+    def search_text(self, term):
+        return Q(pk__in=[])
+
+
+class CompanyTypeFilter(admin.SimpleListFilter):
+    """
+    The most common company types, rather than every distinct value of a
+    free-text column. The list is cached; filtering uses the
+    (company_type, user) index.
+    """
+    title = 'company type'
+    parameter_name = 'company_type'
+
+    def lookups(self, request, model_admin):
+        company_types = cache.get(COMPANY_TYPE_CACHE_KEY)
+        if company_types is None:
+            company_types = list(
+                Supplier.objects.values_list('company_type', flat=True)
+                .annotate(suppliers=Count('pk')).order_by('-suppliers', 'company_type')
+                [:settings.ADMIN_COMPANY_TYPE_FILTER_SIZE]
+            )
+            cache.set(COMPANY_TYPE_CACHE_KEY, company_types, settings.ADMIN_FILTER_CACHE_TIMEOUT)
+        return [(company_type, company_type) for company_type in company_types]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(company_type=self.value())
+        return queryset
+
+
+class CustomUserAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'user_type', 'is_staff', 'is_active')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    search_fields = ('email', 'username')
+    search_help_text = 'Email address, exact username or user ID.'
     list_filter = ('user_type', 'is_staff', 'is_active')
 
-class ClientAdmin(admin.ModelAdmin):
+    def search_text(self, term):
+        return Q(username=term)
+
+class ClientAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'company_name')
-    search_fields = ('user__username', 'user__email', 'company_name')
-    list_filter = ('company_name',)
+    # list_display shows the user through CustomUser.__str__.
+    list_select_related = ('user',)
+    search_fields = ('user__email',)
+    search_help_text = 'Email address or user ID.'
+    email_field = 'user__email'
 
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'company_name', 'company_number', 'company_address', 'company_postcode', 'company_type', 'company_description', 'company_logo', 'subcategories')
-    search_fields = ('user__username', 'user__email', 'company_name', 'company_number')
-    list_filter = ('company_name', 'company_type')
+    list_select_related = ('user',)
+    search_fields = ('user__email', 'company_name', 'company_description')
+    search_help_text = 'Email address, user ID, or words from the company name or description.'
+    list_filter = (CompanyTypeFilter,)
+    email_field = 'user__email'
+
+    def search_text(self, term):
+        # The supplier full-text index (apps.supplier.search).
+        return Q(pk__in=get_search_backend().search(term, limit=settings.ADMIN_SEARCH_LIMIT))
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Client, ClientAdmin)
-admin.site.register(Supplier, SupplierAdmin)
\ No newline at end of file
+admin.site.register(Supplier, SupplierAdmin)
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401
+        from .metrics import install_query_wrapper
+        from .querybudget import install_query_recorder
+
+        connection_created.connect(install_query_wrapper, dispatch_uid='users_metrics_query_wrapper')
+        if settings.QUERY_BUDGET_CHECKS:
+            connection_created.connect(install_query_recorder, dispatch_uid='users_query_recorder')
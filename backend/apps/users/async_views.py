@@ -0,0 +1,220 @@
+"""
+Async versions of the hottest users endpoints, for running under ASGI.
+
+Same URLs, request bodies and responses as the DRF views in apps.users.views
+(which they replace when USERS_ASYNC_VIEWS is set, see apps.users.urls), but
+plain Django async views: DRF's APIView can't be async, and under ASGI every
+sync view costs a thread hop. Database access uses the async ORM and cache;
+password hashing and QR code rendering go through run_blocking.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework import exceptions, status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import hashing
+from .authentication import StatelessJWTAuthentication
+from .backends import EmailMFABackend
+from .blocking import run_blocking
+from .membership import alookup_user_type
+from .metrics import timer
+from .mfa import QR_FORMATS, get_enrollment
+from .models import CustomUser
+from .profile import aget_profile
+from .serializers import MyTokenRefreshSerializer
+from .throttling import CheckIfClientThrottle
+from .tokens import BoxumRefreshToken, set_user_claims, token_users
+from .views import ServiceBusy, create_temp_mfa_token
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    The parts of APIView the async views need: token authentication,
+    permission and throttle checks, a parsed ``request.data`` and DRF-shaped
+    error responses. Like APIView, CSRF is not enforced.
+    """
+    authentication_class = None
+    authentication_required = False
+    throttle_classes = []
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            # As ShedHashingLoadMixin: 503 rather than queue for a hashing
+            # worker.
+            with hashing.shed_load():
+                await self.initial(request)
+                return await super().dispatch(request, *args, **kwargs)
+        except hashing.HashingBusy as exc:
+            return self.handle_exception(ServiceBusy(exc.wait))
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def initial(self, request):
+        request.user, request.auth = AnonymousUser(), None
+        if self.authentication_class is not None:
+            authenticator = self.authentication_class()
+            if hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(request)
+            if result is not None:
+                request.user, request.auth = result
+        if self.authentication_required and not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await throttle.aallow_request(request, self):
+                raise exceptions.Throttled(throttle.wait())
+        request.data = self.parse_body(request)
+
+    def parse_body(self, request):
+        if request.method in ('GET', 'HEAD'):
+            return {}
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError as exc:
+                raise exceptions.ParseError(f'JSON parse error - {exc}')
+        return request.POST
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            # As in APIView: 401 with a challenge, or 403 for views without
+            # authentication.
+            authenticate_header = self.get_authenticate_header()
+            if authenticate_header:
+                headers['WWW-Authenticate'] = authenticate_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False, headers=headers)
+        if getattr(exc, 'wait', None):
+            response.headers['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def get_authenticate_header(self):
+        if self.authentication_class is not None:
+            return self.authentication_class().authenticate_header(None)
+        return None
+
+
+class AsyncLoginView(AsyncAPIView):
+    """Async LoginWithMFAView."""
+    carries_secrets = True
+
+    async def post(self, request):
+        with timer('login_stage_seconds', stage='total'):
+            return await self.login(request)
+
+    async def login(self, request):
+        user = await EmailMFABackend().aauthenticate(
+            request, email=request.data.get('email'), password=request.data.get('password'),
+        )
+        if user is None:
+            return JsonResponse({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        if user.mfa_enabled:
+            with timer('login_stage_seconds', stage='token'):
+                temp_token = create_temp_mfa_token(user)
+            return JsonResponse({'detail': 'MFA required', 'temp_token': temp_token}, status=status.HTTP_202_ACCEPTED)
+        # Minting records the token with the blacklist backend, which may
+        # write to the database.
+        refresh = await sync_to_async(BoxumRefreshToken.for_user)(user, mfa_enabled=False)
+        return JsonResponse({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+
+class AsyncTokenRefreshView(AsyncAPIView):
+    """Async MyTokenRefreshView."""
+    carries_secrets = True
+
+    async def post(self, request):
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Rotation blacklists the old token; leave that to the serializer.
+            return await sync_to_async(self.rotate)(request.data)
+        if 'refresh' not in request.data:
+            return JsonResponse({'refresh': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = await BoxumRefreshToken.afrom_string(request.data['refresh'])
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+
+        # As MyTokenRefreshSerializer.validate.
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = await token_users().filter(**{api_settings.USER_ID_FIELD: user_id}).afirst() if user_id else None
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise exceptions.AuthenticationFailed(
+                MyTokenRefreshSerializer.default_error_messages['no_active_account'], 'no_active_account',
+            )
+        set_user_claims(refresh, user, user.mfa_enabled)
+        return JsonResponse({'access': str(refresh.access_token)})
+
+    def get_authenticate_header(self):
+        # Like simplejwt's TokenViewBase, answer bad tokens with a 401.
+        return JWTAuthentication().authenticate_header(None)
+
+    def rotate(self, data):
+        serializer = MyTokenRefreshSerializer(data=data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+        return JsonResponse(serializer.validated_data)
+
+
+class AsyncUserDetailsView(AsyncAPIView):
+    """Async UserDetailsView."""
+    authentication_class = StatelessJWTAuthentication
+    authentication_required = True
+    read_replica = True
+    conditional_get = True
+    query_budget = 1
+
+    async def get(self, request):
+        try:
+            return JsonResponse(await aget_profile(request.user.pk))
+        except CustomUser.DoesNotExist:
+            raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+
+
+class AsyncCheckIfClientView(AsyncAPIView):
+    """Async CheckIfClientView."""
+    throttle_classes = [CheckIfClientThrottle]
+    read_replica = True
+    conditional_get = True
+
+    async def get(self, request, email):
+        user_type = await alookup_user_type(email)
+        return JsonResponse({'is_client': user_type == 'client', 'user_exists': user_type is not None})
+
+
+class AsyncEnableMFAView(AsyncAPIView):
+    """Async EnableMFAView."""
+    authentication_class = JWTAuthentication
+    authentication_required = True
+    conditional_get = True
+    carries_secrets = True
+
+    async def get(self, request):
+        user = request.user
+        totp_device = await TOTPDevice.objects.filter(user=user, confirmed=False).afirst()
+        if not totp_device:
+            totp_device = await TOTPDevice.objects.acreate(user=user, name='default', confirmed=False)
+
+        image_format = request.GET.get('qr_format', 'png')
+        if image_format not in QR_FORMATS:
+            return JsonResponse(
+                {'detail': f'qr_format must be one of {", ".join(QR_FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Cached per device; only a miss renders the QR code.
+        return JsonResponse(await run_blocking(get_enrollment, totp_device, user.email, image_format))
+
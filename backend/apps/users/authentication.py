@@ -0,0 +1,123 @@
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import CustomUser
+from .tokens import IS_ACTIVE_CLAIM, MFA_ENABLED_CLAIM, USER_TYPE_CLAIM
+
+
+class TokenClaimsUser:
+    """
+    Request user built from the claims of a validated access token.
+
+    ``id``, ``user_type``, ``is_active`` and ``mfa_enabled`` come straight from
+    the token. Any other attribute loads the ``CustomUser`` row on first use
+    and is read from it from then on.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = token[api_settings.USER_ID_CLAIM]
+        self.user_type = token[USER_TYPE_CLAIM]
+        self.is_active = token[IS_ACTIVE_CLAIM]
+        self.mfa_enabled = token[MFA_ENABLED_CLAIM]
+
+    @cached_property
+    def user(self):
+        try:
+            return CustomUser.objects.get(**{api_settings.USER_ID_FIELD: self.id})
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def __getattr__(self, name):
+        # Only called for attributes not set above; never load the row for
+        # dunder lookups made by copy/pickle and friends.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __str__(self):
+        return f"TokenClaimsUser {self.id}"
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the signed user claims in the access token
+    instead of loading the user on every request.
+
+    Meant for read-mostly views. The claims are at most ACCESS_TOKEN_LIFETIME
+    old: the refresh endpoint reloads the user, refusing inactive ones, and
+    sets the claims of each new access token from the database. Tokens
+    issued before the claims existed fall back to the regular database
+    lookup.
+    """
+
+    claims = (USER_TYPE_CLAIM, IS_ACTIVE_CLAIM, MFA_ENABLED_CLAIM)
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # Password-change revocation needs the stored hash, so it can't be
+        # checked from claims alone.
+        if api_settings.CHECK_REVOKE_TOKEN or any(claim not in validated_token for claim in self.claims):
+            return super().get_user(validated_token)
+
+        return self.claims_user(validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for the async views, which get a plain Django
+        request. Only tokens without the claims touch the database."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if api_settings.CHECK_REVOKE_TOKEN or any(claim not in validated_token for claim in self.claims):
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+        return self.claims_user(validated_token), validated_token
+
+    def claims_user(self, validated_token):
+        user = TokenClaimsUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user's client or supplier row in the
+    same query as the user, for views that read or update the profile.
+    """
+
+    def get_user(self, validated_token):
+        # JWTAuthentication.get_user with select_related.
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        queryset = CustomUser.objects.select_related('client', 'supplier')
+        try:
+            user = queryset.get(**{api_settings.USER_ID_FIELD: user_id})
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+from .metrics import timer
+from .profile import annotate_mfa
+
+
+UserModel = get_user_model()
+
+
+class EmailMFABackend(ModelBackend):
+    """
+    ModelBackend that loads the user together with whether they have a
+    confirmed TOTP device (``user.mfa_enabled``) in one query, so the login
+    views don't need a second lookup for the MFA check. The lookup and the
+    password hash check are timed as the ``login_stage_seconds`` metric.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        with timer('login_stage_seconds', stage='db'):
+            user = annotate_mfa(
+                UserModel._default_manager.filter(**{UserModel.USERNAME_FIELD: username})
+            ).first()
+
+        with timer('login_stage_seconds', stage='hash'):
+            if user is None:
+                # Hash anyway, so unknown emails take as long as wrong
+                # passwords (same as ModelBackend).
+                UserModel().set_password(password)
+                return None
+            valid = user.check_password(password)
+
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        authenticate() for the async views: the lookup uses the async ORM and
+        the hash check awaits the hashing service. (Django's own
+        aauthenticate runs authenticate in a thread, and acheck_password
+        hashes on the event loop.)
+        """
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        with timer('login_stage_seconds', stage='db'):
+            user = await annotate_mfa(
+                UserModel._default_manager.filter(**{UserModel.USERNAME_FIELD: username})
+            ).afirst()
+
+        with timer('login_stage_seconds', stage='hash'):
+            if user is None:
+                await hashing.amake_password(password)
+                return None
+            valid, must_update = await hashing.averify_password(password, user.password)
+            if valid and must_update:
+                user.password = await hashing.amake_password(password)
+                await user.asave(update_fields=['password'])
+
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
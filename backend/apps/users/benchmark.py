@@ -0,0 +1,105 @@
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+
+from .models import CustomUser, Supplier
+
+
+def sample_users(size):
+    """``size`` unsaved client CustomUsers with every profile field filled in."""
+    return [
+        CustomUser(
+            pk=n, username=f'user{n}@example.com', email=f'user{n}@example.com', user_type='client',
+            first_name='Zoë', last_name=f'User {n}', number='0400000000', address=f'{n} Test St',
+            postcode='3000', dob=datetime.date(1990, 1, 1) + datetime.timedelta(days=n),
+        )
+        for n in range(size)
+    ]
+
+
+def sample_suppliers(users):
+    """An unsaved Supplier with a logo for each of ``users``."""
+    return [
+        Supplier(
+            pk=user.pk, user=user, company_name=f'Company {user.pk}', company_number='12345678',
+            company_address=f'{user.pk} Industrial Rd', company_postcode='3000', company_type='plumbing',
+            company_description='Residential and commercial plumbing, gas fitting and drainage.',
+            company_logo=f'logos/{user.pk}.png', subcategories='gas,drainage',
+            company_logo_variants={'64': {'webp': f'logos/{user.pk}-64.webp'}},
+        )
+        for user in users
+    ]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, iterations):
+    """Call ``func`` ``iterations`` times and return (latencies, queries per call)."""
+    latencies = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+    return latencies, len(queries) / iterations
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base class for the ``bench_*`` management commands.
+
+    Benchmarks run against throwaway test databases, so they never touch the
+    data in the configured database. Subclasses implement ``run_benchmark``.
+    """
+
+    default_iterations = 200
+    # Put SQLite test databases in a temporary file instead of memory, for
+    # benchmarks where locking and journaling matter.
+    file_database = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=self.default_iterations)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            if self.file_database:
+                for alias in connections:
+                    if connections[alias].vendor == 'sqlite':
+                        connections[alias].settings_dict['TEST']['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                # Stack traces per query would skew every measurement.
+                with override_settings(QUERY_BUDGET_CHECKS=False):
+                    self.run_benchmark(**options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+    def run_benchmark(self, **options):
+        raise NotImplementedError
+
+    def report(self, label, latencies, queries=None):
+        line = (
+            f'{label:<32} n={len(latencies):<6} '
+            f'mean={statistics.mean(latencies) * 1000:8.3f}ms '
+            f'p50={percentile(latencies, 50) * 1000:8.3f}ms '
+            f'p95={percentile(latencies, 95) * 1000:8.3f}ms'
+        )
+        if queries is not None:
+            line += f' queries/call={queries:.2f}'
+        self.stdout.write(line)
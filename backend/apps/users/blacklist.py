@@ -0,0 +1,163 @@
+import math
+import time
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken
+from .outstanding import record_outstanding
+
+
+class BlacklistBackend:
+    """
+    Where issued and revoked refresh tokens are tracked. BoxumRefreshToken
+    calls ``record`` for every new refresh token, ``blacklist`` to revoke
+    one and ``is_blacklisted`` when a refresh token is used.
+    """
+
+    def record(self, token, user):
+        pass
+
+    def blacklist(self, token):
+        raise NotImplementedError
+
+    def is_blacklisted(self, jti):
+        raise NotImplementedError
+
+    async def ais_blacklisted(self, jti):
+        return await sync_to_async(self.is_blacklisted)(jti)
+
+    def compact(self, batch_size):
+        """Drop expired entries in batches of ``batch_size``; returns how many went."""
+        return 0
+
+    def stats(self):
+        """Row counts for ``manage.py token_blacklist_stats``."""
+        return {}
+
+    def sample_jtis(self, count):
+        """Up to ``count`` blacklisted jtis, for timing lookups."""
+        return []
+
+
+class DatabaseBlacklist(BlacklistBackend):
+    """
+    simplejwt's token_blacklist tables: an OutstandingToken row per refresh
+    token (written in batches, see apps.users.outstanding) and a
+    BlacklistedToken row per revoked one.
+    """
+
+    def record(self, token, user):
+        record_outstanding(token, user)
+
+    def blacklist(self, token):
+        return RefreshToken.blacklist(token)
+
+    def is_blacklisted(self, jti):
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    async def ais_blacklisted(self, jti):
+        return await BlacklistedToken.objects.filter(token__jti=jti).aexists()
+
+    def compact(self, batch_size):
+        # Tokens all live for REFRESH_TOKEN_LIFETIME, so expired rows are the
+        # oldest ones and the pk-ordered scan stops right after them.
+        removed = 0
+        now = timezone.now()
+        while True:
+            batch = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return removed
+            BlacklistedToken.objects.filter(token_id__in=batch).delete()
+            OutstandingToken.objects.filter(pk__in=batch).delete()
+            removed += len(batch)
+
+    def stats(self):
+        return {
+            'outstanding tokens': OutstandingToken.objects.count(),
+            'expired outstanding tokens': OutstandingToken.objects.filter(expires_at__lte=timezone.now()).count(),
+            'blacklisted tokens': BlacklistedToken.objects.count(),
+        }
+
+    def sample_jtis(self, count):
+        return list(BlacklistedToken.objects.values_list('token__jti', flat=True)[:count])
+
+
+class CacheBlacklist(BlacklistBackend):
+    """
+    Revoked jtis in the default cache, each expiring with its token. Nothing
+    is written per login and nothing needs compacting, but the cache must be
+    shared and persistent (e.g. Redis) for revocations to hold across
+    processes and restarts.
+    """
+    cache_prefix = 'users:revoked:'
+
+    def blacklist(self, token):
+        timeout = max(1, math.ceil(token['exp'] - time.time()))
+        cache.set(f'{self.cache_prefix}{token[api_settings.JTI_CLAIM]}', True, timeout)
+
+    def is_blacklisted(self, jti):
+        return cache.get(f'{self.cache_prefix}{jti}', False)
+
+    async def ais_blacklisted(self, jti):
+        return await cache.aget(f'{self.cache_prefix}{jti}', False)
+
+
+class RevokedTokenBlacklist(BlacklistBackend):
+    """
+    A compact table of revoked jtis only (RevokedToken), sharded by expiry
+    hour. Issued tokens aren't recorded, and compaction deletes whole expired
+    shards with an indexed range delete.
+    """
+    shard_seconds = 3600
+
+    def shard(self, exp):
+        # The first shard boundary after the token expires.
+        return math.ceil(exp / self.shard_seconds)
+
+    def blacklist(self, token):
+        RevokedToken.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM], defaults={'shard': self.shard(token['exp'])},
+        )
+
+    def is_blacklisted(self, jti):
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    async def ais_blacklisted(self, jti):
+        return await RevokedToken.objects.filter(jti=jti).aexists()
+
+    def compact(self, batch_size):
+        expired = RevokedToken.objects.filter(shard__lte=int(time.time()) // self.shard_seconds)
+        removed = 0
+        while True:
+            batch = list(expired.values_list('jti', flat=True)[:batch_size])
+            if not batch:
+                return removed
+            RevokedToken.objects.filter(jti__in=batch).delete()
+            removed += len(batch)
+
+    def stats(self):
+        return {
+            'revoked tokens': RevokedToken.objects.count(),
+            'expired revoked tokens': RevokedToken.objects.filter(
+                shard__lte=int(time.time()) // self.shard_seconds).count(),
+            'shards': RevokedToken.objects.values('shard').distinct().count(),
+        }
+
+    def sample_jtis(self, count):
+        return list(RevokedToken.objects.values_list('jti', flat=True)[:count])
+
+
+@lru_cache(maxsize=None)
+def get_blacklist_backend():
+    return import_string(settings.TOKEN_BLACKLIST_BACKEND)()
@@ -0,0 +1,26 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_BLOCKING_WORKERS, thread_name_prefix='blocking')
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run CPU-bound ``func`` (password hashing, QR code rendering) on a pool of
+    ASYNC_BLOCKING_WORKERS threads, so async views don't stall the event
+    loop and at most that many run at once. Not for database work: use
+    sync_to_async, which runs it on the thread holding the connection.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
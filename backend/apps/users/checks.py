@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES:
+        return []
+    return [Warning(
+        'The default cache is private to each process.',
+        hint=(
+            'Set CACHE_BACKEND to redis, memcached or file when running more than one worker '
+            'process; otherwise profile invalidation, the membership cache, replica pinning and '
+            'throttling only apply within the process that wrote them.'
+        ),
+        id='users.W001',
+    )]
+
+
+@register(deploy=True)
+def check_metrics_dir(app_configs, **kwargs):
+    if not settings.METRICS_ENDPOINT or settings.METRICS_DIR:
+        return []
+    return [Warning(
+        '/metrics only reports the process that answers the scrape.',
+        hint='Set METRICS_DIR when running more than one worker process.',
+        id='users.W002',
+    )]
+
+
+@register(Tags.caches, Tags.security)
+def check_blacklist_cache(app_configs, **kwargs):
+    if settings.TOKEN_BLACKLIST_BACKEND != 'apps.users.blacklist.CacheBlacklist':
+        return []
+    if settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        'CacheBlacklist needs a shared cache.',
+        hint=(
+            'With a per-process default cache, a revoked refresh token is only rejected by the '
+            'process that revoked it, and by none after a restart. Set CACHE_BACKEND to redis or '
+            'memcached, or use another TOKEN_BLACKLIST_BACKEND.'
+        ),
+        id='users.E001',
+    )]
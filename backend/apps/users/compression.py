@@ -0,0 +1,96 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Content codings in an Accept-Encoding header, minus those with q=0."""
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Compress JSON responses of at least RESPONSE_COMPRESSION_MIN_SIZE bytes
+    with brotli (when the brotli package is installed) or gzip, whichever
+    the client accepts, preferring brotli. Smaller bodies aren't worth the
+    CPU or the extra headers.
+
+    As django.middleware.gzip.GZipMiddleware, gzip output is padded with up
+    to max_random_bytes random bytes against BREACH. Brotli has nowhere to
+    put such padding, so responses of views with ``carries_secrets = True``
+    (tokens, TOTP secrets) are only ever gzipped.
+    """
+    sync_capable = True
+    async_capable = True
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.carries_secrets = getattr(view_class, 'carries_secrets', False)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        CompressionMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith('application/json')
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+
+        encodings = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if brotli is not None and 'br' in encodings and not getattr(request, 'carries_secrets', False):
+            encoding, compressed = 'br', brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        elif 'gzip' in encodings:
+            encoding, compressed = 'gzip', compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from what a strong ETag promises.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
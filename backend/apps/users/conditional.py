@@ -0,0 +1,53 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, set_response_etag
+
+
+class ConditionalGetMiddleware:
+    """
+    Content-hash ETags on successful GET responses of views with
+    ``conditional_get = True``, answered with an empty 304 when the client's
+    If-None-Match still matches. The response is marked private and
+    no-cache, so clients revalidate every time instead of reusing it.
+
+    Unlike django.middleware.http.ConditionalGetMiddleware this only covers
+    the opted-in views, and works for the async views too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.conditional_get = getattr(view_class, 'conditional_get', False)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ConditionalGetMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def process_response(self, request, response):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or not getattr(request, 'conditional_get', False)
+            or response.status_code != 200
+            or response.streaming
+        ):
+            return response
+        if not response.has_header('ETag'):
+            set_response_etag(response)
+        patch_cache_control(response, private=True, no_cache=True)
+        # Responses depend on who is asking.
+        patch_vary_headers(response, ('Authorization',))
+        return get_conditional_response(request, etag=response['ETag'], response=response)
@@ -0,0 +1,55 @@
+"""
+Django's password hashers with their cost parameters taken from the
+PASSWORD_HASHER_PARAMS setting, {algorithm: {parameter: value}}, so they can
+be tuned per deployment (see ``manage.py benchmark_hashers``). The algorithm
+names are Django's, so existing hashes keep verifying; hashes made with
+other parameters are upgraded at the user's next login, see
+``manage.py password_hash_stats``.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Tuned:
+    """A hasher parameter read from PASSWORD_HASHER_PARAMS, else ``default``."""
+
+    def __init__(self, default):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.default
+        return settings.PASSWORD_HASHER_PARAMS.get(instance.algorithm, {}).get(self.name, self.default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = Tuned(hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = Tuned(hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = Tuned(hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = Tuned(hashers.Argon2PasswordHasher.parallelism)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    rounds = Tuned(hashers.BCryptSHA256PasswordHasher.rounds)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = Tuned(hashers.ScryptPasswordHasher.work_factor)
+    block_size = Tuned(hashers.ScryptPasswordHasher.block_size)
+    parallelism = Tuned(hashers.ScryptPasswordHasher.parallelism)
+    # Raise with work_factor: scrypt needs 128 * work_factor * block_size
+    # bytes; 0 is OpenSSL's 32 MiB default.
+    maxmem = Tuned(hashers.ScryptPasswordHasher.maxmem)
+
+
+# Parameters benchmark_hashers varies, per algorithm.
+TUNABLE_PARAMETERS = {
+    hasher.algorithm: [name for name, value in vars(hasher).items() if isinstance(value, Tuned)]
+    for hasher in (PBKDF2PasswordHasher, Argon2PasswordHasher, BCryptSHA256PasswordHasher, ScryptPasswordHasher)
+}
@@ -0,0 +1,145 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from .blocking import run_blocking
+from .metrics import timer
+
+
+_lock = threading.Lock()
+_service = None
+# Set by API views that would rather turn a request away than queue it.
+_shed = ContextVar('hashing_shed', default=False)
+
+
+class HashingBusy(Exception):
+    """Every hashing worker is busy and the queue is full, inside
+    shed_load(). ``wait`` is the number of seconds to suggest retrying in."""
+
+    def __init__(self, wait):
+        super().__init__('Every password hashing worker is busy.')
+        self.wait = wait
+
+
+class HashingService:
+    """
+    Password hashing on a pool of worker processes, so CPU-heavy logins,
+    signups and password changes can't starve the threads serving the rest
+    of the API. At most ``workers + queue_size`` hashes are running or
+    waiting at once; past that, submit() blocks until a slot frees up, or
+    under shed_load() raises HashingBusy.
+    """
+
+    def __init__(self, workers, queue_size, retry_after, hasher_settings):
+        self.retry_after = retry_after
+        self.hasher_settings = hasher_settings
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            # Forking a process with running threads is unsafe.
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(hasher_settings,),
+        )
+
+    def submit(self, func, *args):
+        if not self._slots.acquire(blocking=not _shed.get()):
+            raise HashingBusy(self.retry_after)
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._slots.release())
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_worker(hasher_settings):
+    # Workers load the project settings from DJANGO_SETTINGS_MODULE; use
+    # the parent's hasher settings in case they were overridden.
+    for name, value in hasher_settings.items():
+        setattr(settings, name, value)
+
+
+def _hasher_settings():
+    return {name: getattr(settings, name) for name in ('PASSWORD_HASHERS', 'PASSWORD_HASHER_PARAMS')}
+
+
+def get_service():
+    """The process-wide HashingService, or None with PASSWORD_HASHING_WORKERS = 0."""
+    global _service
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return None
+    hasher_settings = _hasher_settings()
+    with _lock:
+        if _service is None or _service.hasher_settings != hasher_settings:
+            if _service is not None:
+                _service.shutdown()
+            _service = HashingService(
+                settings.PASSWORD_HASHING_WORKERS,
+                settings.PASSWORD_HASHING_QUEUE_SIZE,
+                settings.PASSWORD_HASHING_RETRY_AFTER,
+                hasher_settings,
+            )
+        return _service
+
+
+@contextmanager
+def shed_load():
+    """Raise HashingBusy rather than wait for a hashing worker, for API
+    requests that can be answered with a 503. Anything else (the admin,
+    management commands, background work) waits its turn."""
+    token = _shed.set(True)
+    try:
+        yield
+    finally:
+        _shed.reset(token)
+
+
+def make_password(password):
+    service = get_service()
+    # None makes an unusable password: nothing to hash.
+    if password is None:
+        return hashers.make_password(password)
+    # Timed including any wait for a worker.
+    with timer('password_hashing_seconds', operation='make'):
+        if service is None:
+            return hashers.make_password(password)
+        return service.submit(hashers.make_password, password).result()
+
+
+def verify_password(password, encoded):
+    """(whether ``password`` matches ``encoded``, whether it should be
+    rehashed with the preferred hasher)."""
+    service = get_service()
+    with timer('password_hashing_seconds', operation='verify'):
+        if service is None:
+            return hashers.verify_password(password, encoded)
+        return service.submit(hashers.verify_password, password, encoded).result()
+
+
+async def amake_password(password):
+    service = get_service()
+    if password is None:
+        return hashers.make_password(None)
+    with timer('password_hashing_seconds', operation='make'):
+        if service is None:
+            return await run_blocking(hashers.make_password, password)
+        return await asyncio.wrap_future(service.submit(hashers.make_password, password))
+
+
+async def averify_password(password, encoded):
+    service = get_service()
+    with timer('password_hashing_seconds', operation='verify'):
+        if service is None:
+            return await run_blocking(hashers.verify_password, password, encoded)
+        return await asyncio.wrap_future(service.submit(hashers.verify_password, password, encoded))
@@ -0,0 +1,112 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from apps.supplier.geo import geocode_suppliers
+from apps.supplier.search import get_search_backend
+from apps.supplier.tags import sync_supplier_tags
+
+from .membership import add_members
+from .models import CustomUser, Supplier
+from .serializers import SupplierImportSerializer
+
+
+USER_FIELDS = ('email', 'first_name', 'last_name', 'number', 'address', 'postcode', 'dob')
+SUPPLIER_FIELDS = (
+    'company_name', 'company_number', 'company_address', 'company_postcode',
+    'company_type', 'company_description', 'company_logo', 'subcategories',
+)
+
+
+def read_rows(path, file_format):
+    """Yield (line number, row dict) pairs without loading the file into memory."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(handle, start=1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except ValueError as exc:
+                        yield line_no, exc
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_chunk(rows):
+    """
+    Validate and insert one chunk of supplier rows.
+
+    Returns a dict with the number of created and skipped rows and a list of
+    (line number, errors) pairs for rows that failed validation.
+    """
+    result = {'created': 0, 'skipped': 0, 'errors': []}
+
+    valid = {}
+    for line_no, row in rows:
+        if isinstance(row, Exception):
+            result['errors'].append((line_no, {'non_field_errors': [str(row)]}))
+            continue
+        serializer = SupplierImportSerializer(data=row)
+        if not serializer.is_valid():
+            result['errors'].append((line_no, serializer.errors))
+        elif serializer.validated_data['email'] in valid:
+            result['skipped'] += 1
+        else:
+            valid[serializer.validated_data['email']] = serializer.validated_data
+
+    existing = set(CustomUser.objects.filter(email__in=list(valid)).values_list('email', flat=True))
+    result['skipped'] += len(existing)
+    rows = [data for email, data in valid.items() if email not in existing]
+
+    try:
+        with transaction.atomic():
+            result['created'] = _insert(rows)
+    except IntegrityError:
+        # Another chunk inserted some of these emails in the meantime; go row
+        # by row so only the duplicates are skipped.
+        for data in rows:
+            try:
+                with transaction.atomic():
+                    result['created'] += _insert([data])
+            except IntegrityError:
+                result['skipped'] += 1
+    return result
+
+
+def _insert(rows):
+    users = [
+        CustomUser(
+            username=data['email'],
+            user_type='supplier',
+            password=make_password(data.get('password') or None),
+            **{field: data[field] for field in USER_FIELDS},
+        )
+        for data in rows
+    ]
+    CustomUser.objects.bulk_create(users)
+    add_members(users)
+    # Not every backend returns primary keys from a bulk insert.
+    user_ids = dict(
+        CustomUser.objects.filter(email__in=[data['email'] for data in rows]).values_list('email', 'pk')
+    )
+    suppliers = Supplier.objects.bulk_create([
+        Supplier(user_id=user_ids[data['email']], **{field: data.get(field, '') for field in SUPPLIER_FIELDS})
+        for data in rows
+    ])
+    # bulk_create doesn't send post_save, so tag, index and place the
+    # suppliers here.
+    sync_supplier_tags(suppliers)
+    get_search_backend().index(suppliers)
+    geocode_suppliers(suppliers)
+    return len(rows)
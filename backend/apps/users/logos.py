@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import connection, transaction
+from PIL import Image
+from rest_framework import serializers
+
+from .models import Supplier
+
+
+logger = logging.getLogger(__name__)
+
+LOGO_DIR = 'logos/'
+VARIANT_DIR = 'logos/variants/'
+VARIANT_FORMATS = {'webp': 'WEBP', 'png': 'PNG'}
+
+_executor = None
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Reject a multipart request as soon as an uploaded file grows past
+    LOGO_MAX_UPLOAD_SIZE, instead of spooling the whole thing first.
+    Supplier logos are the only file uploads the API accepts.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.LOGO_MAX_UPLOAD_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise RequestDataTooBig('Upload exceeds LOGO_MAX_UPLOAD_SIZE.')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.LOGO_MAX_UPLOAD_SIZE:
+            raise RequestDataTooBig('Upload exceeds LOGO_MAX_UPLOAD_SIZE.')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def check_logo(file):
+    """
+    Enforce the byte and pixel limits on an uploaded logo. Only the image
+    header is read, so nothing is decoded for oversized images.
+    """
+    if file.size > settings.LOGO_MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(
+            f'Logo must be at most {settings.LOGO_MAX_UPLOAD_SIZE // (1024 * 1024)} MB.'
+        )
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+    file.seek(0)
+    if max(width, height) > settings.LOGO_MAX_DIMENSION:
+        raise serializers.ValidationError(
+            f'Logo must be at most {settings.LOGO_MAX_DIMENSION}x{settings.LOGO_MAX_DIMENSION} pixels.'
+        )
+    return file
+
+
+def content_digest(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def store_logo(file):
+    """
+    Save an uploaded logo under its content hash and return the storage
+    name. A logo identical to one already stored reuses that file.
+    """
+    extension = os.path.splitext(file.name)[1].lower()
+    name = f'{LOGO_DIR}{content_digest(file)}{extension}'
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, file)
+
+
+def generate_variants(supplier):
+    """
+    Write the resized WebP and PNG variants of a supplier's logo and record
+    them on the supplier. Variants are named after the original's content
+    hash, so suppliers sharing a logo share its variants too.
+    """
+    if not supplier.company_logo:
+        return {}
+    with supplier.company_logo.open('rb') as logo:
+        digest = content_digest(logo)
+        variants = {
+            str(size): {extension: f'{VARIANT_DIR}{digest}-{size}.{extension}' for extension in VARIANT_FORMATS}
+            for size in settings.LOGO_VARIANT_SIZES
+        }
+        missing = [
+            (size, extension, name)
+            for size, formats in variants.items()
+            for extension, name in formats.items()
+            if not default_storage.exists(name)
+        ]
+        if missing:
+            logo.seek(0)
+            with Image.open(logo) as image:
+                image.load()
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                resized = {}
+                for size, extension, name in missing:
+                    if size not in resized:
+                        resized[size] = image.copy()
+                        resized[size].thumbnail((int(size), int(size)), Image.Resampling.LANCZOS)
+                    output = BytesIO()
+                    resized[size].save(output, VARIANT_FORMATS[extension])
+                    default_storage.save(name, ContentFile(output.getvalue()))
+
+    # Unless the logo was replaced meanwhile; its own run records its
+    # variants.
+    Supplier.objects.filter(pk=supplier.pk, company_logo=supplier.company_logo.name).update(
+        company_logo_variants=variants,
+    )
+    supplier.company_logo_variants = variants
+    # Imported here because apps.users.profile imports the serializers,
+    # which import this module.
+    from .profile import invalidate_profile
+    invalidate_profile(supplier.pk)
+    return variants
+
+
+def schedule_variants(supplier_id):
+    """Generate a supplier's logo variants in a background thread once the
+    current transaction commits."""
+    transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, supplier_id))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.LOGO_WORKERS, thread_name_prefix='logo-variants')
+    return _executor
+
+
+def _generate_in_background(supplier_id):
+    try:
+        generate_variants(Supplier.objects.get(pk=supplier_id))
+    except Supplier.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception('Generating logo variants for supplier %s failed', supplier_id)
+    finally:
+        connection.close()
+
+
+class LogoVariantsField(serializers.ReadOnlyField):
+    """Supplier.company_logo_variants as {size: {format: url}}."""
+
+    def to_representation(self, value):
+        return {
+            size: {extension: default_storage.url(name) for extension, name in formats.items()}
+            for size, formats in (value or {}).items()
+        }
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from apps.users.models import BackfillProgress
+from apps.users.online_migrations import Backfill
+
+
+class Command(BaseCommand):
+    help = (
+        'Run or resume a Backfill (apps.users.online_migrations) in throttled batches, given its '
+        'dotted path. Without one, list the progress of past backfills.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('backfill', nargs='?', help='Dotted path to a Backfill instance.')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+        parser.add_argument('--batch-size', type=int, help='Rows per batch to start with.')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between batches.')
+        parser.add_argument('--restart', action='store_true', help='Start over rather than resume.')
+
+    def handle(self, *args, backfill, database, max_batches, batch_size, pause, restart, **options):
+        if backfill is None:
+            for progress in BackfillProgress.objects.using(database).order_by('started_at'):
+                state = f'finished {progress.finished_at:%Y-%m-%d %H:%M}' if progress.finished_at else 'in progress'
+                self.stdout.write(f'{progress.name}: {progress.rows_done} rows, up to pk {progress.last_pk or "-"}, {state}')
+            return
+
+        try:
+            job = import_string(backfill)
+        except ImportError as error:
+            raise CommandError(str(error))
+        if not isinstance(job, Backfill):
+            raise CommandError(f'{backfill} is not a Backfill.')
+        if batch_size:
+            job.batch_size = batch_size
+        if pause is not None:
+            job.pause = pause
+
+        progress = job.run(using=database, stdout=self.stdout, max_batches=max_batches, restart=restart)
+        if not progress.finished_at:
+            self.stdout.write(f'{job.name}: stopped after {max_batches} batches; run again to resume.')
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches, include, path, reverse
+
+from apps.users import urls as users_urls
+from apps.users.benchmark import BenchmarkCommand
+from apps.users.models import Client as ClientProfile, CustomUser
+from apps.users.outstanding import flush
+from apps.users.tokens import BoxumRefreshToken
+
+
+class AsyncViewsURLConf:
+    urlpatterns = [path('api/users/', include(users_urls.async_urlpatterns + users_urls.urlpatterns))]
+
+
+class SyncViewsURLConf:
+    urlpatterns = [path('api/users/', include(users_urls.urlpatterns))]
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare throughput of login, user details and check-if-client under concurrent load: '
+        'WSGI with the DRF views, ASGI with the DRF views and ASGI with the async views.'
+    )
+
+    default_iterations = 2000
+    file_database = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 128])
+        parser.add_argument(
+            '--login-iterations', type=int, default=32,
+            help='Logins per round; each one hashes a password with the configured hasher.',
+        )
+
+    def run_benchmark(self, iterations, concurrency, login_iterations, **options):
+        email = 'bench@example.com'
+        user = CustomUser.objects.create_user(
+            username=email, email=email, password='password', user_type='client',
+            first_name='Bench', last_name='User', number='0400000000', address='1 Test St', postcode='3000',
+        )
+        ClientProfile.objects.create(user=user)
+        access = str(BoxumRefreshToken.for_user(user).access_token)
+
+        self.requests = {
+            'check-if-client': ('get', reverse('check-if-client', args=[email]), {}, iterations),
+            'user details': ('get', reverse('user-details'), {'headers': {'Authorization': f'Bearer {access}'}}, iterations),
+            'login': ('post', reverse('token_login'), {'data': {'email': email, 'password': 'password'}}, login_iterations),
+        }
+        modes = [
+            ('wsgi', self.run_wsgi, SyncViewsURLConf),
+            ('asgi', self.run_asgi, SyncViewsURLConf),
+            ('asgi+async views', self.run_asgi, AsyncViewsURLConf),
+        ]
+        # Every request comes from the same address; don't let the
+        # check-if-client token bucket turn them away.
+        with override_settings(ALLOWED_HOSTS=['testserver'], CHECK_IF_CLIENT_BURST=10 ** 9):
+            for name, (method, url, kwargs, count) in self.requests.items():
+                for workers in concurrency:
+                    for mode, run, urlconf in modes:
+                        with override_settings(ROOT_URLCONF=urlconf):
+                            clear_url_caches()
+                            # Warm the caches so every mode starts alike.
+                            run(method, url, kwargs, workers, workers)
+                            start = time.perf_counter()
+                            latencies = run(method, url, kwargs, count, workers)
+                            elapsed = time.perf_counter() - start
+                        self.report(f'{name}, {mode}, c={workers}', latencies)
+                        self.stdout.write(f'{"":<32} {count / elapsed:8.1f} requests/s')
+        clear_url_caches()
+        # Write the buffered outstanding tokens while the tables exist.
+        flush()
+
+    def run_wsgi(self, method, url, kwargs, count, workers):
+        # A threaded WSGI server: one thread and connection per worker.
+        def worker(offset):
+            client = Client()
+            latencies = []
+            try:
+                for _ in range(offset, count, workers):
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, **kwargs)
+                    latencies.append(time.perf_counter() - start)
+                    self.check_response(response)
+            finally:
+                connection.close()
+            return latencies
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [latency for chunk in pool.map(worker, range(workers)) for latency in chunk]
+
+    def run_asgi(self, method, url, kwargs, count, workers):
+        # One event loop with ``workers`` requests in flight at a time.
+        async def run():
+            client = AsyncClient()
+            limit = asyncio.Semaphore(workers)
+            latencies = []
+
+            async def request():
+                async with limit:
+                    start = time.perf_counter()
+                    response = await getattr(client, method)(url, **kwargs)
+                    latencies.append(time.perf_counter() - start)
+                    self.check_response(response)
+
+            await asyncio.gather(*(request() for _ in range(count)))
+            return latencies
+
+        return asyncio.run(run())
+
+    def check_response(self, response):
+        if response.status_code != 200:
+            raise RuntimeError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
@@ -0,0 +1,57 @@
+import random
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.benchmark import BenchmarkCommand, measure
+from apps.users.models import CustomUser
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure database queries per 1k check-if-client lookups, and the per-IP rate limit.'
+
+    default_iterations = 1000
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--known-share', type=float, default=0.5,
+                            help='Fraction of lookups for emails that exist.')
+
+    def run_benchmark(self, iterations, users, known_share, **options):
+        CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f'user{i}@example.com', email=f'user{i}@example.com',
+                user_type='client' if i % 2 else 'supplier', password='!',
+                first_name='Bench', last_name='User', number='0400000000',
+                address='1 Test St', postcode='3000',
+            )
+            for i in range(users)
+        )
+        rng = random.Random(0)
+        emails = [
+            f'user{rng.randrange(users)}@example.com' if rng.random() < known_share
+            else f'nobody{rng.randrange(users * 10)}@example.com'
+            for _ in range(iterations)
+        ]
+        client = APIClient()
+
+        def lookups():
+            for email in emails:
+                client.get(reverse('check-if-client', args=[email]))
+
+        # Lift the rate limit while measuring the cache.
+        with override_settings(CHECK_IF_CLIENT_BURST=iterations * 10, CHECK_IF_CLIENT_RATE=iterations * 10):
+            cache.clear()
+            latencies, queries = measure(lookups, 1)
+            self.report(f'{iterations} lookups, cold cache', latencies, queries)
+            latencies, queries = measure(lookups, 1)
+            self.report(f'{iterations} lookups, warm cache', latencies, queries)
+
+        cache.clear()
+        statuses = [client.get(reverse('check-if-client', args=[email])).status_code for email in emails[:100]]
+        self.stdout.write(
+            f'100 rapid lookups from one IP: {statuses.count(200)} answered, {statuses.count(429)} throttled'
+        )
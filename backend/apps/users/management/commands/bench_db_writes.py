@@ -0,0 +1,104 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.benchmark import BenchmarkCommand
+from apps.users.models import Client, CustomUser
+
+
+# SQLite as it was configured before DB_ENGINE: rollback journal, deferred
+# transactions and the default 5 second busy timeout.
+SQLITE_UNTUNED_OPTIONS = {'timeout': 5, 'init_command': 'PRAGMA journal_mode=DELETE'}
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Measure write throughput of the api/users/ endpoints (signup, profile update, password change) '
+        'under parallel load against the configured database backend.'
+    )
+
+    default_iterations = 200
+    file_database = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+
+    def run_benchmark(self, iterations, threads, **options):
+        profiles = [(connection.vendor, dict(connection.settings_dict['OPTIONS']))]
+        if connection.vendor == 'sqlite':
+            profiles.insert(0, ('sqlite untuned', SQLITE_UNTUNED_OPTIONS))
+
+        # Password hashing would dwarf the database work being measured.
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            self.counter = itertools.count()
+            self.users = [self.create_user(f'existing{i}@example.com') for i in range(max(threads))]
+            for label, db_options in profiles:
+                self.use_options(db_options)
+                for thread_count in threads:
+                    self.run_round(f'{label}, {thread_count} threads', thread_count, iterations)
+
+    def create_user(self, email):
+        user = CustomUser.objects.create_user(
+            username=email, email=email, password='password', user_type='client',
+            first_name='Bench', last_name='User', number='0400000000', address='1 Test St', postcode='3000',
+        )
+        Client.objects.create(user=user)
+        return user
+
+    def use_options(self, db_options):
+        connections.close_all()
+        for alias in connections:
+            connections[alias].settings_dict['OPTIONS'] = dict(db_options)
+        # Worker threads open fresh connections with these options; journal
+        # mode is persistent, so set it on the file now.
+        with connection.cursor() as cursor:
+            for statement in db_options.get('init_command', '').split(';'):
+                if statement.strip():
+                    cursor.execute(statement)
+
+    def run_round(self, label, thread_count, iterations):
+        def worker(offset):
+            # One client and connection per thread, as with persistent
+            # connections in a threaded server.
+            client = APIClient()
+            client.force_authenticate(self.users[offset])
+            try:
+                return [self.write(client, index) for index in range(offset, iterations, thread_count)]
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=thread_count) as pool:
+            results = [ok for chunk in pool.map(worker, range(thread_count)) for ok in chunk]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label:<28} {iterations / elapsed:8.1f} writes/s  '
+            f'{results.count(False)} failed of {iterations}'
+        )
+
+    def write(self, client, index):
+        kind = index % 3
+        try:
+            if kind == 0:
+                n = next(self.counter)
+                response = client.post(reverse('client-create'), {
+                    'email': f'signup{n}@example.com', 'password': 'password', 'first_name': 'Bench',
+                    'last_name': 'User', 'number': '0400000000', 'address': '1 Test St',
+                    'postcode': '3000', 'dob': '1990-01-01', 'company_name': 'Bench Co',
+                })
+            elif kind == 1:
+                response = client.put(reverse('update-user'), {'first_name': f'Bench{index}'})
+            else:
+                response = client.post(reverse('change-password'), {
+                    'current_password': 'password', 'new_password': 'password',
+                })
+            return response.status_code < 400
+        except Exception:
+            # "database is locked" and friends.
+            return False
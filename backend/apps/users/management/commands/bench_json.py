@@ -0,0 +1,45 @@
+import io
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.users.benchmark import BenchmarkCommand, measure, sample_suppliers, sample_users
+from apps.users.parsers import ORJSONParser
+from apps.users.renderers import ORJSONRenderer, orjson
+from apps.users.serializers import CustomUserSerializer, SupplierSerializer
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare DRF\'s JSON renderer and parser with the orjson ones on CustomUserSerializer and '
+        'SupplierSerializer list payloads.'
+    )
+
+    default_iterations = 50
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--size', type=int, default=1000, help='Instances per list.')
+
+    def run_benchmark(self, iterations, size, **options):
+        if orjson is None:
+            self.stdout.write('orjson is not installed; ORJSONRenderer falls back to JSONRenderer.')
+
+        users = sample_users(size)
+        suppliers = sample_suppliers(users)
+        payloads = [
+            ('CustomUserSerializer', CustomUserSerializer(users, many=True).data),
+            ('SupplierSerializer', SupplierSerializer(suppliers, many=True).data),
+        ]
+
+        for label, data in payloads:
+            rendered = JSONRenderer().render(data)
+            if ORJSONRenderer().render(data) != rendered:
+                self.stderr.write(f'{label}: ORJSONRenderer output differs from JSONRenderer')
+            self.stdout.write(f'{label} x{size} ({len(rendered)} bytes)')
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                latencies, _ = measure(lambda: renderer.render(data), iterations)
+                self.report(f'  render, {type(renderer).__name__}', latencies)
+            for parser in (JSONParser(), ORJSONParser()):
+                latencies, _ = measure(lambda: parser.parse(io.BytesIO(rendered)), iterations)
+                self.report(f'  parse, {type(parser).__name__}', latencies)
@@ -0,0 +1,55 @@
+from django.test import override_settings
+from django.urls import reverse
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework.test import APIClient
+
+from apps.users.benchmark import BenchmarkCommand, measure
+from apps.users.metrics import registry
+from apps.users.models import CustomUser
+from apps.users.outstanding import flush
+
+
+STAGES = ('db', 'hash', 'token', 'total')
+
+
+class Command(BenchmarkCommand):
+    help = 'Time logins through LoginWithMFAView and break the latency down by stage.'
+
+    default_iterations = 50
+
+    def run_benchmark(self, iterations, **options):
+        password = 'correct horse battery staple'
+        plain = CustomUser.objects.create_user(
+            username='plain@example.com', email='plain@example.com', password=password,
+            user_type='client', first_name='Plain', last_name='User', number='0400000000',
+            address='1 Test St', postcode='3000',
+        )
+        with_mfa = CustomUser.objects.create_user(
+            username='mfa@example.com', email='mfa@example.com', password=password,
+            user_type='client', first_name='MFA', last_name='User', number='0400000001',
+            address='2 Test St', postcode='3001',
+        )
+        TOTPDevice.objects.create(user=with_mfa, name='default', confirmed=True)
+        client = APIClient()
+
+        cases = [
+            ('no MFA, immediate token write', plain, False),
+            ('no MFA, deferred token write', plain, True),
+            ('MFA required', with_mfa, True),
+        ]
+        for label, user, deferred in cases:
+            def login():
+                response = client.post(reverse('token_login'), {'email': user.email, 'password': password})
+                assert response.status_code in (200, 202), response.content
+
+            registry.reset()
+            with override_settings(OUTSTANDING_TOKEN_DEFERRED=deferred):
+                self.report(label, *measure(login, iterations))
+                flush()
+            stages = {labels['stage']: histogram for name, labels, histogram in registry.histograms()
+                      if name == 'login_stage_seconds'}
+            self.stdout.write('  ' + '  '.join(
+                f'{stage}: mean={stages[stage].sum / stages[stage].count * 1000:.2f}ms '
+                f'p99<={stages[stage].quantile(0.99) * 1000:g}ms'
+                for stage in STAGES if stage in stages
+            ))
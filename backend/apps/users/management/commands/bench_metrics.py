@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.users.benchmark import BenchmarkCommand, measure
+from apps.users.metrics import MetricsMiddleware, registry, render_prometheus
+from apps.users.models import Client as ClientProfile, CustomUser
+from apps.users.outstanding import flush
+from apps.users.tokens import BoxumRefreshToken
+
+
+MIDDLEWARE_PATH = f'{MetricsMiddleware.__module__}.{MetricsMiddleware.__name__}'
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure the per-request overhead of MetricsMiddleware on api/users/ endpoints.'
+
+    default_iterations = 2000
+
+    def run_benchmark(self, iterations, **options):
+        email = 'bench@example.com'
+        user = CustomUser.objects.create_user(
+            username=email, email=email, password='password', user_type='client',
+            first_name='Bench', last_name='User', number='0400000000', address='1 Test St', postcode='3000',
+        )
+        ClientProfile.objects.create(user=user)
+        authorization = f'Bearer {BoxumRefreshToken.for_user(user).access_token}'
+        without = [path for path in settings.MIDDLEWARE if path != MIDDLEWARE_PATH]
+
+        endpoints = [
+            ('user details', reverse('user-details')),
+            ('check-if-client', reverse('check-if-client', args=[email])),
+        ]
+        # Lift the check-if-client rate limit.
+        limits = {'CHECK_IF_CLIENT_BURST': iterations * 10, 'CHECK_IF_CLIENT_RATE': iterations * 10}
+        with override_settings(ALLOWED_HOSTS=['testserver'], **limits):
+            for label, url in endpoints:
+                for enabled in (False, True):
+                    middleware = [MIDDLEWARE_PATH] + without if enabled else without
+                    with override_settings(MIDDLEWARE=middleware):
+                        client = Client(headers={'Authorization': authorization})
+                        client.get(url)
+                        registry.reset()
+                        latencies, _ = measure(lambda: client.get(url), iterations)
+                    self.report(f'{label}, metrics {"on" if enabled else "off"}', latencies)
+
+        exposition = render_prometheus(registry)
+        self.stdout.write(f'\n/metrics after the last run ({len(exposition)} bytes):')
+        self.stdout.write(exposition)
+        # Write the buffered outstanding token while the tables exist.
+        flush()
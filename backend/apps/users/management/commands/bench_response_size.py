@@ -0,0 +1,62 @@
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.users.benchmark import BenchmarkCommand
+from apps.users.compression import brotli
+from apps.users.models import Client as ClientProfile, CustomUser
+from apps.users.outstanding import flush
+from apps.users.tokens import BoxumRefreshToken
+
+
+def wire_bytes(response):
+    """Approximate HTTP/1.1 size of ``response``: status line, headers and body."""
+    size = len(f'HTTP/1.1 {response.status_code} {response.reason_phrase}\r\n\r\n')
+    size += sum(len(f'{name}: {value}\r\n') for name, value in response.items())
+    return size + len(response.content)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare bytes on the wire for polled api/users/ GETs: uncompressed, gzip, brotli (if installed) '
+        'and a revalidation answered with 304 Not Modified.'
+    )
+
+    def run_benchmark(self, **options):
+        email = 'bench@example.com'
+        user = CustomUser.objects.create_user(
+            username=email, email=email, password='password', user_type='client',
+            first_name='Bench', last_name='User', number='0400000000', address='1 Test St', postcode='3000',
+        )
+        ClientProfile.objects.create(user=user)
+        authorization = f'Bearer {BoxumRefreshToken.for_user(user).access_token}'
+
+        endpoints = [
+            ('user details', reverse('user-details')),
+            ('mfa enable, png', reverse('enable_mfa') + '?qr_format=png'),
+            ('mfa enable, svg', reverse('enable_mfa') + '?qr_format=svg'),
+            ('check-if-client', reverse('check-if-client', args=[email])),
+        ]
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+        self.stdout.write(
+            f'{"":<20}' + ''.join(f'{encoding:>12}' for encoding in encodings) + f'{"304":>12}'
+            + f'{"compressed":>12}{"revalidated":>13}'
+        )
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            client = Client(headers={'Authorization': authorization})
+            for label, url in endpoints:
+                sizes = []
+                for encoding in encodings:
+                    response = client.get(url, headers={'Accept-Encoding': encoding})
+                    sizes.append(wire_bytes(response))
+                revalidated = client.get(url, headers={'If-None-Match': response['ETag'], 'Accept-Encoding': encodings[-1]})
+                assert revalidated.status_code == 304, revalidated.status_code
+                sizes.append(wire_bytes(revalidated))
+                # Savings over the uncompressed response.
+                compressed_saving, revalidated_saving = 1 - min(sizes[1:-1]) / sizes[0], 1 - sizes[-1] / sizes[0]
+                self.stdout.write(
+                    f'{label:<20}' + ''.join(f'{size:>10} B' for size in sizes)
+                    + f'{compressed_saving:>12.0%}{revalidated_saving:>13.0%}'
+                )
+        # Write the buffered outstanding token while the tables exist.
+        flush()
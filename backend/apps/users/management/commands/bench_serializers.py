@@ -0,0 +1,46 @@
+from rest_framework.renderers import JSONRenderer
+
+from apps.supplier.serializers import SupplierSearchSerializer
+from apps.users.benchmark import BenchmarkCommand, measure, sample_suppliers, sample_users
+from apps.users.representation import read_plan
+from apps.users.serializers import CustomUserSerializer, SupplierSerializer
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare the per-object cost of CustomUserSerializer, SupplierSerializer and '
+        'SupplierSearchSerializer output with their compiled read plans.'
+    )
+
+    default_iterations = 5
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--size', type=int, default=10000, help='Instances per run.')
+
+    def run_benchmark(self, iterations, size, **options):
+        users = sample_users(size)
+        suppliers = sample_suppliers(users)
+        for supplier in suppliers:
+            # No subcategory tags, without a query per supplier.
+            supplier._prefetched_objects_cache = {'subcategory_tags': supplier.subcategory_tags.none()}
+
+        for serializer_class, instances in (
+            (CustomUserSerializer, users),
+            (SupplierSerializer, suppliers),
+            (SupplierSearchSerializer, suppliers),
+        ):
+            plan = read_plan(serializer_class)
+            if JSONRenderer().render(plan.represent_many(instances)) != JSONRenderer().render(serializer_class(instances, many=True).data):
+                self.stderr.write(f'{serializer_class.__name__}: read plan output differs from the serializer')
+
+            self.stdout.write(f'{serializer_class.__name__} x{size}, per object:')
+            runs = [
+                ('serializer per object', lambda: [serializer_class(instance).data for instance in instances]),
+                ('serializer, many=True', lambda: serializer_class(instances, many=True).data),
+                ('read plan per object', lambda: [plan.represent(instance) for instance in instances]),
+                ('read plan, many', lambda: plan.represent_many(instances)),
+            ]
+            for label, func in runs:
+                latencies, _ = measure(func, iterations)
+                self.report(f'  {label}', [latency / size for latency in latencies])
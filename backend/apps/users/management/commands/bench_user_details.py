@@ -0,0 +1,51 @@
+from django.core.cache import cache
+
+from apps.users.benchmark import BenchmarkCommand, measure
+from apps.users.models import Client, CustomUser, Supplier
+from apps.users.profile import build_profile, get_profile, load_profile_user
+from apps.users.serializers import ClientSerializer, CustomUserSerializer, SupplierSerializer
+from apps.users.views import user_has_mfa
+
+
+# The payload UserDetailsView built before it went through apps.users.profile:
+# one query for the user (done by JWTAuthentication), one for the TOTP device
+# and a lazy one for the client/supplier row.
+def legacy_profile(user_id):
+    user = CustomUser.objects.get(pk=user_id)
+    user_data = CustomUserSerializer(user).data
+    user_data['mfa_enabled'] = user_has_mfa(user)
+    if user.user_type == 'client':
+        user_data['client'] = ClientSerializer(user.client).data
+    elif user.user_type == 'supplier':
+        user_data['supplier'] = SupplierSerializer(user.supplier).data
+    return user_data
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare query count and latency of the user details payload before and after caching.'
+
+    def run_benchmark(self, iterations, **options):
+        client_user = CustomUser.objects.create(
+            username='client@example.com', email='client@example.com', user_type='client',
+            first_name='Client', last_name='User', number='0400000000',
+            address='1 Test St', postcode='3000',
+        )
+        Client.objects.create(user=client_user, company_name='Client Co')
+        supplier_user = CustomUser.objects.create(
+            username='supplier@example.com', email='supplier@example.com', user_type='supplier',
+            first_name='Supplier', last_name='User', number='0400000001',
+            address='2 Test St', postcode='3001',
+        )
+        Supplier.objects.create(
+            user=supplier_user, company_name='Supplier Co', company_number='123',
+            company_address='2 Test St', company_postcode='3001', company_type='Logistics',
+            company_description='Boxes', company_logo='logos/boxumCo.png', subcategories='boxes',
+        )
+
+        for user in (client_user, supplier_user):
+            self.stdout.write(f'{user.user_type}:')
+            self.report('  before (uncached, 3 queries)', *measure(lambda: legacy_profile(user.pk), iterations))
+            self.report('  after, cache miss', *measure(lambda: build_profile(load_profile_user(user.pk)), iterations))
+            cache.clear()
+            get_profile(user.pk)
+            self.report('  after, cache hit', *measure(lambda: get_profile(user.pk), iterations))
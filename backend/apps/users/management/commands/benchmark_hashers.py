@@ -0,0 +1,134 @@
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+from apps.users.benchmark import percentile
+from apps.users.hashers import TUNABLE_PARAMETERS
+
+
+# Cost parameter varied per algorithm, and the values tried: multiples of its
+# current value, or for bcrypt's log2 rounds, offsets. Other tunable
+# parameters stay as configured.
+COST_PARAMETERS = {
+    'pbkdf2_sha256': ('iterations', (0.25, 0.5, 1, 1.5, 2, 3)),
+    'argon2': ('memory_cost', (0.25, 0.5, 1, 2, 4)),
+    'bcrypt_sha256': ('rounds', (-2, -1, 0, 1, 2)),
+    'scrypt': ('work_factor', (0.25, 0.5, 1, 2, 4)),
+}
+
+
+def _status_kib(field):
+    with open('/proc/self/status') as status:
+        fields = dict(line.split(':', 1) for line in status)
+    return int(fields[field].split()[0])
+
+
+def _reset_peak_memory():
+    """Reset the process's peak resident memory (Linux only) and return the
+    current one, in KiB."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return _status_kib('VmRSS')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _peak_memory():
+    try:
+        return _status_kib('VmHWM')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(hasher_class, params, repetitions):
+    """Verify latencies (seconds) and peak memory growth (KiB) of
+    ``hasher_class`` with ``params``, run in a fresh process."""
+    hasher = type('Candidate', (hasher_class,), params)()
+    before = _reset_peak_memory()
+    encoded = hasher.encode('correct horse battery staple', hasher.salt())
+    latencies = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        hasher.verify('correct horse battery staple', encoded)
+        latencies.append(time.perf_counter() - start)
+    return latencies, _peak_memory() - before
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure password verify latency and memory for each configured hasher at a range of cost '
+        'parameters on this machine, and recommend PASSWORD_HASHER_PARAMS for a target login latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Acceptable p95 verify latency.')
+        parser.add_argument('--repetitions', type=int, default=5)
+
+    def handle(self, *args, target_ms, repetitions, **options):
+        recommended = {}
+        for hasher in get_hashers():
+            if hasher.algorithm not in COST_PARAMETERS or hasher.algorithm not in TUNABLE_PARAMETERS:
+                continue
+            if hasher.library is not None:
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write(f'{hasher.algorithm}: library not installed, skipped')
+                    continue
+            current = {name: getattr(hasher, name) for name in TUNABLE_PARAMETERS[hasher.algorithm]}
+            self.stdout.write(f'{hasher.algorithm} (current: {self.format_params(current)})')
+            best = None
+            for params in self.candidates(hasher.algorithm, current):
+                latencies, memory_kib = self.measure(type(hasher), params, repetitions)
+                p95 = percentile(latencies, 95) * 1000
+                within = p95 <= target_ms
+                if within:
+                    best = params
+                self.stdout.write(
+                    f'  {self.format_params(params):<48} '
+                    f'p50={percentile(latencies, 50) * 1000:8.1f}ms p95={p95:8.1f}ms '
+                    f'memory={memory_kib / 1024:7.1f}MiB{"" if within else "  over target"}'
+                )
+            if best is not None:
+                recommended[hasher.algorithm] = {
+                    name: value for name, value in best.items() if value != getattr(type(hasher), name)
+                }
+
+        preferred = get_hashers()[0].algorithm
+        self.stdout.write(f'\nRecommended for a {target_ms:g}ms target (new hashes use {preferred}):')
+        self.stdout.write(f'PASSWORD_HASHER_PARAMS = {recommended!r}')
+        self.stdout.write(
+            'Users are rehashed with new parameters at their next login; '
+            '`manage.py password_hash_stats` shows how many are left.'
+        )
+
+    def candidates(self, algorithm, current):
+        name, steps = COST_PARAMETERS[algorithm]
+        seen = []
+        for step in steps:
+            params = dict(current)
+            if algorithm == 'bcrypt_sha256':
+                params[name] = max(4, current[name] + step)
+            else:
+                params[name] = max(2, int(current[name] * step))
+            if algorithm == 'scrypt':
+                # scrypt uses 128 * work_factor * block_size bytes; leave
+                # headroom over that.
+                params['maxmem'] = 256 * params[name] * params['block_size']
+            if params not in seen:
+                seen.append(params)
+        return seen
+
+    def measure(self, hasher_class, params, repetitions):
+        # A fresh process per candidate, so peak memory is its own.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(_measure, hasher_class, params, repetitions).result()
+
+    def format_params(self, params):
+        return ', '.join(f'{name}={value}' for name, value in params.items())
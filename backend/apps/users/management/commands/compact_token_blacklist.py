@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.users.blacklist import get_blacklist_backend
+
+
+class Command(BaseCommand):
+    help = 'Delete expired refresh-token blacklist entries in batches, once or periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TOKEN_BLACKLIST_COMPACT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, compacting every this many seconds.')
+
+    def handle(self, *args, batch_size, interval, **options):
+        backend = get_blacklist_backend()
+        while True:
+            close_old_connections()
+            start = time.perf_counter()
+            removed = backend.compact(batch_size)
+            self.stdout.write(
+                f'Removed {removed} expired entries from {type(backend).__name__} '
+                f'in {time.perf_counter() - start:.2f}s'
+            )
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,160 @@
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+COPY_ALIAS = 'lock_estimate_copy'
+
+# Statements that rewrite or scan a whole table while holding a lock that
+# blocks writes, per vendor.
+BLOCKING_PATTERNS = {
+    'sqlite': [
+        (re.compile(r'CREATE TABLE "new__'), 'rebuilds the table'),
+        (re.compile(r'^CREATE (UNIQUE )?INDEX'), 'blocks writes while the index builds'),
+    ],
+    'postgresql': [
+        (re.compile(r'^CREATE (UNIQUE )?INDEX (?!CONCURRENTLY)'), 'blocks writes while the index builds'),
+        (re.compile(r'SET NOT NULL'), 'scans the table unless a valid NOT NULL check exists'),
+        (re.compile(r'ALTER COLUMN \S+ TYPE'), 'may rewrite the table'),
+        (re.compile(r'ADD CONSTRAINT (?!.*NOT VALID)'), 'scans the table to validate the constraint'),
+    ],
+    'mysql': [
+        (re.compile(r'^ALTER TABLE .*(MODIFY|CHANGE) '), 'may copy the table'),
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Dry run of migrate: apply the unapplied migrations to a copy of the database and report how '
+        'long each holds its locks, its slowest statements, and statements that rewrite or scan a table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?')
+        parser.add_argument('migration_name', nargs='?')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='The database to estimate for. SQLite databases are copied automatically.')
+        parser.add_argument('--copy', help=(
+            'Alias of a database holding a copy of --database (e.g. restored from a snapshot). '
+            'Migrations are applied to it. Required except on SQLite.'
+        ))
+        parser.add_argument('--slowest', type=int, default=5, help='Statements to list per migration.')
+
+    def handle(self, *args, app_label, migration_name, database, copy, slowest, **options):
+        if copy is None:
+            if connections[database].vendor != 'sqlite':
+                raise CommandError('Give --copy, the alias of a copy of the database; migrations are applied to it.')
+            with self.sqlite_copy(database) as copy:
+                self.estimate(copy, app_label, migration_name, slowest)
+        else:
+            if copy == database:
+                raise CommandError('--copy must not be the database itself.')
+            self.estimate(copy, app_label, migration_name, slowest)
+
+    @contextmanager
+    def sqlite_copy(self, database):
+        # SQLite's online backup, so the copy is consistent while the
+        # database is in use.
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        try:
+            connection = connections[database]
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            started = time.monotonic()
+            connection.connection.backup(target)
+            target.close()
+            self.stdout.write(f'Copied {database} to {path} in {time.monotonic() - started:.1f}s.')
+            connections.settings[COPY_ALIAS] = dict(connections.settings[database], NAME=path, TEST={})
+            try:
+                yield COPY_ALIAS
+            finally:
+                connections[COPY_ALIAS].close()
+                del connections[COPY_ALIAS]
+                del connections.settings[COPY_ALIAS]
+        finally:
+            os.remove(path)
+
+    def estimate(self, alias, app_label, migration_name, slowest):
+        connection = connections[alias]
+        # (migration, sql, seconds) per statement.
+        statements = []
+        current = []
+
+        def timed(execute, sql, params, many, context):
+            started = time.monotonic()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if current:
+                    statements.append((current[-1], sql, time.monotonic() - started))
+
+        def progress(action, migration=None, fake=False):
+            if action == 'apply_start':
+                current.append(migration)
+
+        executor = MigrationExecutor(connection, progress)
+        executor.loader.check_consistent_history(connection)
+        targets = self.targets(executor, app_label, migration_name)
+        plan = executor.migration_plan(targets)
+        if not plan:
+            self.stdout.write('No migrations to apply.')
+            return
+        if any(backwards for migration, backwards in plan):
+            raise CommandError('Only forward migrations can be estimated.')
+
+        # As executor.migrate(), timing each migration on its own.
+        state = executor._create_project_state(with_applied_migrations=True)
+        # Render the models up front, as migrate does, so it isn't timed.
+        state.apps
+        timings = []
+        with connection.execute_wrapper(timed):
+            for migration, backwards in plan:
+                started = time.monotonic()
+                state = executor.apply_migration(state, migration)
+                timings.append((migration, time.monotonic() - started))
+
+        patterns = BLOCKING_PATTERNS.get(connection.vendor, [])
+        for migration, seconds in timings:
+            own = [(sql, duration) for owner, sql, duration in statements if owner is migration]
+            atomic = migration.atomic and connection.features.can_rollback_ddl
+            # An atomic migration holds every lock it takes until it commits;
+            # otherwise each statement's locks go when it finishes.
+            locked = seconds if atomic else max((duration for sql, duration in own), default=0)
+            self.stdout.write(
+                f'{migration.app_label}.{migration.name}: {seconds:.2f}s, locks held up to {locked:.2f}s '
+                f'({"one transaction" if atomic else "per statement"}), {len(own)} statements'
+            )
+            for sql, duration in sorted(own, key=lambda item: -item[1])[:slowest]:
+                self.stdout.write(f'  {duration:8.3f}s  {_shorten(sql)}')
+            for sql, duration in own:
+                for pattern, problem in patterns:
+                    if pattern.search(sql):
+                        self.stdout.write(self.style.WARNING(f'  {problem} ({duration:.3f}s): {_shorten(sql)}'))
+
+    def targets(self, executor, app_label, migration_name):
+        # As migrate's positional arguments.
+        if app_label is None:
+            return executor.loader.graph.leaf_nodes()
+        if app_label not in executor.loader.migrated_apps:
+            raise CommandError(f"App '{app_label}' does not have migrations.")
+        if migration_name is None:
+            return [key for key in executor.loader.graph.leaf_nodes() if key[0] == app_label]
+        try:
+            migration = executor.loader.get_migration_by_prefix(app_label, migration_name)
+        except KeyError as error:
+            raise CommandError(str(error))
+        return [(app_label, migration.name)]
+
+
+def _shorten(sql, length=160):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= length else f'{sql[:length - 3]}...'
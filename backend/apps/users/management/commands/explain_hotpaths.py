@@ -0,0 +1,102 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models.functions import Lower
+from django_otp.plugins.otp_totp.models import TOTPDevice
+
+from apps.supplier.filters import filter_suppliers, prefix_range
+from apps.users.models import Client, CustomUser, Supplier
+from apps.users.profile import annotate_mfa
+
+
+EMAIL = 'someone@example.com'
+
+# (label, queryset) for the queries behind the hot endpoints. The values are
+# placeholders: the plan doesn't depend on whether they match.
+HOT_PATHS = [
+    ('login: user by email, with MFA flag', lambda: annotate_mfa(CustomUser.objects.filter(email=EMAIL))),
+    ('profile: user with client/supplier and MFA flag', lambda: annotate_mfa(
+        CustomUser.objects.select_related('client', 'supplier')).filter(pk=1)),
+    ('check-if-client: user_type by email', lambda: CustomUser.objects.filter(email=EMAIL).values_list('user_type')),
+    ('mfa: confirmed TOTP device of a user', lambda: TOTPDevice.objects.filter(user_id=1, confirmed=True)),
+    ('admin: user by case-insensitive email', lambda: CustomUser.objects.alias(
+        search_email=Lower('email')).filter(search_email=EMAIL)),
+    ('admin: client by case-insensitive email', lambda: Client.objects.alias(
+        search_email=Lower('user__email')).filter(search_email=EMAIL)),
+    ('admin: users of a type, newest first', lambda: CustomUser.objects.filter(user_type='supplier').order_by('-pk')[:100]),
+    ('supplier search: company type', lambda: filter_suppliers(
+        Supplier.objects.all(), company_type='plumbing').order_by('pk')[:20]),
+    ('supplier search: postcode prefix', lambda: filter_suppliers(
+        Supplier.objects.all(), postcode='30').order_by('pk')[:20]),
+    ('supplier search: company type and postcode prefix', lambda: filter_suppliers(
+        Supplier.objects.all(), company_type='plumbing', postcode='30').order_by('pk')[:20]),
+    ('supplier search: subcategory tags', lambda: filter_suppliers(
+        Supplier.objects.all(), subcategories=['gas', 'drainage']).order_by('pk')[:20]),
+    ('nearest suppliers: geohash cell', lambda: Supplier.objects.filter(
+        company_geohash__gte=prefix_range('gcpvj')[0], company_geohash__lt=prefix_range('gcpvj')[1],
+    ).values_list('pk', 'company_geohash')),
+]
+
+# Plan lines that read a whole table, per vendor.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)'),
+    'postgresql': re.compile(r'Seq Scan on'),
+    'mysql': re.compile(r'\btype=ALL\b'),
+}
+# Plan lines that sort the matching rows. Expected where a range or join
+# filter is combined with ORDER BY pk; only worth a look if the filter
+# matches many rows.
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE'),
+    'postgresql': re.compile(r'\bSort\b'),
+    'mysql': re.compile(r'Using filesort'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the query plan of each hot query, flagging full table scans and sorts, to check '
+        'that the indexes cover them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any hot query scans a table.')
+
+    def handle(self, *args, database, fail_on_scan, **options):
+        connection = connections[database]
+        scan_pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        sort_pattern = SORT_PATTERNS.get(connection.vendor)
+        if scan_pattern is None:
+            self.stdout.write(f'No scan detection for {connection.vendor}; printing plans only.')
+
+        scanning = []
+        for label, queryset in HOT_PATHS:
+            plan = self.explain(connection, queryset().using(database)).splitlines()
+            if scan_pattern and any(scan_pattern.search(line) for line in plan):
+                scanning.append(label)
+                verdict = 'SCAN'
+            elif sort_pattern and any(sort_pattern.search(line) for line in plan):
+                verdict = 'sort'
+            else:
+                verdict = 'ok'
+            self.stdout.write(f'{verdict:<5} {label}')
+            for line in plan:
+                self.stdout.write(f'      {line}')
+
+        self.stdout.write(f'\n{len(HOT_PATHS) - len(scanning)} of {len(HOT_PATHS)} hot queries avoid full table scans.')
+        if scanning and fail_on_scan:
+            raise CommandError(f'Full scans in: {", ".join(scanning)}')
+
+    def explain(self, connection, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # On small or unanalyzed tables the planner prefers sequential scans
+        # even where an index would serve; rule those out, so a Seq Scan in
+        # the plan means no index can.
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
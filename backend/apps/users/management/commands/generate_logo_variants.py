@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.logos import generate_variants
+from apps.users.models import Supplier
+
+
+class Command(BaseCommand):
+    help = 'Generate resized logo variants for suppliers that have none (imported or older suppliers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate variants for every supplier with a logo.')
+
+    def handle(self, *args, all, **options):
+        queryset = Supplier.objects.exclude(company_logo='')
+        if not all:
+            queryset = queryset.filter(company_logo_variants={})
+        done = failed = 0
+        for supplier in queryset.iterator(chunk_size=500):
+            try:
+                generate_variants(supplier)
+                done += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f'Supplier {supplier.pk}: {exc}')
+        self.stdout.write(f'Generated variants for {done} suppliers ({failed} failed)')
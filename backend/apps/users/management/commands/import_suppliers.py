@@ -0,0 +1,81 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.users.importing import chunked, import_chunk, read_rows
+
+
+def _init_worker():
+    # No-op when the pool forks; needed for the spawn start method.
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Bulk import suppliers from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Input format; defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes; 0 imports in this process.')
+        parser.add_argument('--errors', help='Write per-row errors as JSON lines to this file instead of stderr.')
+
+    def handle(self, path, format, chunk_size, workers, errors, **options):
+        file_format = format or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError('Cannot tell the input format; pass --format csv or --format jsonl.')
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+
+        self.error_output = open(errors, 'w') if errors else self.stderr
+        self.totals = {'created': 0, 'skipped': 0, 'errors': 0}
+        chunks = chunked(read_rows(path, file_format), chunk_size)
+        start = time.perf_counter()
+        try:
+            if workers:
+                self.import_parallel(chunks, workers)
+            else:
+                for chunk in chunks:
+                    self.collect(import_chunk(chunk))
+        finally:
+            if errors:
+                self.error_output.close()
+
+        elapsed = time.perf_counter() - start
+        processed = sum(self.totals.values())
+        self.stdout.write(
+            f'{processed} rows in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f} rows/s): '
+            f'{self.totals["created"]} created, {self.totals["skipped"]} skipped, '
+            f'{self.totals["errors"]} errors'
+        )
+
+    def import_parallel(self, chunks, workers):
+        # Children must not inherit the parent's open connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            in_flight = set()
+            for chunk in chunks:
+                # Only read ahead a couple of chunks per worker, so memory use
+                # doesn't depend on the size of the input.
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.collect(future.result())
+                in_flight.add(pool.submit(import_chunk, chunk))
+            for future in wait(in_flight).done:
+                self.collect(future.result())
+
+    def collect(self, result):
+        self.totals['created'] += result['created']
+        self.totals['skipped'] += result['skipped']
+        self.totals['errors'] += len(result['errors'])
+        for line_no, row_errors in result['errors']:
+            self.error_output.write(json.dumps({'line': line_no, 'errors': row_errors}) + '\n')
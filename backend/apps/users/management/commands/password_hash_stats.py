@@ -0,0 +1,55 @@
+from collections import Counter
+
+from django.contrib.auth.hashers import get_hashers, identify_hasher, is_password_usable
+from django.core.management.base import BaseCommand
+
+from apps.users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Report which password hashers and parameters CustomUser passwords are stored with, and what '
+        'fraction still need rehashing with the current PASSWORD_HASHERS / PASSWORD_HASHER_PARAMS.'
+    )
+
+    def handle(self, *args, **options):
+        preferred = get_hashers()[0]
+        groups = Counter()
+        outdated = total = 0
+        for encoded in CustomUser.objects.values_list('password', flat=True).iterator(chunk_size=2000):
+            total += 1
+            group, current = self.classify(encoded, preferred)
+            groups[group, current] += 1
+            if not current:
+                outdated += 1
+
+        self.stdout.write(f'Users: {total}')
+        for (group, current), count in groups.most_common():
+            marker = 'current' if current else 'outdated'
+            self.stdout.write(f'  {count:>8} {count / total:7.1%}  {marker:<9} {group}')
+        if total:
+            self.stdout.write(
+                f'{outdated} of {total} ({outdated / total:.1%}) are not on the current parameters '
+                f'and will be rehashed at their next login.'
+            )
+
+    def classify(self, encoded, preferred):
+        """(description of the hasher and parameters, whether they are current)."""
+        if not is_password_usable(encoded):
+            # Nothing to rehash until the user sets a password.
+            return 'unusable password', True
+        try:
+            hasher = identify_hasher(encoded)
+        except ValueError:
+            return 'unknown hasher', False
+        try:
+            decoded = hasher.decode(encoded)
+        except (ValueError, TypeError):
+            # The hasher's library isn't installed.
+            return f'{hasher.algorithm} (cannot decode)', False
+        params = ', '.join(
+            f'{name}={value}' for name, value in sorted(decoded.items())
+            if name not in ('algorithm', 'hash', 'salt')
+        )
+        current = hasher.algorithm == preferred.algorithm and not preferred.must_update(encoded)
+        return f'{hasher.algorithm} {params}'.strip(), current
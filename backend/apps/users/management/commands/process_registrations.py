@@ -0,0 +1,72 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from apps.users.models import PendingRegistration
+from apps.users.registration import claim, process_registration, requeue_stale
+
+
+logger = logging.getLogger('apps.users.registration')
+
+
+def _handle(pending_id):
+    try:
+        if not claim(pending_id):
+            return None
+        return process_registration(PendingRegistration.objects.get(pk=pending_id)).status
+    except Exception:
+        # Couldn't even record the outcome (e.g. the database is down). The
+        # row stays in processing, to be requeued or failed by
+        # requeue_stale; keep the worker going.
+        logger.exception('Registration %s could not be processed', pending_id)
+        return 'error'
+    finally:
+        # Each pool thread holds its own connection; don't leave it open
+        # between batches.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Process queued client/supplier registrations with a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REGISTRATION_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue rows stuck in processing for this many seconds.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of polling.')
+
+    def handle(self, *args, workers, batch_size, interval, stale_after, once, **options):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                close_old_connections()
+                requeued, failed = requeue_stale(stale_after)
+                if requeued or failed:
+                    self.stdout.write(f'Requeued {requeued} stale registrations, failed {failed} out of attempts')
+
+                pending_ids = list(
+                    PendingRegistration.objects.filter(status='pending')
+                    .order_by('created_at')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if pending_ids:
+                    start = time.perf_counter()
+                    results = [result for result in pool.map(_handle, pending_ids) if result]
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'Processed {len(results)} registrations in {elapsed:.2f}s '
+                        f'({results.count("done")} done, {results.count("failed")} failed, '
+                        f'{results.count("pending")} to retry, {results.count("error")} errors)'
+                    )
+                    continue
+
+                if once:
+                    break
+                time.sleep(interval)
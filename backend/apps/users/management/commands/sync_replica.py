@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.users.replicas import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database into the SQLite replica file, standing in for replication '
+        'when trying out read-replica routing locally.'
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA_ALIAS not in connections.databases:
+            raise CommandError('No replica database configured; set DB_REPLICA_NAME.')
+        primary, replica = connections['default'], connections[REPLICA_ALIAS]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases.')
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        self.stdout.write(f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]}')
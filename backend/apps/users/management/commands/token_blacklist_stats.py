@@ -0,0 +1,37 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from apps.users.benchmark import percentile
+from apps.users.blacklist import get_blacklist_backend
+
+
+class Command(BaseCommand):
+    help = 'Report the size of the refresh-token blacklist store and how long blacklist lookups take.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=200)
+
+    def handle(self, *args, samples, **options):
+        backend = get_blacklist_backend()
+        self.stdout.write(f'Backend: {type(backend).__name__}')
+        for label, value in backend.stats().items():
+            self.stdout.write(f'  {label}: {value}')
+
+        # Blacklisted jtis and unknown ones (the common case: a valid token).
+        for label, jtis in (
+            ('blacklisted', backend.sample_jtis(samples)),
+            ('not blacklisted', [uuid.uuid4().hex for _ in range(samples)]),
+        ):
+            if not jtis:
+                continue
+            latencies = []
+            for jti in jtis:
+                start = time.perf_counter()
+                backend.is_blacklisted(jti)
+                latencies.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'  lookup, {label}: n={len(latencies)} '
+                f'p50={percentile(latencies, 50) * 1000:.3f}ms p95={percentile(latencies, 95) * 1000:.3f}ms'
+            )
@@ -0,0 +1,212 @@
+import hashlib
+import math
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import record_cache
+from .models import CustomUser
+
+
+MEMBER_CACHE_PREFIX = 'users:member:'
+GENERATION_CACHE_KEY = 'users:member-changes'
+CHANGE_CACHE_PREFIX = 'users:member-changes:'
+# A filter further behind than this is rebuilt rather than caught up.
+MAX_REPLAYED_CHANGES = 1000
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: ``in`` is never wrong for added
+    items and wrong for about ``error_rate`` of the rest.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def member_cache_key(email):
+    return f'{MEMBER_CACHE_PREFIX}{hashlib.sha1(email.encode()).hexdigest()}'
+
+
+def change_cache_key(generation):
+    return f'{CHANGE_CACHE_PREFIX}{generation}'
+
+
+class MembershipFilter:
+    """
+    This process's Bloom filter of every user's email, built from the
+    database and kept in memory, so lookups don't unpickle it from the
+    cache.
+
+    Processes share new emails through the cache: add_members bumps the
+    GENERATION_CACHE_KEY counter and stores the emails under the new
+    generation. A filter behind the shared generation replays the emails it
+    hasn't seen before answering; if any are gone from the cache, it is
+    rebuilt instead. It is also rebuilt every MEMBERSHIP_FILTER_TIMEOUT.
+
+    One thread rebuilds, outside the lock, and swaps the new filter in.
+    Meanwhile the others keep using the old filter if it is up to date with
+    the shared generation, and otherwise leave the answer to the database.
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.generation = None
+        self.expires = 0
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    def is_current(self, generation):
+        return self.bloom is not None and time.monotonic() < self.expires and generation == self.generation
+
+    def might_contain(self, email, generation):
+        """False if no user has this email, given the shared generation."""
+        if not self.is_current(generation):
+            with self.lock:
+                rebuild = not self.is_current(generation) and not self.catch_up(generation)
+                build = rebuild and not self.rebuilding
+                if build:
+                    self.rebuilding = True
+            if build:
+                try:
+                    self.rebuild()
+                finally:
+                    self.rebuilding = False
+            elif rebuild:
+                bloom = self.bloom
+                return bloom is None or generation != self.generation or email in bloom
+        return email in self.bloom
+
+    def catch_up(self, generation):
+        """Replay the changes up to ``generation`` from the cache; False if
+        the filter has to be rebuilt instead."""
+        if self.bloom is None or time.monotonic() >= self.expires or generation is None:
+            return False
+        if self.generation is None or generation < self.generation:
+            # The counter was lost from the cache and started again.
+            return False
+        keys = [change_cache_key(n) for n in range(self.generation + 1, generation + 1)]
+        if len(keys) > MAX_REPLAYED_CHANGES:
+            return False
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        for emails in changes.values():
+            for email in emails:
+                self.bloom.add(email)
+        self.generation = generation
+        return True
+
+    def rebuild(self):
+        # Read first: changes made during the build are replayed later, and
+        # replaying one already in the filter is harmless.
+        generation = _current_generation()
+        capacity = max(1000, CustomUser.objects.count() * 2)
+        bloom = BloomFilter(capacity, settings.MEMBERSHIP_FILTER_ERROR_RATE)
+        for email in CustomUser.objects.values_list('email', flat=True).iterator(chunk_size=5000):
+            bloom.add(email)
+        with self.lock:
+            self.bloom, self.generation = bloom, generation
+            self.expires = time.monotonic() + settings.MEMBERSHIP_FILTER_TIMEOUT
+
+
+_filter = MembershipFilter()
+
+
+def _current_generation():
+    # The counter starts at a random number, so one lost from the cache and
+    # started again is never mistaken for the old one: filters synced to
+    # the old one rebuild rather than replaying the wrong changes.
+    cache.add(GENERATION_CACHE_KEY, random.randrange(1 << 48), timeout=None)
+    return cache.get(GENERATION_CACHE_KEY)
+
+
+def _answer(cached, email):
+    # (answered, user_type) from the per-email cache entry, or from the
+    # filter when the entry is missing.
+    user_type = cached.get(member_cache_key(email))
+    record_cache('membership', user_type is not None)
+    if user_type is not None:
+        return True, user_type or None
+    if _filter.is_current(cached.get(GENERATION_CACHE_KEY)) and email not in _filter.bloom:
+        return True, None
+    return False, None
+
+
+def lookup_user_type(email):
+    """
+    Return the user_type of the user with this email, or None if there is
+    none. Known emails are answered from the per-email cache, and most
+    unknown ones by the Bloom filter of all emails, so the database is
+    only asked about filter false positives and cache misses.
+    """
+    key = member_cache_key(email)
+    cached = cache.get_many([key, GENERATION_CACHE_KEY])
+    answered, user_type = _answer(cached, email)
+    if answered:
+        return user_type
+    if not _filter.might_contain(email, cached.get(GENERATION_CACHE_KEY)):
+        return None
+    user_type = CustomUser.objects.filter(email=email).values_list('user_type', flat=True).first()
+    # '' caches a filter false positive, so repeats skip the database too.
+    timeout = settings.MEMBERSHIP_CACHE_TIMEOUT if user_type else settings.MEMBERSHIP_NEGATIVE_CACHE_TIMEOUT
+    cache.set(key, user_type or '', timeout)
+    return user_type
+
+
+async def alookup_user_type(email):
+    key = member_cache_key(email)
+    cached = await cache.aget_many([key, GENERATION_CACHE_KEY])
+    answered, user_type = _answer(cached, email)
+    if answered:
+        return user_type
+    # Syncing the filter may read the database.
+    if not await sync_to_async(_filter.might_contain)(email, cached.get(GENERATION_CACHE_KEY)):
+        return None
+    user_type = await CustomUser.objects.filter(email=email).values_list('user_type', flat=True).afirst()
+    timeout = settings.MEMBERSHIP_CACHE_TIMEOUT if user_type else settings.MEMBERSHIP_NEGATIVE_CACHE_TIMEOUT
+    await cache.aset(key, user_type or '', timeout)
+    return user_type
+
+
+def add_members(users):
+    """Record new or updated users, once the current transaction commits;
+    called from post_save and after bulk inserts."""
+    members = {user.email: user.user_type for user in users}
+    transaction.on_commit(lambda: _publish(members))
+
+
+def _publish(members):
+    cache.set_many(
+        {member_cache_key(email): user_type for email, user_type in members.items()},
+        settings.MEMBERSHIP_CACHE_TIMEOUT,
+    )
+    _current_generation()
+    generation = cache.incr(GENERATION_CACHE_KEY)
+    cache.set(change_cache_key(generation), list(members), settings.MEMBERSHIP_FILTER_TIMEOUT)
+
+
+def forget_emails(emails):
+    # A Bloom filter can't forget; lookups for these emails fall through to
+    # the database and are then negative-cached.
+    cache.delete_many([member_cache_key(email) for email in emails])
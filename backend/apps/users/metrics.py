@@ -0,0 +1,344 @@
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow (+Inf) bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (inf if it
+        falls in the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    """
+    In-process metrics, keyed by name and label values. Cheap enough to
+    record on every request: one lock and a bisect per observation.
+    """
+
+    def __init__(self, buckets=None):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        # Histogram buckets by metric name, for metrics that aren't latencies.
+        self._buckets = buckets or {}
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            self._observe(name, value, labels)
+
+    def observe_many(self, observations):
+        """Record (name, value, labels dict) observations under one lock."""
+        with self._lock:
+            for name, value, labels in observations:
+                self._observe(name, value, labels)
+
+    def _observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+        histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def histograms(self):
+        """(name, labels dict, Histogram) for everything recorded so far."""
+        with self._lock:
+            items = list(self._histograms.items())
+        return [(name, dict(labels), histogram) for (name, labels), histogram in items]
+
+    def counters(self):
+        """(name, labels dict, value) for every counter."""
+        with self._lock:
+            items = list(self._counters.items())
+        return [(name, dict(labels), value) for (name, labels), value in items]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Everything recorded so far, as JSON-serialisable data."""
+        with self._lock:
+            return {
+                'histograms': [
+                    [name, labels, histogram.buckets, histogram.counts, histogram.count, histogram.sum]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+            }
+
+    def merge(self, snapshot):
+        """Add another registry's snapshot to this one."""
+        with self._lock:
+            for name, labels, buckets, counts, count, total in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(tuple(buckets))
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.sum += total
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(registry):
+    """``registry`` in the Prometheus text exposition format."""
+    lines = []
+    histograms = sorted(registry.histograms(), key=lambda item: (item[0], sorted(item[1].items())))
+    counters = sorted(registry.counters(), key=lambda item: (item[0], sorted(item[1].items())))
+    declared = set()
+    for name, labels, histogram in histograms:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+    for name, labels, value in counters:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Buckets for per-request query counts.
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+registry = Registry(buckets={'http_request_db_queries': QUERY_COUNT_BUCKETS})
+observe = registry.observe
+timer = registry.timer
+inc = registry.inc
+
+
+# With METRICS_DIR set, each process writes its registry to a file there
+# (at most every METRICS_WRITE_SECONDS, and before serving a scrape) and
+# /metrics adds up every file, so whichever worker is scraped reports for
+# all of them. Files of exited processes stay, so counters never go down.
+_snapshot_lock = threading.Lock()
+_snapshot_file = {'pid': None, 'directory': None, 'path': None, 'written': 0.0}
+
+
+def snapshot_path(directory):
+    # Named per process start rather than by pid alone: a new process that
+    # gets an old one's pid mustn't overwrite its totals. Worked out again
+    # after a fork.
+    if _snapshot_file['pid'] != os.getpid() or _snapshot_file['directory'] != directory:
+        os.makedirs(directory, exist_ok=True)
+        _snapshot_file.update(
+            pid=os.getpid(), directory=directory, written=0.0,
+            path=os.path.join(directory, f'{os.getpid()}-{uuid.uuid4().hex}.json'),
+        )
+    return _snapshot_file['path']
+
+
+def write_snapshot(directory, force=False):
+    """Write this process's registry to ``directory``, unless it was written
+    less than METRICS_WRITE_SECONDS ago."""
+    if not _snapshot_lock.acquire(blocking=force):
+        # Another thread is writing it.
+        return
+    try:
+        path = snapshot_path(directory)
+        now = time.monotonic()
+        if not force and now - _snapshot_file['written'] < settings.METRICS_WRITE_SECONDS:
+            return
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(registry.snapshot(), file)
+        os.replace(temporary, path)
+        _snapshot_file['written'] = now
+    finally:
+        _snapshot_lock.release()
+
+
+def collect(directory):
+    """A registry adding up the snapshots of every process in ``directory``."""
+    write_snapshot(directory, force=True)
+    merged = Registry()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                merged.merge(json.load(file))
+        except FileNotFoundError:
+            pass
+    return merged
+
+
+def record_cache(cache_name, hit):
+    """Count a lookup in one of the read-through caches, for hit rates."""
+    registry.inc('cache_lookups_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+# Queries and query time of the request being served.
+_request_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding to the current request's RequestStats.
+    Installed on every connection by install_query_wrapper."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # connection_created receiver. Connections are per thread and sent
+    # again on reconnect, so only add the wrapper once.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """
+    Records, per view: request latency, and how many queries the request ran
+    and how long they took. Views are labelled by URL name, so the number of
+    series stays bounded; unrouted requests are labelled 'unmatched'.
+
+    Goes first in MIDDLEWARE, so the latency covers the whole stack.
+    Disabled with METRICS_ENABLED = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match is not None else 'unmatched'
+        registry.observe_many([
+            ('http_request_duration_seconds', elapsed,
+             {'view': view, 'method': request.method, 'status': f'{response.status_code // 100}xx'}),
+            ('http_request_db_queries', stats.queries, {'view': view}),
+            ('http_request_db_seconds', stats.query_seconds, {'view': view}),
+        ])
+        if settings.METRICS_DIR:
+            write_snapshot(settings.METRICS_DIR)
+
+
+def metrics_view(request):
+    """GET /metrics: the registry in Prometheus text format, or every
+    process's with METRICS_DIR set. Routed when METRICS_ENDPOINT is set;
+    with METRICS_TOKEN set, scrapers must send it as a bearer token."""
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}',
+    ):
+        return HttpResponseForbidden()
+    collected = collect(settings.METRICS_DIR) if settings.METRICS_DIR else registry
+    return HttpResponse(render_prometheus(collected), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import io
+
+import pyotp
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import record_cache
+
+
+MFA_ENROLLMENT_CACHE_PREFIX = 'users:mfa:enrollment:'
+QR_FORMATS = ('png', 'svg')
+ISSUER_NAME = 'BoxumCo'
+
+
+def enrollment_cache_key(device_key, image_format):
+    # The device key is the TOTP secret; keep it out of cache keys.
+    digest = hashlib.sha256(device_key.encode()).hexdigest()
+    return f'{MFA_ENROLLMENT_CACHE_PREFIX}{digest}:{image_format}'
+
+
+def build_enrollment(device, email, image_format):
+    # Convert the device's key from hex to Base32.
+    b32_key = base64.b32encode(bytes.fromhex(device.key)).decode('utf-8')
+    provisioning_uri = pyotp.TOTP(b32_key).provisioning_uri(name=email, issuer_name=ISSUER_NAME)
+
+    if image_format == 'svg':
+        qr = qrcode.QRCode(version=1, box_size=10, border=5, image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(provisioning_uri)
+    qr.make(fit=True)
+    img = qr.make_image()
+    if image_format == 'svg':
+        qr_code = img.to_string(encoding='unicode')
+    else:
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        qr_code = base64.b64encode(buffered.getvalue()).decode()
+
+    return {'provisioning_uri': provisioning_uri, 'qr_code': qr_code, 'format': image_format}
+
+
+def get_enrollment(device, email, image_format='png'):
+    """
+    Provisioning URI and QR code (base64 PNG or SVG markup) for an
+    unconfirmed TOTPDevice, rendered once and then served from the cache
+    until the device is confirmed or deleted.
+    """
+    key = enrollment_cache_key(device.key, image_format)
+    enrollment = cache.get(key)
+    record_cache('mfa_enrollment', enrollment is not None)
+    if enrollment is None:
+        enrollment = build_enrollment(device, email, image_format)
+        cache.set(key, enrollment, settings.MFA_ENROLLMENT_CACHE_TIMEOUT)
+    return enrollment
+
+
+def invalidate_enrollment(device):
+    cache.delete_many([enrollment_cache_key(device.key, image_format) for image_format in QR_FORMATS])
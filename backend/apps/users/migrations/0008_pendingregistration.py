@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:42
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_alter_customuser_dob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRegistration',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_type', models.CharField(choices=[('client', 'Client'), ('supplier', 'Supplier')], max_length=10)),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('payload', models.JSONField()),
+                ('company_logo', models.FileField(blank=True, upload_to='registrations/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('errors', models.JSONField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_pendingregistration'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='supplier',
+            name='company_postcode',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['company_type', 'user'], name='users_supplier_type_user_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_supplier_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='company_geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_supplier_company_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='company_logo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_supplier_company_logo_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('jti', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('shard', models.PositiveIntegerField(db_index=True)),
+            ],
+        ),
+    ]
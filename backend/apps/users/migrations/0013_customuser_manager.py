@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:40
+
+import apps.users.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', apps.users.models.CustomUserManager()),
+            ],
+        ),
+    ]
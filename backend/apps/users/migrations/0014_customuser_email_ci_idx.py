@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0013_customuser_manager'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_customuser_email_ci_idx'),
+        ),
+    ]
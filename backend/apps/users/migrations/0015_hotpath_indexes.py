@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0014_customuser_email_ci_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['user_type', 'id'], name='users_customuser_type_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['company_type', 'company_postcode'], name='users_supplier_type_pc_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+# TOTPDevice belongs to django_otp, so its index is added here rather than
+# through the model's Meta: user_has_mfa, verify_mfa_code and the profile's
+# mfa_enabled subquery all filter on (user, confirmed).
+INDEX = models.Index(fields=['user', 'confirmed'], name='otp_totp_user_confirmed_idx')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('otp_totp', 'TOTPDevice'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('otp_totp', 'TOTPDevice'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otp_totp', '0003_add_timestamps'),
+        ('users', '0015_hotpath_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
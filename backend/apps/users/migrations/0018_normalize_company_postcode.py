@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+# A frozen copy of apps.supplier.filters.normalize_postcode, so later changes
+# to it don't change what this migration does.
+def normalize_postcode(postcode):
+    return ' '.join((postcode or '').upper().split())
+
+
+def normalize_company_postcodes(apps, schema_editor):
+    Supplier = apps.get_model('users', 'Supplier')
+    changed = []
+    for supplier in Supplier.objects.only('pk', 'company_postcode').iterator(chunk_size=BATCH_SIZE):
+        postcode = normalize_postcode(supplier.company_postcode)
+        if postcode != supplier.company_postcode:
+            supplier.company_postcode = postcode
+            changed.append(supplier)
+        if len(changed) >= BATCH_SIZE:
+            Supplier.objects.bulk_update(changed, ['company_postcode'])
+            changed = []
+    Supplier.objects.bulk_update(changed, ['company_postcode'])
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own rather than holding row locks on the
+    # whole supplier table until the end.
+    atomic = False
+
+    dependencies = [
+        ('users', '0017_backfillprogress'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_company_postcodes, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,25 @@
-from django.contrib.auth.models import AbstractUser
+import uuid
+
+from django.apps import apps
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models.functions import Lower
+
+from . import hashing
+
+
+class CustomUserManager(UserManager):
+    def _create_user(self, username, email, password, **extra_fields):
+        # UserManager._create_user, hashing through apps.users.hashing.
+        if not username:
+            raise ValueError('The given username must be set')
+        email = self.normalize_email(email)
+        GlobalUserModel = apps.get_model(self.model._meta.app_label, self.model._meta.object_name)
+        username = GlobalUserModel.normalize_username(username)
+        user = self.model(username=username, email=email, **extra_fields)
+        user.password = hashing.make_password(password)
+        user.save(using=self._db)
+        return user
 
 class CustomUser(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -16,9 +36,42 @@ class CustomUser(AbstractUser):
     dob = models.DateField(default='2000-01-01')
     password = models.CharField(max_length=128)
 
+    objects = CustomUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive email lookups, e.g. the admin search.
+            models.Index(Lower('email'), name='users_customuser_email_ci_idx'),
+            # The admin's user_type filter, newest first.
+            models.Index(fields=['user_type', 'id'], name='users_customuser_type_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # The email as stored, so saves can tell it changed (see
+        # apps.users.signals).
+        user._stored_email = user.__dict__.get('email')
+        return user
+
+    # Password hashing runs on the hashing service's worker processes; API
+    # views that shed load get HashingBusy when they are saturated.
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        valid, must_update = hashing.verify_password(raw_password, self.password)
+        if valid and must_update:
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+        return valid
+
     def __str__(self):
         return f"{self.username} ({self.user_type})"
 
@@ -31,8 +84,83 @@ class Supplier(models.Model):
     company_name = models.CharField(max_length=255)
     company_number = models.CharField(max_length=20)
     company_address = models.CharField(max_length=255)
-    company_postcode = models.CharField(max_length=20)
+    company_postcode = models.CharField(max_length=20, db_index=True)
     company_type = models.CharField(max_length=255)
     company_description = models.CharField(max_length=250)
     company_logo = models.ImageField(upload_to='logos/')
-    subcategories = models.CharField(max_length=255)
\ No newline at end of file
+    # Resized copies of company_logo, {size: {format: storage name}}, written
+    # by apps.users.logos after the upload.
+    company_logo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    subcategories = models.CharField(max_length=255)
+    # Geohash of the company postcode, kept up to date by apps.supplier.
+    # Nearest-supplier lookups range scan its prefixes.
+    company_geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Serves "company_type = X ORDER BY pk" for supplier search
+            # without a sort.
+            models.Index(fields=['company_type', 'user'], name='users_supplier_type_user_idx'),
+            # Company type together with a postcode prefix.
+            models.Index(fields=['company_type', 'company_postcode'], name='users_supplier_type_pc_idx'),
+        ]
+
+class PendingRegistration(models.Model):
+    """
+    A validated client/supplier signup waiting for the registration worker
+    (``manage.py process_registrations``) to store the logo and create the
+    user and role rows.
+
+    ``payload`` holds the submitted form fields, with the password already
+    hashed, until the worker has processed the row; it is scrubbed
+    afterwards.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_type = models.CharField(max_length=10, choices=CustomUser.USER_TYPE_CHOICES)
+    email = models.EmailField(db_index=True)
+    payload = models.JSONField()
+    company_logo = models.FileField(upload_to='registrations/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    errors = models.JSONField(null=True, blank=True)
+    user = models.OneToOneField(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.email} ({self.status})"
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked refresh token, for apps.users.blacklist.RevokedTokenBlacklist.
+    ``shard`` is the expiry hour (epoch hours, rounded up), so expired rows
+    are removed by shard rather than one by one.
+    """
+    jti = models.CharField(max_length=64, primary_key=True)
+    shard = models.PositiveIntegerField(db_index=True)
+
+
+class BackfillProgress(models.Model):
+    """
+    How far an apps.users.online_migrations.Backfill has got: the last
+    primary key it updated, saved in the same transaction as each batch.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.CharField(max_length=255, blank=True)
+    rows_done = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'backfill progress'
+
+    def __str__(self):
+        return f"{self.name} ({'finished' if self.finished_at else f'{self.rows_done} rows'})"
@@ -0,0 +1,439 @@
+"""
+Migration operations and a batched backfill for changing large tables (the
+user, client and supplier tables) without holding locks that stall
+requests.
+
+Schema changes only ever wait ONLINE_MIGRATION_LOCK_TIMEOUT seconds for
+their table lock, and retry in migrations with ``atomic = False``, rather
+than queueing every query behind them while a long transaction finishes.
+Anything that would rewrite or scan the table under an exclusive lock is
+refused or split up:
+
+- AddFieldOnline adds nullable columns only, without a default; fill them
+  with a Backfill.
+- AddIndexOnline/RemoveIndexOnline build and drop indexes CONCURRENTLY on
+  PostgreSQL (in a migration with ``atomic = False``).
+- SetNotNullOnline checks existing rows through a NOT VALID constraint,
+  which is validated without blocking writes, before setting NOT NULL.
+
+Destructive changes are split into expand and contract phases, each its
+own release. Renaming ``old`` to ``new``, for example:
+
+1. AddFieldOnline ``new``; the code writes both columns.
+2. ``manage.py backfill`` copies ``old`` into ``new`` for existing rows.
+3. SetNotNullOnline ``new`` if needed; the code reads ``new``.
+4. DeprecateField ``old``: gone from the models, its column kept but made
+   nullable, so servers still running the previous release keep working.
+5. DropDeprecatedColumn ``old``, once no deployed code uses it.
+
+``manage.py estimate_migration_locks`` applies pending migrations to a copy
+of the database and reports how long each holds its locks.
+"""
+import time
+
+from django.conf import settings
+from django.db import NotSupportedError, OperationalError, migrations, transaction
+from django.db.backends.utils import names_digest, split_identifier, truncate_name
+from django.db.models import NOT_PROVIDED, Max, Min
+from django.utils import timezone
+
+
+LOCK_TIMEOUT_SQLSTATE = '55P03'
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+
+
+def _is_lock_timeout(error):
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    if code == LOCK_TIMEOUT_SQLSTATE:
+        return True
+    return bool(cause and cause.args and cause.args[0] == MYSQL_LOCK_WAIT_TIMEOUT)
+
+
+def _set_lock_timeout(cursor, connection, seconds):
+    # Returns the previous value, to restore afterwards.
+    if connection.vendor == 'postgresql':
+        cursor.execute('SHOW lock_timeout')
+        previous = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, false)", [f'{int(seconds * 1000)}ms' if seconds else '0'])
+        return previous
+    if connection.vendor == 'mysql':
+        cursor.execute('SELECT @@SESSION.lock_wait_timeout')
+        previous = cursor.fetchone()[0]
+        cursor.execute('SET SESSION lock_wait_timeout = %s', [max(1, round(seconds))])
+        return previous
+    return None
+
+
+def _restore_lock_timeout(cursor, connection, previous):
+    if connection.vendor == 'postgresql':
+        cursor.execute("SELECT set_config('lock_timeout', %s, false)", [previous])
+    elif connection.vendor == 'mysql':
+        cursor.execute('SET SESSION lock_wait_timeout = %s', [previous])
+
+
+def with_lock_timeout(schema_editor, apply):
+    """
+    Call ``apply`` with the connection's lock timeout set to
+    ONLINE_MIGRATION_LOCK_TIMEOUT, retrying with backoff up to
+    ONLINE_MIGRATION_LOCK_RETRIES times if it times out waiting for a lock.
+
+    Only migrations with ``atomic = False`` retry: inside the migration's
+    transaction, waiting to retry would hold every lock taken so far, so
+    the first timeout fails the migration.
+    """
+    connection = schema_editor.connection
+    if connection.vendor not in ('postgresql', 'mysql'):
+        return apply()
+    with connection.cursor() as cursor:
+        previous = _set_lock_timeout(cursor, connection, settings.ONLINE_MIGRATION_LOCK_TIMEOUT)
+    try:
+        for attempt in range(settings.ONLINE_MIGRATION_LOCK_RETRIES + 1):
+            try:
+                if connection.in_atomic_block:
+                    # A savepoint, so the timeout can still be restored.
+                    with transaction.atomic(using=connection.alias):
+                        return apply()
+                return apply()
+            except OperationalError as error:
+                if not _is_lock_timeout(error):
+                    raise
+                if connection.in_atomic_block:
+                    raise OperationalError(
+                        f'{error} Lock timeouts are only retried outside a transaction; '
+                        f'set atomic = False on the migration.'
+                    ) from error
+                if attempt == settings.ONLINE_MIGRATION_LOCK_RETRIES:
+                    raise
+            time.sleep(min(2 ** attempt, 30))
+    finally:
+        with connection.cursor() as cursor:
+            _restore_lock_timeout(cursor, connection, previous)
+
+
+class AddFieldOnline(migrations.AddField):
+    """
+    AddField that only adds a nullable column without a default: a
+    catalogue change on PostgreSQL and MySQL, and no table rebuild on SQLite.
+    Indexes are added separately with AddIndexOnline.
+    """
+
+    def __init__(self, model_name, name, field, preserve_default=True):
+        problems = []
+        if not field.null:
+            problems.append('must be null=True')
+        if field.has_default() or field.db_default is not NOT_PROVIDED:
+            problems.append('must have no default (backfill it instead)')
+        if field.unique or field.db_index:
+            problems.append('must not be unique or indexed (use AddIndexOnline)')
+        if problems:
+            raise ValueError(f'AddFieldOnline {model_name}.{name}: the field {", ".join(problems)}.')
+        super().__init__(model_name, name, field, preserve_default)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        with_lock_timeout(schema_editor, lambda: super(AddFieldOnline, self).database_forwards(
+            app_label, schema_editor, from_state, to_state,
+        ))
+
+
+def _ensure_not_in_transaction(schema_editor, operation):
+    # As django.contrib.postgres' AddIndexConcurrently, which needs psycopg
+    # to import.
+    if schema_editor.connection.in_atomic_block:
+        raise NotSupportedError(
+            f'{operation.__class__.__name__} cannot run inside a transaction on PostgreSQL; '
+            f'set atomic = False on the migration.'
+        )
+
+
+def _drop_invalid_index(schema_editor, name):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind,
+    # which would make the retry fail.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid',
+            [name],
+        )
+        if cursor.fetchone():
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class AddIndexOnline(migrations.AddIndex):
+    """AddIndex that doesn't block writes while the index builds: CREATE
+    INDEX CONCURRENTLY on PostgreSQL, an ordinary AddIndex elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            _ensure_not_in_transaction(schema_editor, self)
+            _drop_invalid_index(schema_editor, self.index.name)
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            with_lock_timeout(schema_editor, lambda: schema_editor.add_index(model, self.index))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            _ensure_not_in_transaction(schema_editor, self)
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            with_lock_timeout(schema_editor, lambda: schema_editor.remove_index(model, self.index))
+
+
+class RemoveIndexOnline(migrations.RemoveIndex):
+    """RemoveIndex with DROP INDEX CONCURRENTLY on PostgreSQL."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+        if schema_editor.connection.vendor == 'postgresql':
+            _ensure_not_in_transaction(schema_editor, self)
+            schema_editor.remove_index(model, index, concurrently=True)
+        else:
+            with_lock_timeout(schema_editor, lambda: schema_editor.remove_index(model, index))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+        if schema_editor.connection.vendor == 'postgresql':
+            _ensure_not_in_transaction(schema_editor, self)
+            _drop_invalid_index(schema_editor, index.name)
+            schema_editor.add_index(model, index, concurrently=True)
+        else:
+            with_lock_timeout(schema_editor, lambda: schema_editor.add_index(model, index))
+
+
+def _with_null(field, null):
+    clone = field.clone()
+    clone.null = null
+    if hasattr(field, 'model'):
+        # A model's field, for the schema editor, rather than a state's.
+        clone.set_attributes_from_name(field.name)
+        clone.model = field.model
+    return clone
+
+
+class SetNotNullOnline(migrations.operations.fields.FieldOperation):
+    """
+    Make a nullable column NOT NULL. On PostgreSQL a plain SET NOT NULL
+    scans the whole table under an exclusive lock; instead a NOT VALID
+    CHECK (column IS NOT NULL) is added and validated, which doesn't block
+    writes, and SET NOT NULL (PostgreSQL 12+) then uses it rather than
+    scanning. Backfill the column first; put this in a migration with
+    ``atomic = False`` so the validation isn't held in one long transaction.
+    """
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'model_name': self.model_name, 'name': self.name}
+
+    def state_forwards(self, app_label, state):
+        field = state.models[app_label, self.model_name_lower].fields[self.name]
+        state.alter_field(app_label, self.model_name_lower, self.name, _with_null(field, False), True)
+
+    def state_backwards(self, app_label, state):
+        field = state.models[app_label, self.model_name_lower].fields[self.name]
+        state.alter_field(app_label, self.model_name_lower, self.name, _with_null(field, True), True)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        from_field = from_state.apps.get_model(app_label, self.model_name)._meta.get_field(self.name)
+        to_field = model._meta.get_field(self.name)
+        if schema_editor.connection.vendor != 'postgresql':
+            with_lock_timeout(schema_editor, lambda: schema_editor.alter_field(model, from_field, to_field))
+            return
+        table = schema_editor.quote_name(model._meta.db_table)
+        column = schema_editor.quote_name(to_field.column)
+        check = schema_editor.quote_name(self._check_name(schema_editor, model, to_field))
+
+        def execute(sql):
+            return lambda: schema_editor.execute(sql)
+
+        with_lock_timeout(schema_editor, execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column} IS NOT NULL) NOT VALID'))
+        schema_editor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}')
+        with_lock_timeout(schema_editor, execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL'))
+        with_lock_timeout(schema_editor, execute(f'ALTER TABLE {table} DROP CONSTRAINT {check}'))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        from_field = from_state.apps.get_model(app_label, self.model_name)._meta.get_field(self.name)
+        to_field = model._meta.get_field(self.name)
+        # Dropping NOT NULL doesn't scan the table.
+        with_lock_timeout(schema_editor, lambda: schema_editor.alter_field(model, from_field, to_field))
+
+    def _check_name(self, schema_editor, model, field):
+        _, table = split_identifier(model._meta.db_table)
+        name = f'{table}_{field.column}_{names_digest(table, field.column, length=8)}_notnull'
+        return truncate_name(name, schema_editor.connection.ops.max_name_length())
+
+    def describe(self):
+        return f'Set {self.name} on {self.model_name} NOT NULL online'
+
+    @property
+    def migration_name_fragment(self):
+        return f'{self.model_name_lower}_{self.name_lower}_not_null'
+
+
+class DeprecateField(migrations.RemoveField):
+    """
+    The contract step's first half: remove a field from the models but keep
+    its column, made nullable so inserts by code that no longer sets it
+    succeed. Drop the column with DropDeprecatedColumn in a later release.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        field = model._meta.get_field(self.name)
+        if field.concrete and not field.null:
+            with_lock_timeout(schema_editor, lambda: schema_editor.alter_field(model, field, _with_null(field, True)))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        field = model._meta.get_field(self.name)
+        if field.concrete and not field.null:
+            # Fails if rows written since have left the column NULL.
+            with_lock_timeout(schema_editor, lambda: schema_editor.alter_field(model, _with_null(field, True), field))
+
+    def describe(self):
+        return f'Deprecate {self.name} on {self.model_name}, keeping its column'
+
+    @property
+    def migration_name_fragment(self):
+        return f'deprecate_{self.model_name_lower}_{self.name_lower}'
+
+
+class DropDeprecatedColumn(migrations.operations.base.Operation):
+    """The contract step's second half: drop the column of a field removed
+    by DeprecateField. Not reversible."""
+    reversible = False
+    reduces_to_sql = True
+
+    def __init__(self, model_name, column):
+        self.model_name = model_name
+        self.column = column
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'model_name': self.model_name, 'column': self.column}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        table = schema_editor.quote_name(model._meta.db_table)
+        column = schema_editor.quote_name(self.column)
+        with_lock_timeout(schema_editor, lambda: schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN {column}'))
+
+    def describe(self):
+        return f'Drop deprecated column {self.column} from {self.model_name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'drop_{self.model_name.lower()}_{self.column.lower()}'
+
+
+class Backfill:
+    """
+    A data change over a large table, run by ``manage.py backfill`` outside
+    migrations so no transaction or lock outlives one batch.
+
+    ``queryset`` selects the rows still to change and ``update(batch)``
+    changes a batch of them, given as a queryset (usually with .update()).
+    Batches go in primary key order; each batch commits together with the
+    saved progress, so an interrupted run resumes where it stopped. The
+    batch size adapts to keep batches near ``target_batch_seconds``, and
+    the run sleeps ``pause`` seconds between batches to leave the database
+    room for requests and replication.
+    """
+
+    def __init__(self, name, queryset, update, batch_size=None, pause=None, target_batch_seconds=None):
+        self.name = name
+        self.queryset = queryset
+        self.update = update
+        self.batch_size = batch_size or settings.BACKFILL_BATCH_SIZE
+        self.pause = settings.BACKFILL_PAUSE if pause is None else pause
+        self.target_batch_seconds = target_batch_seconds or settings.BACKFILL_TARGET_BATCH_SECONDS
+
+    def progress(self, using='default'):
+        from .models import BackfillProgress
+
+        progress, _ = BackfillProgress.objects.using(using).get_or_create(name=self.name)
+        return progress
+
+    def run(self, using='default', stdout=None, max_batches=None, restart=False):
+        """Run (or resume) the backfill; returns its BackfillProgress.
+        ``max_batches`` stops early, leaving the rest for the next run."""
+        queryset = self.queryset.using(using).order_by('pk')
+        pk_field = queryset.model._meta.pk
+        progress = self.progress(using)
+        if restart:
+            progress.last_pk, progress.rows_done, progress.finished_at = '', 0, None
+            progress.save(using=using)
+        if progress.finished_at:
+            return progress
+        # The pk range, for percentages on integer keys; both ends use the
+        # primary key index.
+        bounds = queryset.model._base_manager.using(using).aggregate(low=Min('pk'), high=Max('pk'))
+        numeric = isinstance(bounds['low'], int)
+        start_pk = pk_field.to_python(progress.last_pk) if progress.last_pk else bounds['low']
+
+        batch_size = self.batch_size
+        started, rows_started, batches = time.monotonic(), progress.rows_done, 0
+        while max_batches is None or batches < max_batches:
+            remaining = queryset
+            if progress.last_pk:
+                remaining = remaining.filter(pk__gt=pk_field.to_python(progress.last_pk))
+            batch_started = time.monotonic()
+            pks = list(remaining.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                progress.finished_at = timezone.now()
+                progress.save(using=using)
+                break
+            with transaction.atomic(using=using):
+                self.update(remaining.filter(pk__lte=pks[-1]))
+                progress.last_pk = str(pks[-1])
+                progress.rows_done += len(pks)
+                progress.save(using=using)
+            batches += 1
+            elapsed = time.monotonic() - batch_started
+
+            if stdout is not None:
+                done = ''
+                if numeric and bounds['high'] > bounds['low']:
+                    fraction = (pks[-1] - bounds['low']) / (bounds['high'] - bounds['low'])
+                    done = f' ({fraction:.1%})'
+                    rate = (pks[-1] - start_pk) / max(time.monotonic() - started, 1e-9)
+                    if rate and fraction < 1:
+                        done += f', about {(bounds["high"] - pks[-1]) / rate:.0f}s left'
+                stdout.write(f'{self.name}: {progress.rows_done} rows, up to pk {pks[-1]}{done}; '
+                             f'batch of {len(pks)} in {elapsed:.2f}s')
+
+            if elapsed > self.target_batch_seconds:
+                batch_size = max(1, batch_size // 2)
+            elif elapsed < self.target_batch_seconds / 2:
+                batch_size = min(self.batch_size * 10, int(batch_size * 1.5) + 1)
+            if self.pause:
+                time.sleep(self.pause)
+        if stdout is not None and progress.finished_at:
+            stdout.write(f'{self.name}: finished, {progress.rows_done - rows_started} rows this run, '
+                         f'{progress.rows_done} in total.')
+        return progress
@@ -0,0 +1,108 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = []
+_wake = threading.Event()
+_stopping = threading.Event()
+_flusher = None
+
+
+def record_outstanding(token, user):
+    """
+    Add a freshly minted refresh token to the token_blacklist outstanding
+    list.
+
+    With OUTSTANDING_TOKEN_DEFERRED the row is buffered and written by a
+    background thread in one bulk insert per flush interval (or batch),
+    instead of costing every login its own INSERT. Blacklisting a token
+    whose row hasn't been written yet still works: simplejwt creates the
+    row on demand, and the later bulk insert skips it.
+    """
+    row = OutstandingToken(
+        user=user,
+        jti=token[api_settings.JTI_CLAIM],
+        token=str(token),
+        created_at=token.current_time,
+        expires_at=datetime_from_epoch(token['exp']),
+    )
+    if not settings.OUTSTANDING_TOKEN_DEFERRED:
+        row.save()
+        return
+    with _lock:
+        _pending.append(row)
+        full = len(_pending) >= settings.OUTSTANDING_TOKEN_BATCH_SIZE
+        _start_flusher()
+    if full:
+        _wake.set()
+
+
+def flush():
+    """Write buffered outstanding tokens now; returns how many were written.
+
+    If the bulk insert fails, the rows are inserted one at a time, so a bad
+    row (say, of a user deleted since) only loses itself.
+    """
+    with _lock:
+        rows = _pending[:]
+        del _pending[:]
+    if not rows:
+        return 0
+    try:
+        OutstandingToken.objects.bulk_create(rows, ignore_conflicts=True)
+        return len(rows)
+    except Exception:
+        logger.exception('Bulk insert of %d outstanding tokens failed; inserting them one at a time.', len(rows))
+    # The error may have been the connection's.
+    connection.close()
+    written = 0
+    for row in rows:
+        try:
+            OutstandingToken.objects.bulk_create([row], ignore_conflicts=True)
+            written += 1
+        except Exception:
+            logger.exception('Dropped outstanding token %s of user %s.', row.jti, row.user_id)
+    return written
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(target=_run_flusher, name='outstanding-token-flusher', daemon=True)
+        _flusher.start()
+
+
+def _run_flusher():
+    while not _stopping.is_set():
+        _wake.wait(settings.OUTSTANDING_TOKEN_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            if flush():
+                connection.close()
+        except Exception:
+            # Keep the thread alive.
+            logger.exception('Flushing outstanding tokens failed.')
+            connection.close()
+
+
+def shutdown():
+    """Stop the flusher thread and write whatever it left buffered. Run at
+    interpreter exit."""
+    _stopping.set()
+    _wake.set()
+    if _flusher is not None:
+        _flusher.join(timeout=5)
+    return flush()
+
+
+atexit.register(shutdown)
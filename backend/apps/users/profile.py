@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django_otp.plugins.otp_totp.models import TOTPDevice
+
+from .metrics import record_cache
+from .models import CustomUser
+from .representation import represent
+from .serializers import ClientSerializer, SupplierSerializer, CustomUserSerializer
+
+
+PROFILE_CACHE_PREFIX = 'users:profile:'
+CHANGED_CACHE_PREFIX = 'users:profile-changed:'
+
+
+def profile_cache_key(user_id):
+    return f'{PROFILE_CACHE_PREFIX}{user_id}'
+
+
+def changed_cache_key(user_id):
+    return f'{CHANGED_CACHE_PREFIX}{user_id}'
+
+
+# For REPLICA_PIN_SECONDS after a change the replica may not have it yet, and
+# whatever is read gets cached: read from the primary instead.
+def profile_database(cached, user_id):
+    return 'default' if changed_cache_key(user_id) in cached else None
+
+
+# Annotate each user with whether they have a confirmed TOTP device, so the
+# MFA state comes back in the same query as the user row.
+def annotate_mfa(queryset):
+    confirmed_devices = TOTPDevice.objects.filter(user=OuterRef('pk'), confirmed=True)
+    return queryset.annotate(mfa_enabled=Exists(confirmed_devices))
+
+
+# Load the user, their client/supplier row and the MFA flag in one query.
+def load_profile_user(user_id, using=None):
+    queryset = annotate_mfa(CustomUser.objects.using(using).select_related('client', 'supplier'))
+    return queryset.get(pk=user_id)
+
+
+def build_profile(user):
+    user_data = represent(CustomUserSerializer, user)
+    user_data['mfa_enabled'] = user.mfa_enabled
+
+    if user.user_type == 'client' and hasattr(user, 'client'):
+        user_data['client'] = represent(ClientSerializer, user.client)
+    elif user.user_type == 'supplier' and hasattr(user, 'supplier'):
+        user_data['supplier'] = represent(SupplierSerializer, user.supplier)
+
+    return user_data
+
+
+def get_profile(user_id):
+    key = profile_cache_key(user_id)
+    cached = cache.get_many([key, changed_cache_key(user_id)])
+    user_data = cached.get(key)
+    record_cache('profile', user_data is not None)
+    if user_data is None:
+        user_data = build_profile(load_profile_user(user_id, profile_database(cached, user_id)))
+        cache.set(key, user_data, settings.PROFILE_CACHE_TIMEOUT)
+    return user_data
+
+
+async def aget_profile(user_id):
+    key = profile_cache_key(user_id)
+    cached = await cache.aget_many([key, changed_cache_key(user_id)])
+    user_data = cached.get(key)
+    record_cache('profile', user_data is not None)
+    if user_data is None:
+        using = profile_database(cached, user_id)
+        queryset = annotate_mfa(CustomUser.objects.using(using).select_related('client', 'supplier'))
+        user_data = build_profile(await queryset.aget(pk=user_id))
+        await cache.aset(key, user_data, settings.PROFILE_CACHE_TIMEOUT)
+    return user_data
+
+
+# Called by every view that changes something the profile payload contains.
+def invalidate_profile(user_id):
+    cache.set(changed_cache_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+    cache.delete(profile_cache_key(user_id))
@@ -0,0 +1,192 @@
+import logging
+import os
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+_WRAPPER_FILES = {__file__, metrics.__file__}
+
+# The QueryLogs of the requests and test blocks being recorded, innermost
+# last.
+_query_logs = ContextVar('query_logs', default=())
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries a view may run per request. For function views;
+    class based views set a ``query_budget`` attribute instead (this works on
+    the class too). QUERY_BUDGETS, keyed by URL name, takes precedence.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def budget_for(match):
+    """The query budget of the view ``match`` (a ResolverMatch) resolved to,
+    or None if it has none."""
+    if match.view_name in settings.QUERY_BUDGETS:
+        return settings.QUERY_BUDGETS[match.view_name]
+    view_class = getattr(match.func, 'view_class', None)
+    return getattr(view_class or match.func, 'query_budget', None)
+
+
+class QueryLog:
+    def __init__(self):
+        # (sql, params, stack) per query, in order.
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def duplicates(self):
+        """(sql, count, call sites) for each statement run more than once,
+        most repeated first. Call sites are the project frames that ran it."""
+        by_sql = defaultdict(list)
+        for sql, params, stack in self.queries:
+            by_sql[sql].append(stack)
+        repeated = [
+            (sql, len(stacks), list(dict.fromkeys(_project_frames(stack) for stack in stacks)))
+            for sql, stacks in by_sql.items() if len(stacks) > 1
+        ]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def describe(self):
+        lines = [f'{len(self)} queries:']
+        lines += [f'  {n}. {sql}' for n, (sql, params, stack) in enumerate(self.queries, 1)]
+        for sql, count, call_sites in self.duplicates():
+            lines.append(f'Repeated {count}x: {sql}')
+            for call_site in call_sites[:3]:
+                lines.append(call_site)
+        return '\n'.join(lines)
+
+
+def _project_frames(stack):
+    # Frames from this project's code only, leaving out the middleware chain
+    # and the execute wrappers.
+    project = os.path.join(str(settings.BASE_DIR), '')
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(project) and frame.filename not in _WRAPPER_FILES
+        and f'{os.sep}site-packages{os.sep}' not in frame.filename
+        and frame.name not in ('__call__', '__acall__')
+    ]
+    return ''.join(traceback.format_list(frames)).rstrip()
+
+
+def record_sql(execute, sql, params, many, context):
+    """Database execute wrapper adding each query and its stack to the current
+    QueryLog."""
+    logs = _query_logs.get()
+    if logs:
+        stack = traceback.extract_stack()[:-1]
+        for log in logs:
+            log.queries.append((sql, params, stack))
+    return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created receiver, connected with QUERY_BUDGET_CHECKS so
+    # queries async views run in worker threads are recorded too.
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+@contextmanager
+def record_queries():
+    """Record the queries run inside the block in a QueryLog."""
+    log = QueryLog()
+    token = _query_logs.set(_query_logs.get() + (log,))
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                connection = connections[alias]
+                if record_sql not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(record_sql))
+            yield log
+    finally:
+        _query_logs.reset(token)
+
+
+class QueryBudgetMiddleware:
+    """
+    Development aid, enabled with QUERY_BUDGET_CHECKS (on with DEBUG). Logs a
+    warning when a view runs more queries than its budget, and for any
+    statement a request runs more than once (usually an N+1), with the
+    stack traces that ran it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_CHECKS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        with record_queries() as log:
+            response = self.get_response(request)
+        self.check(request, log)
+        return response
+
+    async def __acall__(self, request):
+        with record_queries() as log:
+            response = await self.get_response(request)
+        self.check(request, log)
+        return response
+
+    def check(self, request, log):
+        match = request.resolver_match
+        if match is None:
+            return
+        budget = budget_for(match)
+        if budget is not None and len(log) > budget:
+            logger.warning(
+                '%s %s (%s) ran %d queries, over its budget of %d.\n%s',
+                request.method, request.path, match.view_name, len(log), budget, log.describe(),
+            )
+        for sql, count, call_sites in log.duplicates():
+            logger.warning(
+                '%s %s (%s) ran the same query %d times: %s\n%s',
+                request.method, request.path, match.view_name, count, sql, '\n--\n'.join(call_sites[:3]),
+            )
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin failing tests whose requests run more queries than
+    allowed."""
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries):
+        with record_queries() as log:
+            yield log
+        if len(log) > max_queries:
+            self.fail(f'Ran {len(log)} queries, more than {max_queries}.\n{log.describe()}')
+
+    def assertWithinQueryBudget(self, method, path, **kwargs):
+        """Request ``path`` with ``self.client`` and fail if its view has no
+        query budget or exceeds it. Returns the response."""
+        match = resolve(path.split('?', 1)[0])
+        budget = budget_for(match)
+        if budget is None:
+            self.fail(f'{match.view_name or path} declares no query budget.')
+        with self.assertMaxQueries(budget):
+            return getattr(self.client, method)(path, **kwargs)
@@ -0,0 +1,152 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import hashing
+from .models import CustomUser, PendingRegistration
+from .serializers import ClientSerializer, SupplierSerializer
+
+
+logger = logging.getLogger(__name__)
+
+SERIALIZER_CLASSES = {
+    'client': ClientSerializer,
+    'supplier': SupplierSerializer,
+}
+
+# Payload fields that are blanked once the worker is done with a row. The
+# password is queued already hashed.
+SCRUBBED_FIELDS = ('password',)
+
+# errors of a row that failed for a reason other than its data.
+INTERNAL_ERROR = {'non_field_errors': ['The registration could not be completed, please try again.']}
+
+
+def enqueue_registration(serializer, user_type):
+    """
+    Durably queue an already validated signup and return the
+    PendingRegistration row the client can poll.
+    """
+    email = serializer.validated_data['email']
+    in_flight = PendingRegistration.objects.filter(email=email, status__in=('pending', 'processing'))
+    if CustomUser.objects.filter(email=email).exists() or in_flight.exists():
+        raise serializers.ValidationError("A user with that email already exists.")
+
+    # Keep what the client sent rather than validated_data, so the worker
+    # can run the same serializer over it again; but never the raw password.
+    payload = {
+        name: serializer.initial_data[name]
+        for name in serializer.fields
+        if name in serializer.initial_data and name != 'company_logo'
+    }
+    payload['password'] = hashing.make_password(serializer.validated_data['password'])
+    pending = PendingRegistration(user_type=user_type, email=email, payload=payload)
+    logo = serializer.validated_data.get('company_logo')
+    if logo:
+        pending.company_logo.save(logo.name, logo, save=False)
+    pending.save()
+    return pending
+
+
+def claim(pending_id):
+    """Mark a pending row as processing; False if another worker got it first."""
+    return PendingRegistration.objects.filter(pk=pending_id, status='pending').update(
+        status='processing', attempts=F('attempts') + 1, updated_at=timezone.now(),
+    ) == 1
+
+
+def process_registration(pending):
+    """
+    Create the user and role row for a claimed PendingRegistration.
+
+    Runs the same serializer the synchronous views use, so logo storage and
+    the user plus role insert happen here, inside one transaction, instead
+    of in the request thread. The user gets the password hash that was
+    queued.
+    """
+    data = dict(pending.payload)
+    logo_file = None
+    if pending.company_logo:
+        logo_file = pending.company_logo.open('rb')
+        data['company_logo'] = File(logo_file, name=os.path.basename(pending.company_logo.name))
+
+    try:
+        serializer = SERIALIZER_CLASSES[pending.user_type](data=data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                # Created without a password, then given the queued hash.
+                role = serializer.save(password=None)
+                role.user.password = _password_hash(data['password'])
+                role.user.save(update_fields=['password'])
+                pending.user = role.user
+                pending.status = 'done'
+                pending.errors = None
+                pending.save()
+        else:
+            pending.status = 'failed'
+            pending.errors = serializer.errors
+    except serializers.ValidationError as exc:
+        pending.status = 'failed'
+        pending.errors = serializers.as_serializer_error(exc)
+    except Exception:
+        # Storage, database or hashing trouble: retry the row until it is
+        # out of attempts. The transaction rolled back any user created.
+        logger.exception('Registration %s failed on attempt %d', pending.pk, pending.attempts)
+        pending.user = None
+        if pending.attempts < settings.REGISTRATION_MAX_ATTEMPTS:
+            pending.status = 'pending'
+            pending.errors = INTERNAL_ERROR
+            pending.save()
+            return pending
+        pending.status = 'failed'
+        pending.errors = INTERNAL_ERROR
+    finally:
+        if logo_file is not None:
+            logo_file.close()
+
+    _scrub(pending)
+    pending.save()
+    return pending
+
+
+def _password_hash(password):
+    # Rows queued before passwords were hashed up front hold the raw one.
+    try:
+        hashers.identify_hasher(password)
+    except ValueError:
+        return hashing.make_password(password)
+    return password
+
+
+def _scrub(pending):
+    for field in SCRUBBED_FIELDS:
+        pending.payload.pop(field, None)
+    if pending.company_logo:
+        pending.company_logo.delete(save=False)
+
+
+def requeue_stale(older_than):
+    """
+    Put rows left in 'processing' by a worker that died back in the queue,
+    or fail them (and scrub them) once they are out of attempts. Returns the
+    number of rows requeued and failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = PendingRegistration.objects.filter(status='processing', updated_at__lt=cutoff)
+    failed = 0
+    for pending in stale.filter(attempts__gte=settings.REGISTRATION_MAX_ATTEMPTS):
+        pending.status = 'failed'
+        pending.errors = INTERNAL_ERROR
+        _scrub(pending)
+        pending.save()
+        failed += 1
+    requeued = stale.update(status='pending', updated_at=timezone.now())
+    return requeued, failed
@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson, with the same output: dates and times (``dob``),
+    lazy translation strings, Decimals and anything else orjson doesn't
+    handle go through DRF's JSONEncoder. Falls back to JSONRenderer when
+    orjson isn't installed, and for output orjson can't produce (indents
+    other than 2, ASCII-only or non-compact output).
+    """
+    # orjson formats datetimes differently; DRF's encoder keeps them as
+    # before.
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent not in (None, 2) or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options | orjson.OPT_INDENT_2 if indent else self.options
+        ret = orjson.dumps(data, default=self.encoder.default, option=options)
+        # Escaped like JSONRenderer does, so the output stays a JavaScript
+        # subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
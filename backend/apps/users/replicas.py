@@ -0,0 +1,125 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+
+REPLICA_ALIAS = 'replica'
+PIN_CACHE_PREFIX = 'users:pin-primary:'
+PIN_COOKIE = 'pin_primary'
+
+# The request being served by a view marked ``read_replica = True``, if any.
+_replica_request = ContextVar('replica_request', default=None)
+
+
+def pin_keys(request):
+    keys = [f'{PIN_CACHE_PREFIX}ip:{request.META.get("REMOTE_ADDR")}']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        keys.append(f'{PIN_CACHE_PREFIX}user:{user.pk}')
+    return keys
+
+
+def pin_to_primary(request, response):
+    """Send this client's reads to the primary for REPLICA_PIN_SECONDS, so
+    they see their own writes even if the replica lags.
+
+    The pin goes in a signed cookie, which reaches whichever worker serves
+    the next request, and in the cache for clients that don't keep cookies
+    (that needs a shared cache, see CACHES).
+    """
+    response.set_signed_cookie(
+        PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS,
+        secure=request.is_secure(), httponly=True, samesite='Lax',
+    )
+    cache.set_many(dict.fromkeys(pin_keys(request), True), settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    # Checked at the first read of the request (after authentication for
+    # views that authenticate without a query) and remembered.
+    if not hasattr(request, '_pinned_to_primary'):
+        # The cookie's own timestamp is checked too: clients may keep it
+        # past max_age.
+        pinned = request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS,
+        )
+        request._pinned_to_primary = pinned is not None or bool(cache.get_many(pin_keys(request)))
+    return request._pinned_to_primary
+
+
+class ReplicaRouter:
+    """
+    Sends reads made while serving a ``read_replica`` view to the 'replica'
+    database, unless the client wrote recently. Everything else, including
+    all writes and migrations, uses 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        request = _replica_request.get()
+        if request is None or REPLICA_ALIAS not in settings.DATABASES or is_pinned(request):
+            return 'default'
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication.
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Marks safe requests to views with ``read_replica = True`` for
+    ReplicaRouter, and pins clients to the primary after a successful
+    write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+            # Lets the async handler await process_view rather than run it
+            # in a thread.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        token = _replica_request.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_request.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            pin_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _replica_request.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_request.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            await sync_to_async(pin_to_primary)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method in ('GET', 'HEAD') and getattr(view_class, 'read_replica', False):
+            _replica_request.set(request)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ReplicaMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
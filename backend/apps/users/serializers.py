@@ -1,11 +1,17 @@
 from rest_framework import serializers
 from .models import CustomUser, Client, Supplier
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from apps.supplier.filters import normalize_postcode
+from .logos import LogoVariantsField, check_logo, schedule_variants, store_logo
+from .tokens import BoxumRefreshToken, set_user_claims, token_users
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BoxumRefreshToken
     email = serializers.EmailField(required=True)
     password = serializers.CharField(required=True, write_only=True)
 
@@ -82,17 +88,19 @@ class ClientSerializer(serializers.ModelSerializer):
             'dob': validated_data['dob']
         }
         try:
-            user = CustomUserSerializer.create(CustomUserSerializer(), validated_data=user_data)
-            validated_data['user'] = user
-            validated_data.pop('email')
-            validated_data.pop('password')
-            validated_data.pop('first_name')
-            validated_data.pop('last_name')
-            validated_data.pop('number')
-            validated_data.pop('address')
-            validated_data.pop('postcode')
-            validated_data.pop('dob')
-            client = Client.objects.create(**validated_data)
+            # User and role row are created together or not at all.
+            with transaction.atomic():
+                user = CustomUserSerializer.create(CustomUserSerializer(), validated_data=user_data)
+                validated_data['user'] = user
+                validated_data.pop('email')
+                validated_data.pop('password')
+                validated_data.pop('first_name')
+                validated_data.pop('last_name')
+                validated_data.pop('number')
+                validated_data.pop('address')
+                validated_data.pop('postcode')
+                validated_data.pop('dob')
+                client = Client.objects.create(**validated_data)
             return client
         except IntegrityError:
             raise serializers.ValidationError("A user with that email already exists.")
@@ -106,10 +114,11 @@ class SupplierSerializer(serializers.ModelSerializer):
     address = serializers.CharField(write_only=True)
     postcode = serializers.CharField(write_only=True)
     dob = serializers.DateField(write_only=True)
+    company_logo_variants = LogoVariantsField()
 
     class Meta:
         model = Supplier
-        fields = ['company_name', 'company_number', 'company_address', 'company_postcode', 'company_type', 'company_description', 'company_logo', 'subcategories', 'email', 'password', 'first_name', 'last_name', 'number', 'address', 'postcode', 'dob']
+        fields = ['company_name', 'company_number', 'company_address', 'company_postcode', 'company_type', 'company_description', 'company_logo', 'company_logo_variants', 'subcategories', 'email', 'password', 'first_name', 'last_name', 'number', 'address', 'postcode', 'dob']
 
     def create(self, validated_data):
         user_data = {
@@ -125,22 +134,94 @@ class SupplierSerializer(serializers.ModelSerializer):
             'dob': validated_data['dob']
         }
         try:
-            user = CustomUserSerializer.create(CustomUserSerializer(), validated_data=user_data)
-            validated_data['user'] = user
-            validated_data.pop('email')
-            validated_data.pop('password')
-            validated_data.pop('first_name')
-            validated_data.pop('last_name')
-            validated_data.pop('number')
-            validated_data.pop('address')
-            validated_data.pop('postcode')
-            validated_data.pop('dob')
-            supplier = Supplier.objects.create(**validated_data)
+            # User and role row are created together or not at all.
+            with transaction.atomic():
+                user = CustomUserSerializer.create(CustomUserSerializer(), validated_data=user_data)
+                validated_data['user'] = user
+                validated_data.pop('email')
+                validated_data.pop('password')
+                validated_data.pop('first_name')
+                validated_data.pop('last_name')
+                validated_data.pop('number')
+                validated_data.pop('address')
+                validated_data.pop('postcode')
+                validated_data.pop('dob')
+                if validated_data.get('company_logo'):
+                    validated_data['company_logo'] = store_logo(validated_data['company_logo'])
+                supplier = Supplier.objects.create(**validated_data)
+                if supplier.company_logo:
+                    schedule_variants(supplier.pk)
             return supplier
         except IntegrityError:
             raise serializers.ValidationError("A user with that email already exists.")
+
+    def update(self, instance, validated_data):
+        # The same logo pipeline as create(): stored under its content hash,
+        # with the previous logo's variants replaced.
+        logo = validated_data.get('company_logo')
+        logo_changed = False
+        if logo:
+            validated_data['company_logo'] = store_logo(logo)
+            logo_changed = validated_data['company_logo'] != instance.company_logo.name
+            if logo_changed:
+                instance.company_logo_variants = {}
+        supplier = super().update(instance, validated_data)
+        if logo_changed:
+            schedule_variants(supplier.pk)
+        return supplier
+
+    def validate_company_logo(self, value):
+        return check_logo(value)
+
+    def validate_company_postcode(self, value):
+        # Stored the way filter_suppliers() searches them, so postcode
+        # prefix lookups stay plain index range scans.
+        return normalize_postcode(value)
         
 
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that reloads the user for every refresh: deleted
+    and inactive users get no new access token, and its user_type,
+    is_active and mfa_enabled claims come from the database rather than
+    the refresh token, so they are never older than ACCESS_TOKEN_LIFETIME.
+    """
+    # Checks the blacklist through the configured blacklist backend.
+    token_class = BoxumRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = token_users().filter(**{api_settings.USER_ID_FIELD: user_id}).first() if user_id else None
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        # Copied into the access token, and a rotated refresh token.
+        set_user_claims(refresh, user, user.mfa_enabled)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # As TokenRefreshSerializer.validate.
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField(required=True)
-    new_password = serializers.CharField(required=True)
\ No newline at end of file
+    new_password = serializers.CharField(required=True)
+
+class SupplierImportSerializer(SupplierSerializer):
+    """
+    SupplierSerializer rules for rows coming from `manage.py import_suppliers`.
+    The logo is a path already in storage, and rows without a password get an
+    unusable one.
+    """
+    company_logo = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    password = serializers.CharField(write_only=True, required=False, allow_blank=True)
+
+    def validate_company_logo(self, value):
+        return value
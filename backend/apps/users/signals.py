@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_otp.plugins.otp_totp.models import TOTPDevice
+
+from .membership import add_members, forget_emails
+from .mfa import invalidate_enrollment
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=TOTPDevice)
+def forget_enrollment(sender, instance, **kwargs):
+    invalidate_enrollment(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def remember_member(sender, instance, **kwargs):
+    stored_email = getattr(instance, '_stored_email', None)
+    if stored_email and stored_email != instance.email:
+        forget_emails([stored_email])
+    instance._stored_email = instance.email
+    add_members([instance])
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_member(sender, instance, **kwargs):
+    forget_emails([instance.email])
@@ -1,3 +1,1190 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import decimal
+import gzip
+import json
+import os
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connections, models
+from django.http import HttpResponse, JsonResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, AsyncRequestFactory, MULTIPART_CONTENT, encode_multipart
+from django.urls import path, reverse
+from django.utils.translation import gettext_lazy
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+import pyotp
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from apps.supplier.serializers import SupplierSearchSerializer
+
+from . import hashing
+from .admin import CustomUserAdmin, EstimatedCountPaginator
+from .async_views import AsyncCheckIfClientView, AsyncLoginView, AsyncTokenRefreshView, AsyncUserDetailsView
+from .backends import EmailMFABackend
+from .blacklist import CacheBlacklist, DatabaseBlacklist, RevokedTokenBlacklist
+from .checks import check_blacklist_cache
+from .hashers import PBKDF2PasswordHasher
+from .logos import generate_variants
+from .management.commands.explain_hotpaths import HOT_PATHS
+from .metrics import Registry, metrics_view, render_prometheus
+from .mfa import build_enrollment, enrollment_cache_key
+from .membership import GENERATION_CACHE_KEY, MembershipFilter, lookup_user_type, member_cache_key
+from .models import BackfillProgress, Client, CustomUser, PendingRegistration, RevokedToken, Supplier
+from . import outstanding
+from .online_migrations import AddFieldOnline, Backfill, with_lock_timeout
+from .parsers import ORJSONParser
+from .profile import build_profile, get_profile, load_profile_user, profile_cache_key
+from .replicas import PIN_COOKIE, REPLICA_ALIAS
+from .registration import claim, enqueue_registration, process_registration, requeue_stale
+from .querybudget import QueryBudgetMiddleware, QueryBudgetTestMixin, query_budget
+from .renderers import ORJSONRenderer
+from .representation import read_plan, represent
+from .serializers import ClientSerializer, CustomUserSerializer, SupplierSerializer
+from .views import EnableMFAView
+from .tokens import IS_ACTIVE_CLAIM, MFA_ENABLED_CLAIM, USER_TYPE_CLAIM, BoxumRefreshToken
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+def shared_cache(location):
+    # A cache every process of a host shares, as CACHE_BACKEND=file.
+    return {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+
+
+def create_user(email, user_type='client', **fields):
+    return CustomUser.objects.create(username=email, email=email, user_type=user_type, **fields)
+
+
+class AuthenticationMixin:
+    def authenticate(self, user):
+        """Send the test client's requests with an access token for ``user``;
+        returns the Authorization header."""
+        authorization = f'Bearer {BoxumRefreshToken.for_user(user).access_token}'
+        self.client.defaults['HTTP_AUTHORIZATION'] = authorization
+        return authorization
+
+
+class ReadPlanParityTests(TestCase):
+    """Read plans must render byte for byte what the serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create(
+            username='client@example.com', email='client@example.com', user_type='client',
+            first_name='Zoë', last_name='Client', number='0400000000', address='1 Test St',
+            postcode='3000', dob=datetime.date(1990, 2, 3),
+        )
+        cls.client_profile = Client.objects.create(user=cls.client_user)
+        cls.supplier_user = CustomUser.objects.create(
+            username='supplier@example.com', email='supplier@example.com', user_type='supplier',
+            first_name='Sam', last_name='Supplier', number='0400000001', address='2 Test St', postcode='3000',
+        )
+        cls.supplier = Supplier.objects.create(
+            user=cls.supplier_user, company_name='Pipes & Co', company_number='12345678',
+            company_address='3 Industrial Rd', company_postcode='3000', company_type='plumbing',
+            company_description='Plumbing, gas fitting and drainage.', company_logo='logos/pipes.png',
+            company_logo_variants={'64': {'webp': 'logos/pipes-64.webp', 'png': 'logos/pipes-64.png'}},
+            subcategories='gas,drainage',
+        )
+
+    def assertParity(self, serializer_class, instance):
+        self.assertEqual(render(represent(serializer_class, instance)), render(serializer_class(instance).data))
+
+    def test_user(self):
+        self.assertParity(CustomUserSerializer, self.client_user)
+        self.assertParity(CustomUserSerializer, self.supplier_user)
+
+    def test_user_unsaved_defaults(self):
+        # dob is still the model's string default.
+        self.assertParity(CustomUserSerializer, CustomUser(username='new', email='new@example.com'))
+
+    def test_client(self):
+        self.assertParity(ClientSerializer, self.client_profile)
+        self.client_profile.company_name = None
+        self.assertParity(ClientSerializer, self.client_profile)
+
+    def test_supplier(self):
+        self.assertParity(SupplierSerializer, self.supplier)
+        self.assertParity(SupplierSerializer, Supplier(user=self.supplier_user))
+
+    def test_supplier_search(self):
+        suppliers = list(Supplier.objects.prefetch_related('subcategory_tags'))
+        self.assertEqual(
+            render(read_plan(SupplierSearchSerializer).represent_many(suppliers)),
+            render(SupplierSearchSerializer(suppliers, many=True).data),
+        )
+
+    def test_profile(self):
+        for user in (self.client_user, self.supplier_user):
+            user = load_profile_user(user.pk)
+            expected = dict(CustomUserSerializer(user).data, mfa_enabled=user.mfa_enabled)
+            if user.user_type == 'client':
+                expected['client'] = ClientSerializer(user.client).data
+            else:
+                expected['supplier'] = SupplierSerializer(user.supplier).data
+            self.assertEqual(render(build_profile(user)), render(expected))
+
+
+class ProfileCacheTests(AuthenticationMixin, TestCase):
+    def test_invalidation_reaches_other_processes(self):
+        user = create_user('client@example.com', first_name='Old')
+        Client.objects.create(user=user)
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES=shared_cache(location)):
+            get_profile(user.pk)
+            # Another worker's client for the same cache.
+            other_process = FileBasedCache(location, {})
+            self.assertEqual(other_process.get(profile_cache_key(user.pk))['first_name'], 'Old')
+
+            self.authenticate(user)
+            response = self.client.put(
+                reverse('update-user'), data={'first_name': 'New'}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(other_process.get(profile_cache_key(user.pk)))
+            self.assertEqual(get_profile(user.pk)['first_name'], 'New')
+
+
+class ReplicaRoutingTests(AuthenticationMixin, TransactionTestCase):
+    """The test database as primary and a second SQLite file as its replica."""
+    # Includes the replica, configured only once the class is set up.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        cls.addClassCleanup(os.remove, cls.replica_path)
+        connections.settings[REPLICA_ALIAS] = dict(
+            connections.settings['default'], NAME=cls.replica_path, TEST={'MIRROR': None},
+        )
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        del connections.settings[REPLICA_ALIAS]
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.enterContext(override_settings(CACHES=shared_cache(location.name)))
+        self.user = create_user('client@example.com', first_name='Old')
+        Client.objects.create(user=self.user)
+        self.replicate()
+        self.authorization = self.authenticate(self.user)
+
+    def replicate(self):
+        # As sync_replica.
+        target = sqlite3.connect(self.replica_path)
+        try:
+            connections['default'].connection.backup(target)
+        finally:
+            target.close()
+
+    def first_name(self, client):
+        response = client.get(reverse('user-details'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['first_name']
+
+    def update(self):
+        response = self.client.put(reverse('update-user'), data={'first_name': 'New'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_reads_come_from_the_replica(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(first_name='Primary only')
+        self.assertEqual(self.first_name(self.client), 'Old')
+
+    def test_writer_pinned_to_primary_on_any_worker(self):
+        response = self.update()
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # The next request lands on a worker that shares none of this one's
+        # cache: the cookie still pins it.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(self.first_name(self.client), 'New')
+
+    def test_stale_replica_read_not_cached(self):
+        self.update()
+        # Another device of the same user, without the cookie, from another
+        # address.
+        other = self.client_class(HTTP_AUTHORIZATION=self.authorization, REMOTE_ADDR='192.0.2.1')
+        with mock.patch('apps.users.replicas.is_pinned', return_value=False):
+            # Read from the primary rather than cache what the lagging
+            # replica still has.
+            self.assertEqual(self.first_name(other), 'New')
+            cache.delete(profile_cache_key(self.user.pk))
+            self.assertEqual(self.first_name(other), 'New')
+
+
+class DatabaseSettingsTests(TestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'boxum', 'settings.py'))
+
+    def test_sqlite_tuned(self):
+        options = self.load_settings(DB_BUSY_TIMEOUT='5')['DATABASES']['default']['OPTIONS']
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', options['init_command'])
+        self.assertEqual(options['timeout'], 5)
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.DATABASES['default']['OPTIONS']['timeout'] * 1000)
+
+    def test_postgresql(self):
+        database = self.load_settings(DB_ENGINE='postgresql', DB_NAME='boxum', DB_CONN_MAX_AGE='30')['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_postgresql_pool(self):
+        database = self.load_settings(DB_ENGINE='postgresql', DB_POOL_MAX_SIZE='8')['DATABASES']['default']
+        # Django refuses persistent connections together with a pool.
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {'min_size': 2, 'max_size': 8, 'timeout': 10})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings(DB_ENGINE='oracle')
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.user = create_user('user@example.com')
+        self.refresh = str(BoxumRefreshToken.for_user(self.user))
+
+    def refresh_access(self):
+        return self.client.post(reverse('token_refresh'), data={'refresh': self.refresh}, content_type='application/json')
+
+    def test_claims_come_from_the_database(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(user_type='supplier')
+        TOTPDevice.objects.create(user=self.user, name='default', confirmed=True)
+        response = self.refresh_access()
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual(access[USER_TYPE_CLAIM], 'supplier')
+        self.assertIs(access[MFA_ENABLED_CLAIM], True)
+        self.assertIs(access[IS_ACTIVE_CLAIM], True)
+
+    def test_inactive_user_refused(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh_access().status_code, 401)
+
+    def test_deleted_user_refused(self):
+        CustomUser.objects.filter(pk=self.user.pk).delete()
+        self.assertEqual(self.refresh_access().status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        self.user = create_user('user@example.com')
+
+    def assertRevokes(self, backend):
+        with mock.patch('apps.users.tokens.get_blacklist_backend', return_value=backend):
+            revoked = BoxumRefreshToken.for_user(self.user)
+            kept = BoxumRefreshToken.for_user(self.user)
+            revoked.blacklist()
+            with self.assertRaises(TokenError):
+                BoxumRefreshToken(str(revoked))
+            BoxumRefreshToken(str(kept))
+
+    def test_database_blacklist(self):
+        self.assertRevokes(DatabaseBlacklist())
+
+    def test_cache_blacklist(self):
+        self.assertRevokes(CacheBlacklist())
+
+    def test_revoked_token_blacklist(self):
+        self.assertRevokes(RevokedTokenBlacklist())
+
+    def test_compact_removes_expired_shards_only(self):
+        backend = RevokedTokenBlacklist()
+        now = time.time()
+        RevokedToken.objects.bulk_create([
+            RevokedToken(jti='expired', shard=backend.shard(now - 7200)),
+            # Expires within the current hour, so its shard isn't over yet.
+            RevokedToken(jti='expiring', shard=backend.shard(now + 60)),
+            RevokedToken(jti='live', shard=backend.shard(now + 7200)),
+        ])
+        self.assertEqual(backend.compact(batch_size=1), 1)
+        self.assertEqual(set(RevokedToken.objects.values_list('jti', flat=True)), {'expiring', 'live'})
+
+    def test_cache_blacklist_needs_shared_cache(self):
+        with override_settings(TOKEN_BLACKLIST_BACKEND='apps.users.blacklist.CacheBlacklist'):
+            self.assertEqual([error.id for error in check_blacklist_cache(None)], ['users.E001'])
+            with tempfile.TemporaryDirectory() as location, override_settings(CACHES=shared_cache(location)):
+                self.assertEqual(check_blacklist_cache(None), [])
+        self.assertEqual(check_blacklist_cache(None), [])
+
+
+@override_settings(OUTSTANDING_TOKEN_DEFERRED=True, OUTSTANDING_TOKEN_BATCH_SIZE=3)
+class DeferredOutstandingTokenTests(TransactionTestCase):
+    """Autocommit, as the flusher thread runs, so bad rows fail on insert."""
+
+    def setUp(self):
+        # The tests flush by hand rather than from the thread.
+        self.enterContext(mock.patch('apps.users.outstanding._start_flusher'))
+        self.addCleanup(outstanding.flush)
+        self.user = create_user('user@example.com')
+
+    def mint(self, user, count=1):
+        return [BoxumRefreshToken.for_user(user) for n in range(count)]
+
+    def test_batched(self):
+        outstanding._wake.clear()
+        self.mint(self.user, 2)
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(outstanding._wake.is_set())
+        # A full batch wakes the flusher.
+        self.mint(self.user)
+        self.assertTrue(outstanding._wake.is_set())
+        # One INSERT, with its BEGIN and COMMIT.
+        with self.assertNumQueries(3):
+            self.assertEqual(outstanding.flush(), 3)
+        self.assertEqual(OutstandingToken.objects.filter(user=self.user).count(), 3)
+
+    def test_shutdown_drains_the_buffer(self):
+        tokens = self.mint(self.user, 2)
+        self.addCleanup(outstanding._stopping.clear)
+        self.assertEqual(outstanding.shutdown(), 2)
+        self.assertTrue(outstanding._stopping.is_set())
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list('jti', flat=True)), {token['jti'] for token in tokens},
+        )
+
+    def test_bad_row_only_loses_itself(self):
+        deleted = create_user('deleted@example.com')
+        kept = self.mint(self.user) + self.mint(self.user)
+        self.mint(deleted)
+        CustomUser.objects.filter(pk=deleted.pk).delete()
+        with self.assertLogs('apps.users.outstanding', 'ERROR') as logs:
+            self.assertEqual(outstanding.flush(), 2)
+        self.assertIn('inserting them one at a time', logs.output[0])
+        self.assertIn(f'of user {deleted.pk}', logs.output[1])
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list('jti', flat=True)), {token['jti'] for token in kept},
+        )
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=0, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    REGISTRATION_MAX_ATTEMPTS=2,
+)
+class RegistrationWorkerTests(TestCase):
+    def setUp(self):
+        self.pending = PendingRegistration.objects.create(user_type='client', email='new@example.com', payload={
+            'email': 'new@example.com', 'password': 'correct horse battery', 'first_name': 'New',
+            'last_name': 'Client', 'number': '0400000000', 'address': '1 Test St', 'postcode': '3000',
+            'dob': '1990-01-01', 'company_name': 'New Co',
+        })
+
+    def process(self):
+        self.assertTrue(claim(self.pending.pk))
+        return process_registration(PendingRegistration.objects.get(pk=self.pending.pk))
+
+    def test_done(self):
+        pending = self.process()
+        self.assertEqual(pending.status, 'done')
+        self.assertTrue(pending.user.check_password('correct horse battery'))
+        self.assertNotIn('password', PendingRegistration.objects.get(pk=pending.pk).payload)
+
+    def test_password_queued_hashed(self):
+        payload = dict(self.pending.payload, email='queued@example.com')
+        serializer = ClientSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.pending = enqueue_registration(serializer, 'client')
+        payload = PendingRegistration.objects.get(pk=self.pending.pk).payload
+        self.assertNotIn('correct horse battery', json.dumps(payload))
+        queued = payload['password']
+        self.assertTrue(queued.startswith('md5$'))
+
+        pending = self.process()
+        self.assertEqual(pending.status, 'done')
+        self.assertEqual(pending.user.password, queued)
+        self.assertTrue(pending.user.check_password('correct horse battery'))
+
+    def test_invalid_data_fails(self):
+        PendingRegistration.objects.filter(pk=self.pending.pk).update(payload={'email': 'new@example.com', 'password': 'x'})
+        pending = self.process()
+        self.assertEqual(pending.status, 'failed')
+        self.assertIn('first_name', pending.errors)
+        self.assertNotIn('password', PendingRegistration.objects.get(pk=pending.pk).payload)
+
+    def test_unexpected_error_retried_then_failed(self):
+        with mock.patch('apps.users.serializers.Client.objects.create', side_effect=OSError('disk full')), \
+                self.assertLogs('apps.users.registration', 'ERROR'):
+            pending = self.process()
+            self.assertEqual(pending.status, 'pending')
+            self.assertIn('password', PendingRegistration.objects.get(pk=pending.pk).payload)
+            pending = self.process()
+        self.assertEqual(pending.status, 'failed')
+        self.assertEqual(pending.attempts, 2)
+        self.assertNotIn('password', PendingRegistration.objects.get(pk=pending.pk).payload)
+        self.assertFalse(CustomUser.objects.filter(email='new@example.com').exists())
+        self.assertFalse(claim(pending.pk))
+
+    def test_stale_row_out_of_attempts_failed(self):
+        PendingRegistration.objects.filter(pk=self.pending.pk).update(
+            status='processing', attempts=2, updated_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(requeue_stale(60), (0, 1))
+        pending = PendingRegistration.objects.get(pk=self.pending.pk)
+        self.assertEqual(pending.status, 'failed')
+        self.assertNotIn('password', pending.payload)
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=0, PASSWORD_HASHERS=['apps.users.hashers.PBKDF2PasswordHasher'],
+    PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 1000}},
+)
+class PasswordHashUpgradeTests(TestCase):
+    def setUp(self):
+        self.user = create_user('client@example.com')
+        self.user.set_password('correct horse battery')
+        self.user.save()
+
+    def login(self, password):
+        return EmailMFABackend().authenticate(None, email='client@example.com', password=password)
+
+    def iterations(self):
+        self.user.refresh_from_db()
+        return identify_hasher(self.user.password).decode(self.user.password)['iterations']
+
+    def test_tuned_parameters(self):
+        self.assertEqual(self.iterations(), 1000)
+        with override_settings(PASSWORD_HASHER_PARAMS={}):
+            self.assertEqual(PBKDF2PasswordHasher().iterations, hashers.PBKDF2PasswordHasher.iterations)
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2000}})
+    def test_rehashed_at_login(self):
+        self.assertIsNone(self.login('wrong'))
+        self.assertEqual(self.iterations(), 1000)
+        self.assertEqual(self.login('correct horse battery'), self.user)
+        self.assertEqual(self.iterations(), 2000)
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2000}})
+    def test_rehashed_at_async_login(self):
+        login = async_to_sync(EmailMFABackend().aauthenticate)
+        self.assertEqual(login(None, email='client@example.com', password='correct horse battery'), self.user)
+        self.assertEqual(self.iterations(), 2000)
+
+    def test_password_hash_stats(self):
+        create_user('unusable@example.com', password=make_password(None))
+        with override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2000}}):
+            create_user('new@example.com', password=make_password('correct horse battery'))
+            stdout = StringIO()
+            call_command('password_hash_stats', stdout=stdout)
+        # Unusable passwords have nothing to rehash.
+        self.assertIn('1 of 3 (33.3%) are not on the current parameters', stdout.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HashingBusyTests(TestCase):
+    def setUp(self):
+        # One slot, on a thread rather than a worker process.
+        self.service = hashing.HashingService(1, 0, 2, {})
+        self.service._executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.service.shutdown)
+        self.enterContext(mock.patch('apps.users.hashing.get_service', return_value=self.service))
+        self.user = create_user('busy@example.com')
+        self.user.set_password('correct horse battery')
+        self.user.save()
+        # Every slot taken.
+        self.service._slots.acquire()
+
+    def test_api_request_answered_503(self):
+        response = self.client.post(reverse('token_login'), {'email': 'busy@example.com', 'password': 'correct horse battery'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+
+    async def test_async_view_answered_503(self):
+        request = AsyncRequestFactory().post(
+            '/', {'email': 'busy@example.com', 'password': 'correct horse battery'}, content_type='application/json',
+        )
+        response = await AsyncLoginView.as_view()(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+
+    def test_shed_load_raises(self):
+        with hashing.shed_load(), self.assertRaises(hashing.HashingBusy):
+            hashing.make_password('secret')
+
+    def test_outside_api_requests_waits(self):
+        # The admin, management commands and backends queue instead.
+        release = threading.Timer(0.05, self.service._slots.release)
+        release.start()
+        self.addCleanup(release.join)
+        self.assertTrue(self.user.check_password('correct horse battery'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportSuppliersTests(TestCase):
+    fields = [
+        'email', 'password', 'first_name', 'last_name', 'number', 'address', 'postcode', 'dob', 'company_name',
+        'company_number', 'company_address', 'company_postcode', 'company_type', 'company_description',
+        'company_logo', 'subcategories',
+    ]
+
+    def row(self, email, **fields):
+        return dict({
+            'email': email, 'password': '', 'first_name': 'Sam', 'last_name': 'Lee', 'number': '0400000000',
+            'address': '1 Dock Rd', 'postcode': '3000', 'dob': '1980-01-01', 'company_name': 'Dock Freight',
+            'company_number': '12345678', 'company_address': '1 Dock Rd', 'company_postcode': '3000',
+            'company_type': 'logistics', 'company_description': 'Freight.', 'company_logo': 'logos/dock.png',
+            'subcategories': 'freight, pallets',
+        }, **fields)
+
+    def import_rows(self, rows, file_format, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=f'.{file_format}', delete=False, newline='') as handle:
+            if file_format == 'csv':
+                writer = csv.DictWriter(handle, self.fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                handle.writelines(json.dumps(row) + '\n' for row in rows)
+        self.addCleanup(os.remove, handle.name)
+        stdout, stderr = StringIO(), StringIO()
+        # The import publishes the new emails to the membership filter once it
+        # commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_suppliers', handle.name, workers=0, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), [json.loads(line) for line in stderr.getvalue().splitlines()]
+
+    def test_csv(self):
+        create_user('taken@example.com')
+        output, errors = self.import_rows([
+            self.row('one@example.com', password='correct horse battery', company_postcode=' sw1a 1aa'),
+            self.row('two@example.com'),
+            self.row('one@example.com'),
+            self.row('taken@example.com'),
+            self.row('bad@example.com', dob='yesterday'),
+        ], 'csv', chunk_size=2)
+        self.assertIn('2 created, 2 skipped, 1 errors', output)
+        self.assertEqual([(error['line'], list(error['errors'])) for error in errors], [(6, ['dob'])])
+
+        supplier = Supplier.objects.get(user__email='one@example.com')
+        self.assertEqual(supplier.user.user_type, 'supplier')
+        self.assertTrue(supplier.user.check_password('correct horse battery'))
+        self.assertEqual(supplier.company_postcode, 'SW1A 1AA')
+        self.assertEqual(sorted(supplier.subcategory_tags.values_list('slug', flat=True)), ['freight', 'pallets'])
+        self.assertFalse(Supplier.objects.get(user__email='two@example.com').user.has_usable_password())
+        self.assertEqual(lookup_user_type('two@example.com'), 'supplier')
+
+    def test_jsonl(self):
+        output, errors = self.import_rows([self.row('one@example.com'), self.row('two@example.com')], 'jsonl')
+        self.assertIn('2 created, 0 skipped, 0 errors', output)
+        self.assertEqual(errors, [])
+        self.assertEqual(Supplier.objects.count(), 2)
+
+
+def logo_upload(name, colour):
+    output = BytesIO()
+    Image.new('RGB', (32, 32), colour).save(output, 'PNG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+
+@override_settings(LOGO_VARIANT_SIZES=(16,))
+class SupplierLogoUpdateTests(AuthenticationMixin, TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        self.addCleanup(self.media.cleanup)
+        self.user = create_user('supplier@example.com', 'supplier')
+        self.supplier = Supplier.objects.create(
+            user=self.user, company_name='Pipes & Co', company_number='12345678', company_address='3 Industrial Rd',
+            company_postcode='3000', company_type='plumbing', company_description='Plumbing.',
+            company_logo='logos/old.png', company_logo_variants={'16': {'png': 'logos/variants/old-16.png'}},
+            subcategories='gas',
+        )
+        self.authenticate(self.user)
+
+    def upload(self, logo):
+        with mock.patch('apps.users.serializers.schedule_variants') as schedule:
+            response = self.client.put(
+                reverse('update-user'), data=encode_multipart(BOUNDARY, {'company_logo': logo}),
+                content_type=MULTIPART_CONTENT,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.supplier.refresh_from_db()
+        return schedule
+
+    def test_new_logo_stored_by_content_hash(self):
+        schedule = self.upload(logo_upload('My Logo.PNG', 'red'))
+        name = self.supplier.company_logo.name
+        self.assertRegex(name, r'^logos/[0-9a-f]{64}\.png$')
+        self.assertTrue(default_storage.exists(name))
+        # The old logo's variants are gone until the new ones are made.
+        self.assertEqual(self.supplier.company_logo_variants, {})
+        schedule.assert_called_once_with(self.supplier.pk)
+
+        variants = generate_variants(self.supplier)
+        self.supplier.refresh_from_db()
+        self.assertEqual(self.supplier.company_logo_variants, variants)
+        self.assertTrue(variants['16']['png'].startswith(f'logos/variants/{name[6:-4]}-16'))
+
+        # The same image again is deduplicated and changes nothing.
+        schedule = self.upload(logo_upload('copy.png', 'red'))
+        self.assertEqual(self.supplier.company_logo.name, name)
+        self.assertEqual(self.supplier.company_logo_variants, variants)
+        schedule.assert_not_called()
+
+
+@override_settings(CHECK_IF_CLIENT_BURST=3, CHECK_IF_CLIENT_RATE=0.001)
+class CheckIfClientThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def statuses(self, forwarded_for):
+        url = reverse('check-if-client', args=['someone@example.com'])
+        return [self.client.get(url, HTTP_X_FORWARDED_FOR=ip).status_code for ip in forwarded_for]
+
+    def test_forwarded_for_ignored_without_proxies(self):
+        # A client can't get a fresh bucket per request by rotating the header.
+        self.assertEqual(self.statuses([f'10.0.0.{n}' for n in range(5)]), [200, 200, 200, 429, 429])
+
+    def test_forwarded_for_trusted_behind_proxy(self):
+        rest_framework = dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            self.assertEqual(self.statuses([f'10.0.0.{n}' for n in range(5)]), [200] * 5)
+            # The proxy appends the address it saw; anything before it is the
+            # client's own claim and doesn't change the bucket.
+            self.assertEqual(self.statuses([f'10.1.1.{n}, 198.51.100.9' for n in range(4)]), [200, 200, 200, 429])
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=0, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncViewTests(AuthenticationMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('client@example.com', first_name='Ada')
+        self.user.set_password('correct horse battery')
+        self.user.save()
+        Client.objects.create(user=self.user, company_name='Ada Co')
+
+    def call(self, view, method='get', data=None, **kwargs):
+        # The headers the test client sends, for the sync views.
+        headers = {'Authorization': self.client.defaults['HTTP_AUTHORIZATION']} if self.client.defaults else {}
+        if method == 'post':
+            request = AsyncRequestFactory().post('/', data, content_type='application/json', headers=headers)
+        else:
+            request = AsyncRequestFactory().get('/', data, headers=headers)
+        response = async_to_sync(view.as_view())(request, **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    def test_login(self):
+        status, body = self.call(AsyncLoginView, 'post', {'email': 'client@example.com', 'password': 'correct horse battery'})
+        self.assertEqual(status, 200)
+        self.assertEqual(AccessToken(body['access'])['user_id'], self.user.pk)
+        status, body = self.call(AsyncLoginView, 'post', {'email': 'client@example.com', 'password': 'wrong'})
+        self.assertEqual((status, body), (401, {'detail': 'Invalid credentials'}))
+
+    def test_token_refresh(self):
+        refresh = str(BoxumRefreshToken.for_user(self.user))
+        status, body = self.call(AsyncTokenRefreshView, 'post', {'refresh': refresh})
+        self.assertEqual(status, 200)
+        self.assertEqual(AccessToken(body['access'])[USER_TYPE_CLAIM], 'client')
+        self.assertEqual(self.call(AsyncTokenRefreshView, 'post', {'refresh': 'garbage'})[0], 401)
+
+    def test_user_details_match_sync_view(self):
+        self.authenticate(self.user)
+        expected = self.client.get(reverse('user-details')).json()
+        self.assertEqual(self.call(AsyncUserDetailsView), (200, expected))
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.call(AsyncUserDetailsView)[0], 401)
+
+    def test_check_if_client(self):
+        self.assertEqual(
+            self.call(AsyncCheckIfClientView, email='client@example.com'), (200, {'is_client': True, 'user_exists': True}),
+        )
+        self.assertEqual(
+            self.call(AsyncCheckIfClientView, email='nobody@example.com'), (200, {'is_client': False, 'user_exists': False}),
+        )
+
+
+class MembershipTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.enterContext(override_settings(CACHES=shared_cache(location.name)))
+        # This process's filter, fresh for each test.
+        self.enterContext(mock.patch('apps.users.membership._filter', MembershipFilter()))
+        self.create_user('old@example.com', 'client')
+
+    def create_user(self, email, user_type='supplier'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_user(email, user_type)
+
+    def test_new_user_seen_by_other_processes(self):
+        # Another worker's filter, built before the user existed.
+        other_process = MembershipFilter()
+        self.assertFalse(other_process.might_contain('new@example.com', cache.get(GENERATION_CACHE_KEY)))
+
+        self.create_user('new@example.com')
+        # Caught up from the cache's change log, without rebuilding.
+        with self.assertNumQueries(0):
+            self.assertTrue(other_process.might_contain('new@example.com', cache.get(GENERATION_CACHE_KEY)))
+
+        # Even with the per-email entry gone, the lookup finds the user.
+        cache.delete(member_cache_key('new@example.com'))
+        with mock.patch('apps.users.membership._filter', other_process):
+            self.assertEqual(lookup_user_type('new@example.com'), 'supplier')
+            self.assertIsNone(lookup_user_type('nobody@example.com'))
+
+    def test_lost_change_log_rebuilds(self):
+        other_process = MembershipFilter()
+        other_process.might_contain('new@example.com', cache.get(GENERATION_CACHE_KEY))
+        self.create_user('new@example.com')
+        cache.clear()
+        self.assertTrue(other_process.might_contain('new@example.com', cache.get(GENERATION_CACHE_KEY)))
+
+    def test_lookups_during_rebuild(self):
+        other_process = MembershipFilter()
+        generation = cache.get(GENERATION_CACHE_KEY)
+        other_process.might_contain('old@example.com', generation)
+        # Expired, with another thread rebuilding it: the old filter still
+        # answers while it is at the shared generation.
+        other_process.expires, other_process.rebuilding = 0, True
+        with self.assertNumQueries(0):
+            self.assertFalse(other_process.might_contain('new@example.com', generation))
+            self.assertTrue(other_process.might_contain('old@example.com', generation))
+        # Once it is behind, the database has to answer.
+        self.create_user('new@example.com')
+        with self.assertNumQueries(0):
+            self.assertTrue(other_process.might_contain('nobody@example.com', cache.get(GENERATION_CACHE_KEY)))
+
+    def test_email_change(self):
+        user = CustomUser.objects.get(email='old@example.com')
+        self.assertEqual(lookup_user_type('old@example.com'), 'client')
+        user.email = 'changed@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertIsNone(lookup_user_type('old@example.com'))
+        self.assertEqual(lookup_user_type('changed@example.com'), 'client')
+
+
+@query_budget(1)
+def repeated_queries_view(request):
+    for user in CustomUser.objects.all():
+        # One query per user: the N+1 the middleware should report.
+        Client.objects.filter(user=user).exists()
+    return HttpResponse()
+
+
+def unbudgeted_view(request):
+    return HttpResponse()
+
+
+def large_json_view(request):
+    return JsonResponse({'numbers': list(range(500))})
+
+
+urlpatterns = [
+    path('repeated/', repeated_queries_view, name='repeated-queries'),
+    path('unbudgeted/', unbudgeted_view, name='unbudgeted'),
+    path('large/', large_json_view, name='large-json'),
+    path('mfa/enable/', EnableMFAView.as_view(), name='enable_mfa'),
+    path('metrics', metrics_view, name='metrics'),
+]
+
+
+class QueryBudgetTests(AuthenticationMixin, QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for user_type in ('client', 'supplier'):
+            user = create_user(
+                f'{user_type}@example.com', user_type, first_name='Budget', last_name='User',
+                number='0400000000', address='1 Test St', postcode='3000',
+            )
+            if user_type == 'client':
+                Client.objects.create(user=user, company_name='Client Co')
+            else:
+                Supplier.objects.create(
+                    user=user, company_name='Supplier Co', company_number='12345678',
+                    company_address='3 Industrial Rd', company_postcode='3000', company_type='plumbing',
+                    company_description='Plumbing.', company_logo='logos/supplier.png', subcategories='gas',
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_user_details(self):
+        for email in ('client@example.com', 'supplier@example.com'):
+            self.authenticate(CustomUser.objects.get(email=email))
+            response = self.assertWithinQueryBudget('get', reverse('user-details'))
+            self.assertEqual(response.status_code, 200)
+            with self.assertMaxQueries(0):
+                self.client.get(reverse('user-details'))
+
+    def test_update_user(self):
+        for email, field in (('client@example.com', 'company_name'), ('supplier@example.com', 'company_description')):
+            self.authenticate(CustomUser.objects.get(email=email))
+            response = self.assertWithinQueryBudget(
+                'put', reverse('update-user'), data={'first_name': 'Renamed', field: 'Updated'},
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_fails(self):
+        with self.assertRaisesMessage(AssertionError, 'Repeated 2x'):
+            with self.assertMaxQueries(1):
+                for user in CustomUser.objects.all():
+                    Client.objects.filter(user=user).exists()
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_budget_setting(self):
+        with self.assertRaisesMessage(AssertionError, 'more than 1'):
+            self.assertWithinQueryBudget('get', reverse('repeated-queries'))
+        with override_settings(QUERY_BUDGETS={'repeated-queries': 3}):
+            self.assertWithinQueryBudget('get', reverse('repeated-queries'))
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_no_budget_fails(self):
+        with self.assertRaisesMessage(AssertionError, 'declares no query budget'):
+            self.assertWithinQueryBudget('get', reverse('unbudgeted'))
+
+    @override_settings(ROOT_URLCONF=__name__, QUERY_BUDGET_CHECKS=True)
+    def test_middleware_logs_repeated_queries(self):
+        with self.assertLogs('apps.users.querybudget', 'WARNING') as logs:
+            self.client.get(reverse('repeated-queries'))
+        self.assertIn('over its budget of 1', logs.output[0])
+        self.assertIn('ran the same query 2 times', logs.output[1])
+        self.assertIn('repeated_queries_view', logs.output[1])
+
+    def test_middleware_disabled(self):
+        with override_settings(QUERY_BUDGET_CHECKS=False), self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(lambda request: None)
+
+
+@override_settings(ROOT_URLCONF=__name__, METRICS_ENABLED=True, METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.enterContext(mock.patch('apps.users.metrics.registry', self.registry))
+
+    def test_middleware_records_views(self):
+        create_user('client@example.com')
+        self.client.get(reverse('repeated-queries'))
+        self.client.get('/nowhere/')
+        histograms = {(name, labels.get('view')): histogram for name, labels, histogram in self.registry.histograms()}
+        self.assertEqual(histograms['http_request_duration_seconds', 'repeated-queries'].count, 1)
+        self.assertEqual(histograms['http_request_db_queries', 'repeated-queries'].sum, 2)
+        self.assertEqual(histograms['http_request_duration_seconds', 'unmatched'].count, 1)
+
+    def test_render_prometheus(self):
+        registry = Registry(buckets={'size': (1, 10)})
+        registry.observe('size', 5, view='a "b"')
+        registry.observe('size', 50, view='a "b"')
+        registry.inc('hits_total', cache='profile')
+        self.assertEqual(render_prometheus(registry), '\n'.join([
+            '# TYPE size histogram',
+            'size_bucket{view="a \\"b\\"",le="1"} 0',
+            'size_bucket{view="a \\"b\\"",le="10"} 1',
+            'size_bucket{view="a \\"b\\"",le="+Inf"} 2',
+            'size_sum{view="a \\"b\\""} 55.0',
+            'size_count{view="a \\"b\\""} 2',
+            '# TYPE hits_total counter',
+            'hits_total{cache="profile"} 1',
+        ]) + '\n')
+
+    def test_scrape_reports_every_process(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('unbudgeted'))
+            # Another worker's metrics, as it writes them.
+            other_process = Registry()
+            other_process.observe('http_request_duration_seconds', 0.2, view='unbudgeted', method='GET', status='2xx')
+            other_process.inc('cache_lookups_total', cache='profile', result='hit')
+            with open(f'{directory}/other.json', 'w') as file:
+                json.dump(other_process.snapshot(), file)
+
+            self.registry.inc('cache_lookups_total', cache='profile', result='hit')
+            response = self.client.get(reverse('metrics'))
+        metrics = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="2xx",view="unbudgeted"} 2', metrics)
+        self.assertIn('cache_lookups_total{cache="profile",result="hit"} 2', metrics)
+
+
+class MFAEnrollmentTests(AuthenticationMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.authenticate(create_user('client@example.com'))
+
+    def enroll(self, qr_format='png'):
+        response = self.client.get(reverse('enable_mfa'), {'qr_format': qr_format})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rendered_once(self):
+        with mock.patch('apps.users.mfa.build_enrollment', wraps=build_enrollment) as build:
+            first = self.enroll()
+            self.assertEqual(self.enroll(), first)
+        build.assert_called_once()
+        self.assertEqual(first['format'], 'png')
+        self.assertTrue(base64.b64decode(first['qr_code']).startswith(b'\x89PNG'))
+
+    def test_svg(self):
+        enrollment = self.enroll('svg')
+        self.assertIn('<svg', enrollment['qr_code'])
+        self.assertEqual(enrollment['provisioning_uri'], self.enroll()['provisioning_uri'])
+        self.assertEqual(self.client.get(reverse('enable_mfa'), {'qr_format': 'gif'}).status_code, 400)
+
+    def test_confirm_drops_cached_enrollment(self):
+        self.enroll()
+        device = TOTPDevice.objects.get(confirmed=False)
+        code = pyotp.TOTP(base64.b32encode(bytes.fromhex(device.key)).decode()).now()
+        response = self.client.post(reverse('confirm_mfa'), {'mfa_code': code})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get(enrollment_cache_key(device.key, 'png')))
+
+    def test_delete_drops_cached_enrollment(self):
+        self.enroll('svg')
+        device = TOTPDevice.objects.get(confirmed=False)
+        device.delete()
+        self.assertIsNone(cache.get(enrollment_cache_key(device.key, 'svg')))
+        # A new device, with a new secret.
+        self.assertNotIn(device.key, self.enroll('svg')['provisioning_uri'])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class CompressionTests(AuthenticationMixin, TestCase):
+    def setUp(self):
+        self.authenticate(create_user('client@example.com'))
+
+    def test_gzip_padded(self):
+        response = self.client.get(reverse('large-json'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        # The random padding goes in the FNAME header field.
+        self.assertTrue(response.content[3] & gzip.FNAME)
+        self.assertEqual(json.loads(gzip.decompress(response.content)), {'numbers': list(range(500))})
+
+    def test_no_brotli_for_secrets(self):
+        with mock.patch('apps.users.compression.brotli') as brotli:
+            brotli.compress.return_value = b'brotli'
+            response = self.client.get(reverse('large-json'), HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            response = self.client.get(reverse('enable_mfa'), HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('secret=', json.loads(gzip.decompress(response.content))['provisioning_uri'])
+        brotli.compress.assert_called_once()
+
+    def test_etag_of_compressed_response(self):
+        response = self.client.get(reverse('enable_mfa'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = self.client.get(reverse('enable_mfa'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # Uncompressed, the same content gets the strong ETag.
+        response = self.client.get(reverse('enable_mfa'))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['ETag'], etag[2:])
+
+
+class ORJSONTests(TestCase):
+    data = {
+        'price': decimal.Decimal('12.50'),
+        'dob': datetime.date(1990, 1, 31),
+        'created_at': datetime.datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'detail': gettext_lazy('Not found.'),
+        1: 'non-string key',
+        'separator': 'line\u2028break',
+    }
+
+    def parse(self, content, encoding='utf-8'):
+        return ORJSONParser().parse(BytesIO(content), parser_context={'encoding': encoding})
+
+    def test_same_output_as_drf(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        context = {'indent': 2}
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, renderer_context=context),
+            JSONRenderer().render(self.data, renderer_context=context),
+        )
+
+    def test_round_trip(self):
+        # As DRF's encoder: Decimals outside a DecimalField become numbers.
+        self.assertEqual(self.parse(ORJSONRenderer().render(self.data)), {
+            'price': 12.5,
+            'dob': '1990-01-31',
+            'created_at': '2026-01-02T03:04:05.678000Z',
+            'id': '12345678-1234-5678-1234-567812345678',
+            'detail': 'Not found.',
+            '1': 'non-string key',
+            'separator': 'line\u2028break',
+        })
+
+    def test_parse_errors(self):
+        for content in (b'{"email": ', b'{"amount": NaN}'):
+            with self.assertRaises(ParseError):
+                self.parse(content)
+
+    def test_without_orjson(self):
+        with mock.patch('apps.users.renderers.orjson', None), mock.patch('apps.users.parsers.orjson', None):
+            content = ORJSONRenderer().render(self.data)
+            self.assertEqual(content, JSONRenderer().render(self.data))
+            self.assertEqual(self.parse(content)['id'], '12345678-1234-5678-1234-567812345678')
+
+    def test_other_encodings(self):
+        self.assertEqual(self.parse('{"name": "Zoë"}'.encode('latin-1'), 'latin-1'), {'name': 'Zoë'})
+
+
+class HotPathIndexTests(TestCase):
+    def indexes(self, table):
+        with connections['default'].cursor() as cursor:
+            constraints = connections['default'].introspection.get_constraints(cursor, table)
+        return {name for name, constraint in constraints.items() if constraint['index']}
+
+    def test_indexes(self):
+        self.assertLessEqual(
+            {'users_customuser_email_ci_idx', 'users_customuser_type_id_idx'}, self.indexes('users_customuser'),
+        )
+        self.assertLessEqual(
+            {'users_supplier_type_user_idx', 'users_supplier_type_pc_idx'}, self.indexes('users_supplier'),
+        )
+        self.assertIn('otp_totp_user_confirmed_idx', self.indexes('otp_totp_totpdevice'))
+
+    def test_no_hot_query_scans(self):
+        stdout = StringIO()
+        call_command('explain_hotpaths', fail_on_scan=True, stdout=stdout)
+        self.assertIn(f'{len(HOT_PATHS)} of {len(HOT_PATHS)} hot queries avoid full table scans.', stdout.getvalue())
+
+
+@override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'client{n}', email=f'client{n}@example.com', user_type='client') for n in range(7)
+        ])
+        cls.admin = create_user('admin@example.com', 'supplier', is_staff=True, is_superuser=True)
+
+    def paginator(self, page_number):
+        clients = CustomUser.objects.filter(user_type='client').order_by('pk')
+        return EstimatedCountPaginator(clients, 2, page_number=page_number)
+
+    def test_filtered_count_past_limit(self):
+        paginator = self.paginator(page_number=1)
+        self.assertEqual(paginator.count, 4)
+        self.assertEqual(str(paginator.count), '4+')
+        # The page after the requested one can always be reached.
+        self.assertEqual(paginator.num_pages, 2)
+
+        paginator = self.paginator(page_number=3)
+        self.assertEqual(str(paginator.count), '7')
+        self.assertEqual(len(paginator.page(4).object_list), 1)
+
+    @mock.patch.object(CustomUserAdmin, 'list_per_page', 2)
+    def test_changelist_pages_past_limit(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:users_customuser_changelist')
+        response = self.client.get(url, {'user_type__exact': 'client'})
+        self.assertContains(response, '4+')
+        response = self.client.get(url, {'user_type__exact': 'client', 'p': 3})
+        self.assertEqual(response.status_code, 200)
+        # Newest first.
+        self.assertContains(response, 'client1@example.com')
+
+
+class BackfillTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{n}', email=f'user{n}@example.com', address='') for n in range(10)
+        ])
+
+    def backfill(self):
+        return Backfill(
+            'user-addresses', CustomUser.objects.filter(address=''),
+            lambda batch: batch.update(address='Unknown'), batch_size=3, pause=0,
+        )
+
+    def test_resume(self):
+        progress = self.backfill().run(max_batches=2)
+        self.assertIsNone(progress.finished_at)
+        # The batch size grows while batches are quick.
+        self.assertTrue(6 <= progress.rows_done < 10)
+        self.assertEqual(CustomUser.objects.filter(address='').count(), 10 - progress.rows_done)
+
+        progress = self.backfill().run()
+        self.assertIsNotNone(progress.finished_at)
+        self.assertEqual(progress.rows_done, 10)
+        self.assertFalse(CustomUser.objects.filter(address='').exists())
+        self.assertEqual(BackfillProgress.objects.get(name='user-addresses').last_pk, str(progress.last_pk))
+
+    def test_restart(self):
+        self.backfill().run()
+        CustomUser.objects.update(address='')
+        self.assertEqual(self.backfill().run().rows_done, 10)
+        self.assertTrue(CustomUser.objects.filter(address='').exists())
+        self.assertEqual(self.backfill().run(restart=True).rows_done, 10)
+        self.assertFalse(CustomUser.objects.filter(address='').exists())
+
+    def test_add_field_online_rejects_blocking_fields(self):
+        AddFieldOnline('customuser', 'nickname', models.CharField(max_length=20, null=True))
+        for field in (
+            models.CharField(max_length=20),
+            models.CharField(max_length=20, null=True, default=''),
+            models.CharField(max_length=20, null=True, unique=True),
+        ):
+            with self.assertRaises(ValueError):
+                AddFieldOnline('customuser', 'nickname', field)
+
+
+@override_settings(ONLINE_MIGRATION_LOCK_TIMEOUT=2, ONLINE_MIGRATION_LOCK_RETRIES=3)
+class LockTimeoutTests(TestCase):
+    def schema_editor(self, atomic):
+        return mock.Mock(connection=mock.MagicMock(vendor='postgresql', alias='default', in_atomic_block=atomic))
+
+    def lock_timeout(self):
+        # As raised by psycopg for lock_timeout.
+        cause = Exception('canceling statement due to lock timeout')
+        cause.pgcode = '55P03'
+        error = OperationalError(*cause.args)
+        error.__cause__ = cause
+        return error
+
+    @mock.patch('apps.users.online_migrations.time.sleep')
+    def test_retries_outside_transaction(self, sleep):
+        apply = mock.Mock(side_effect=[self.lock_timeout(), self.lock_timeout(), 'done'])
+        self.assertEqual(with_lock_timeout(self.schema_editor(atomic=False), apply), 'done')
+        self.assertEqual(apply.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch('apps.users.online_migrations.time.sleep')
+    def test_no_retry_inside_transaction(self, sleep):
+        apply = mock.Mock(side_effect=[self.lock_timeout(), 'done'])
+        with self.assertRaisesMessage(OperationalError, 'set atomic = False'):
+            with_lock_timeout(self.schema_editor(atomic=True), apply)
+        apply.assert_called_once()
+        sleep.assert_not_called()
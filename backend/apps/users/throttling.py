@@ -0,0 +1,80 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+_bucket_lock = threading.Lock()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per client IP: up to ``capacity`` requests in a burst,
+    refilled at ``refill_rate`` tokens per second. The IP is DRF's
+    get_ident, so X-Forwarded-For is only trusted as far as REST_FRAMEWORK's
+    NUM_PROXIES.
+
+    Bucket state is kept in the default cache, so the limit only holds
+    across worker processes when that cache is shared (see users.W001):
+    with a per-process cache every process has its own buckets and a client
+    gets the limit once per process. The lock only serialises this
+    process's threads, so concurrent requests in different processes can
+    occasionally both take the same token.
+    """
+    cache_prefix = 'throttle:bucket:'
+    # Names the bucket; defaults to the view class name.
+    scope = None
+    capacity = 20
+    refill_rate = 1.0
+
+    def bucket_key(self, request, view):
+        return f'{self.cache_prefix}{self.scope or type(view).__name__}:{self.get_ident(request)}'
+
+    def take(self, state, now):
+        """Refill the bucket ``state`` (tokens, last update) up to ``now`` and
+        try to take a token. Returns (allowed, new state)."""
+        tokens, updated = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.wait_seconds = 0 if allowed else (1 - tokens) / self.refill_rate
+        return allowed, (tokens, now)
+
+    def timeout(self):
+        # Time until an empty bucket is full again; idle buckets expire.
+        return math.ceil(self.capacity / self.refill_rate)
+
+    def allow_request(self, request, view):
+        key = self.bucket_key(request, view)
+        with _bucket_lock:
+            allowed, state = self.take(cache.get(key), time.time())
+            cache.set(key, state, self.timeout())
+        return allowed
+
+    async def aallow_request(self, request, view):
+        # For async views: the event loop runs one request at a time
+        # between awaits, so no lock, at the price of an occasional lost
+        # update across threads.
+        key = self.bucket_key(request, view)
+        allowed, state = self.take(await cache.aget(key), time.time())
+        await cache.aset(key, state, self.timeout())
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CheckIfClientThrottle(TokenBucketThrottle):
+    scope = 'check-if-client'
+
+    @property
+    def capacity(self):
+        return settings.CHECK_IF_CLIENT_BURST
+
+    @property
+    def refill_rate(self):
+        return settings.CHECK_IF_CLIENT_RATE
@@ -0,0 +1,76 @@
+from django.utils.translation import gettext_lazy as _
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from .blacklist import get_blacklist_backend
+from .metrics import timer
+from .models import CustomUser
+
+
+# Claims set on every refresh token, and re-read from the database for each
+# access token minted from it, so read-only endpoints can authenticate
+# without loading the user row.
+USER_TYPE_CLAIM = 'user_type'
+IS_ACTIVE_CLAIM = 'is_active'
+MFA_ENABLED_CLAIM = 'mfa_enabled'
+
+
+class BoxumRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user, mfa_enabled=None):
+        with timer('login_stage_seconds', stage='token'), timer('token_mint_seconds', kind='refresh'):
+            return cls._for_user(user, mfa_enabled)
+
+    @classmethod
+    def _for_user(cls, user, mfa_enabled):
+        # Skip BlacklistMixin.for_user, which writes the OutstandingToken row
+        # right away; the blacklist backend decides what to record.
+        token = super(BlacklistMixin, cls).for_user(user)
+
+        if mfa_enabled is None:
+            mfa_enabled = getattr(user, 'mfa_enabled', None)
+        if mfa_enabled is None:
+            mfa_enabled = TOTPDevice.objects.filter(user=user, confirmed=True).exists()
+
+        set_user_claims(token, user, mfa_enabled)
+        get_blacklist_backend().record(token, user)
+        return token
+
+    def check_blacklist(self):
+        if get_blacklist_backend().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        return get_blacklist_backend().blacklist(self)
+
+    @classmethod
+    async def afrom_string(cls, token):
+        """Decode and verify ``token`` like ``cls(token)``, checking the
+        blacklist with the backend's async lookup."""
+        refresh = _UncheckedRefreshToken(token)
+        if await get_blacklist_backend().ais_blacklisted(refresh.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+        return refresh
+
+
+def set_user_claims(token, user, mfa_enabled):
+    token[USER_TYPE_CLAIM] = user.user_type
+    token[IS_ACTIVE_CLAIM] = user.is_active
+    token[MFA_ENABLED_CLAIM] = mfa_enabled
+
+
+def token_users():
+    """Users with the ``mfa_enabled`` flag the claims need, for loading a
+    refresh token's user in one query."""
+    # profile imports the serializers, which import this module.
+    from .profile import annotate_mfa
+
+    return annotate_mfa(CustomUser.objects.all())
+
+
+class _UncheckedRefreshToken(BoxumRefreshToken):
+    # Everything but the blacklist check, which afrom_string does.
+    def check_blacklist(self):
+        pass
@@ -1,14 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
-    ClientCreateView, SupplierCreateView, UserDetailsView, DeleteAccountView,
+    ClientCreateView, SupplierCreateView, RegistrationStatusView, UserDetailsView, DeleteAccountView,
     ChangePasswordView, UpdateUserView, CheckIfClientView,
     MyTokenObtainPairView, MyTokenRefreshView, 
     LoginWithMFAView, MFAValidationView, EnableMFAView, ConfirmMFASetupView, DisableMFAView
 )
+from .async_views import (
+    AsyncLoginView, AsyncTokenRefreshView, AsyncUserDetailsView, AsyncCheckIfClientView, AsyncEnableMFAView
+)
 
 urlpatterns = [
     path('clients/', ClientCreateView.as_view(), name='client-create'),
     path('suppliers/', SupplierCreateView.as_view(), name='supplier-create'),
+    path('registrations/<uuid:pk>/', RegistrationStatusView.as_view(), name='registration-status'),
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
     path('user/', UserDetailsView.as_view(), name='user-details'),
@@ -21,4 +26,17 @@ urlpatterns = [
     path('mfa/enable/', EnableMFAView.as_view(), name='enable_mfa'),
     path('mfa/confirm/', ConfirmMFASetupView.as_view(), name='confirm_mfa'),
     path('mfa/disable/', DisableMFAView.as_view(), name='disable_mfa'),
-]
\ No newline at end of file
+]
+
+# Async views for the same URLs, served in place of the ones above when
+# USERS_ASYNC_VIEWS is set (only worth it under ASGI).
+async_urlpatterns = [
+    path('token/refresh/', AsyncTokenRefreshView.as_view(), name='token_refresh'),
+    path('user/', AsyncUserDetailsView.as_view(), name='user-details'),
+    path('check-if-client/<str:email>/', AsyncCheckIfClientView.as_view(), name='check-if-client'),
+    path('token/login/', AsyncLoginView.as_view(), name='token_login'),
+    path('mfa/enable/', AsyncEnableMFAView.as_view(), name='enable_mfa'),
+]
+
+if settings.USERS_ASYNC_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,5 +1,5 @@
 from rest_framework import generics
-from .models import Client, Supplier, CustomUser
+from .models import Client, Supplier, CustomUser, PendingRegistration
 from .serializers import ClientSerializer, SupplierSerializer, CustomUserSerializer, ChangePasswordSerializer
 from rest_framework import status
 from rest_framework.permissions import AllowAny
@@ -9,53 +9,131 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from .serializers import MyTokenObtainPairSerializer
+from .serializers import MyTokenObtainPairSerializer, MyTokenRefreshSerializer
+from .profile import get_profile, invalidate_profile
+from .authentication import ProfileJWTAuthentication, StatelessJWTAuthentication
+from .tokens import BoxumRefreshToken
+from .registration import enqueue_registration
+from .throttling import CheckIfClientThrottle
+from .membership import lookup_user_type
+from .metrics import timer
+from . import hashing
+from .mfa import QR_FORMATS, get_enrollment, invalidate_enrollment
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from django.conf import settings
 from django.http import JsonResponse
-from django.views import View
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
 
-class MyTokenObtainPairView(TokenObtainPairView):
+class ServiceBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, try again shortly.'
+    default_code = 'hashing_busy'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+class ShedHashingLoadMixin:
+    """
+    For views that hash passwords: while every hashing worker is busy, answer
+    503 with Retry-After rather than queue the request (see
+    apps.users.hashing).
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with hashing.shed_load():
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, hashing.HashingBusy):
+            exc = ServiceBusy(exc.wait)
+        return super().handle_exception(exc)
+
+class MyTokenObtainPairView(ShedHashingLoadMixin, TokenObtainPairView):
+    # Returns tokens; see apps.users.compression.
+    carries_secrets = True
     serializer_class = MyTokenObtainPairSerializer
 
 class MyTokenRefreshView(TokenRefreshView):
-    # You can customize the serializer if needed
-    pass
+    # Returns tokens; see apps.users.compression.
+    carries_secrets = True
+    serializer_class = MyTokenRefreshSerializer
+
+class QueuedRegistrationMixin:
+    """
+    With REGISTRATION_QUEUE_ENABLED, validate the signup and queue it for the
+    registration worker instead of creating the user in the request.
+    Responds 202 with a status URL the client can poll.
+    """
+    user_type = None
 
-class ClientCreateView(generics.CreateAPIView):
+    def create(self, request, *args, **kwargs):
+        if not settings.REGISTRATION_QUEUE_ENABLED:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pending = enqueue_registration(serializer, self.user_type)
+        return Response({
+            'id': str(pending.pk),
+            'status': pending.status,
+            'status_url': reverse('registration-status', args=[pending.pk]),
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ClientCreateView(ShedHashingLoadMixin, QueuedRegistrationMixin, generics.CreateAPIView):
     permission_classes = [AllowAny]
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    user_type = 'client'
 
-class SupplierCreateView(generics.CreateAPIView):
+class SupplierCreateView(ShedHashingLoadMixin, QueuedRegistrationMixin, generics.CreateAPIView):
     permission_classes = [AllowAny]
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
+    user_type = 'supplier'
+
+class RegistrationStatusView(APIView):
+    permission_classes = [AllowAny]
+    # Polled; see apps.users.conditional.
+    conditional_get = True
+
+    def get(self, request, pk):
+        pending = get_object_or_404(PendingRegistration, pk=pk)
+        return Response({
+            'id': str(pending.pk),
+            'status': pending.status,
+            'errors': pending.errors,
+        }, status=status.HTTP_200_OK)
 
 class UserDetailsView(APIView):
+    # Read-only: authenticate from the token claims, the profile lookup below
+    # is the only place that may touch the database.
+    authentication_classes = [StatelessJWTAuthentication]
+    # Served from the read replica; see apps.users.replicas.
+    read_replica = True
+    # ETag and 304 when unchanged; see apps.users.conditional.
+    conditional_get = True
+    # See apps.users.querybudget.
+    query_budget = 1
+
     def get(self, request):
-        user = request.user
-        user_data = CustomUserSerializer(user).data
-        
-        # Add MFA status based on confirmed TOTP device
-        from .views import user_has_mfa  # or import from the appropriate module
-        user_data['mfa_enabled'] = user_has_mfa(user)
-        
-        if user.user_type == 'client':
-            client_data = ClientSerializer(user.client).data
-            user_data['client'] = client_data
-        elif user.user_type == 'supplier':
-            supplier_data = SupplierSerializer(user.supplier).data
-            user_data['supplier'] = supplier_data
-        
-        return Response(user_data)
+        # User, client/supplier row and MFA state come from one query and are
+        # cached per user until one of the write views below invalidates them.
+        try:
+            return Response(get_profile(request.user.pk))
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
     
 class DeleteAccountView(APIView):
     def delete(self, request, *args, **kwargs):
         user = request.user
+        user_id = user.pk
         user.delete()
+        invalidate_profile(user_id)
         return JsonResponse({'message': 'Account deleted successfully'}, status=200)
     
-class ChangePasswordView(APIView):
+class ChangePasswordView(ShedHashingLoadMixin, APIView):
     def post(self, request, *args, **kwargs):
         serializer = ChangePasswordSerializer(data=request.data)
         if serializer.is_valid():
@@ -64,22 +142,27 @@ class ChangePasswordView(APIView):
                 return Response({"current_password": ["Current password is incorrect."]}, status=status.HTTP_400_BAD_REQUEST)
             user.set_password(serializer.validated_data['new_password'])
             user.save()
+            invalidate_profile(user.pk)
             return Response({"detail": "Password has been changed successfully."}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
 class UpdateUserView(APIView):
+    # The client/supplier row is loaded with the user.
+    authentication_classes = [ProfileJWTAuthentication]
+    # Saving a supplier also re-tags, re-indexes and re-locates it (see
+    # apps.supplier.signals): 6 of these.
+    query_budget = 9
+
     def put(self, request):
         user = request.user
         user_serializer = CustomUserSerializer(user, data=request.data, partial=True)
+        client_serializer = supplier_serializer = None
 
         if user.user_type == 'client':
             client_serializer = ClientSerializer(user.client, data=request.data, partial=True)
         elif user.user_type == 'supplier':
             supplier_serializer = SupplierSerializer(user.supplier, data=request.data, partial=True)
-        else:
-            client_serializer = None
-            supplier_serializer = None
 
         if user_serializer.is_valid():
             user_serializer.save()
@@ -87,20 +170,21 @@ class UpdateUserView(APIView):
                 client_serializer.save()
             elif supplier_serializer and supplier_serializer.is_valid():
                 supplier_serializer.save()
+            invalidate_profile(user.pk)
             return Response(user_serializer.data, status=status.HTTP_200_OK)
         return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-class CheckIfClientView(View):
+class CheckIfClientView(APIView):
     permission_classes = [AllowAny]
-    
+    # Public and called before login: ignore any stale Authorization header.
+    authentication_classes = []
+    throttle_classes = [CheckIfClientThrottle]
+    read_replica = True
+    conditional_get = True
+
     def get(self, request, email):
-        try:
-            user = CustomUser.objects.get(email=email)
-            if user.user_type == 'client':
-                return JsonResponse({'is_client': True, 'user_exists': True})
-            return JsonResponse({'is_client': False, 'user_exists': True})
-        except CustomUser.DoesNotExist:
-            return JsonResponse({'is_client': False, 'user_exists': False})
+        user_type = lookup_user_type(email)
+        return Response({'is_client': user_type == 'client', 'user_exists': user_type is not None})
         
 
 # MFA:
@@ -111,7 +195,8 @@ from django_otp.plugins.otp_totp.models import TOTPDevice
 
 # Create a temporary MFA token that expires (e.g., 5 minutes)
 def create_temp_mfa_token(user):
-    return signing.dumps({'user_id': user.id})
+    with timer('token_mint_seconds', kind='mfa'):
+        return signing.dumps({'user_id': user.id})
 
 # Validate the temporary token and return the user if valid
 def validate_temp_token(temp_token):
@@ -124,6 +209,9 @@ def validate_temp_token(temp_token):
 
 # Check if the user has an active TOTP device (MFA enabled)
 def user_has_mfa(user):
+    # EmailMFABackend has already loaded this with the user.
+    if getattr(user, 'mfa_enabled', None) is not None:
+        return user.mfa_enabled
     device = TOTPDevice.objects.filter(user=user, confirmed=True).first()
     return device is not None
 
@@ -137,25 +225,31 @@ def verify_mfa_code(user, mfa_code):
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
 
-class LoginWithMFAView(APIView):
+class LoginWithMFAView(ShedHashingLoadMixin, APIView):
+    # Returns tokens; see apps.users.compression.
+    carries_secrets = True
     permission_classes = []  # AllowAny
 
     def post(self, request):
+        with timer('login_stage_seconds', stage='total'):
+            return self.login(request)
+
+    def login(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
         user = authenticate(request, email=email, password=password)
         if user:
             if user_has_mfa(user):
-                temp_token = create_temp_mfa_token(user)
+                with timer('login_stage_seconds', stage='token'):
+                    temp_token = create_temp_mfa_token(user)
                 return Response(
                     {'detail': 'MFA required', 'temp_token': temp_token},
                     status=status.HTTP_202_ACCEPTED
                 )
             else:
                 # No MFA enabled: issue tokens immediately
-                refresh = RefreshToken.for_user(user)
+                refresh = BoxumRefreshToken.for_user(user, mfa_enabled=False)
                 return Response({
                     'refresh': str(refresh),
                     'access': str(refresh.access_token)
@@ -163,6 +257,8 @@ class LoginWithMFAView(APIView):
         return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class MFAValidationView(APIView):
+    # Returns tokens; see apps.users.compression.
+    carries_secrets = True
     permission_classes = []  # AllowAny
 
     def post(self, request):
@@ -170,7 +266,7 @@ class MFAValidationView(APIView):
         mfa_code = request.data.get('mfa_code')
         user = validate_temp_token(temp_token)
         if user and verify_mfa_code(user, mfa_code):
-            refresh = RefreshToken.for_user(user)
+            refresh = BoxumRefreshToken.for_user(user, mfa_enabled=True)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token)
@@ -179,8 +275,6 @@ class MFAValidationView(APIView):
 
 import base64
 import pyotp
-import qrcode
-import io
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -188,7 +282,11 @@ from rest_framework.permissions import IsAuthenticated
 from django_otp.plugins.otp_totp.models import TOTPDevice
 
 class EnableMFAView(APIView):
+    # Returns the TOTP secret; see apps.users.compression.
+    carries_secrets = True
     permission_classes = [IsAuthenticated]
+    # The QR code is the same until the device is confirmed.
+    conditional_get = True
 
     def get(self, request):
         user = request.user
@@ -197,24 +295,12 @@ class EnableMFAView(APIView):
         if not totp_device:
             totp_device = TOTPDevice.objects.create(user=user, name="default", confirmed=False)
         
-        # Convert the device's key from hex to Base32.
-        b32_key = base64.b32encode(bytes.fromhex(totp_device.key)).decode('utf-8')
-        totp = pyotp.TOTP(b32_key)
-        provisioning_uri = totp.provisioning_uri(name=user.email, issuer_name="BoxumCo")
-        
-        # Generate a QR code image for the provisioning URI.
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(provisioning_uri)
-        qr.make(fit=True)
-        img = qr.make_image(fill="black", back_color="white")
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        qr_code_b64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        return Response({
-            'provisioning_uri': provisioning_uri,
-            'qr_code': qr_code_b64,
-        }, status=status.HTTP_200_OK)
+        # ?qr_format=svg returns SVG markup, which is much cheaper to render
+        # than the default base64 PNG. (DRF reserves ?format= for renderers.)
+        image_format = request.query_params.get('qr_format', 'png')
+        if image_format not in QR_FORMATS:
+            return Response({'detail': f'qr_format must be one of {", ".join(QR_FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_enrollment(totp_device, user.email, image_format), status=status.HTTP_200_OK)
 
 class ConfirmMFASetupView(APIView):
     permission_classes = [IsAuthenticated]
@@ -231,6 +317,8 @@ class ConfirmMFASetupView(APIView):
             if totp.verify(mfa_code):
                 totp_device.confirmed = True
                 totp_device.save()
+                invalidate_enrollment(totp_device)
+                invalidate_profile(user.pk)
                 return Response({'detail': 'MFA enabled successfully'}, status=status.HTTP_200_OK)
         return Response({'detail': 'Invalid MFA code or no pending MFA setup'}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -243,6 +331,7 @@ class DisableMFAView(APIView):
         totp_device = TOTPDevice.objects.filter(user=user, confirmed=True).first()
         if totp_device:
             totp_device.delete()  # Remove the MFA device
+            invalidate_profile(user.pk)
             return Response({'detail': 'MFA has been disabled successfully.'}, status=status.HTTP_200_OK)
         else:
             return Response({'detail': 'No active MFA setup found.'}, status=status.HTTP_400_BAD_REQUEST)
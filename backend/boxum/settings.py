@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,7 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.users.metrics.MetricsMiddleware',
+    'apps.users.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'apps.users.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,8 +64,36 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django_otp.middleware.OTPMiddleware',
+    'apps.users.replicas.ReplicaMiddleware',
+    'apps.users.conditional.ConditionalGetMiddleware',
 ]
 
+# Per-view latency and query histograms, cache hit counts and hashing /
+# token minting times, see apps.users.metrics. METRICS_ENDPOINT routes
+# them in Prometheus format at /metrics; set METRICS_TOKEN to require it as
+# a bearer token.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_ENDPOINT = os.environ.get('METRICS_ENDPOINT') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Metrics are kept per process, so with more than one worker a scrape only
+# sees the worker that answers it. Set METRICS_DIR to a directory every
+# worker of the host can write to (and that is emptied when the app is
+# deployed): workers write their metrics there, at most every
+# METRICS_WRITE_SECONDS, and /metrics reports them all.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_WRITE_SECONDS = 5
+
+# Log views that run more queries than their budget, and repeated queries
+# with the stack traces that ran them; see apps.users.querybudget. Budgets
+# are declared on views (query_budget) or here, by URL name.
+QUERY_BUDGET_CHECKS = os.environ.get('QUERY_BUDGET_CHECKS', '1' if DEBUG else '0') == '1'
+QUERY_BUDGETS = {}
+
+# JSON responses of at least this many bytes are compressed with brotli
+# (needs the brotli package) or gzip, see apps.users.compression.
+RESPONSE_COMPRESSION_MIN_SIZE = 512
+RESPONSE_BROTLI_QUALITY = 5
+
 ROOT_URLCONF = 'boxum.urls'
 
 TEMPLATES = [
@@ -79,25 +114,281 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'boxum.wsgi.application'
 
+# Serve login, token refresh, user details, check-if-client and MFA enrollment
+# from the async views in apps.users.async_views. Only worth it under ASGI
+# (boxum.asgi); under WSGI each async view runs in its own event loop.
+USERS_ASYNC_VIEWS = os.environ.get('USERS_ASYNC_VIEWS') == '1'
+# Threads the async views run password hashing and QR rendering on.
+ASYNC_BLOCKING_WORKERS = os.cpu_count() or 4
+
 REST_FRAMEWORK = {
+    # Reverse proxies in front of the app. Throttles identify clients by the
+    # address this many hops back in X-Forwarded-For; with 0, by REMOTE_ADDR
+    # alone, since the header can be set by anyone.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # JSON on orjson where installed, falling back to DRF's own otherwise
+    # (see apps.users.renderers).
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.users.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'apps.users.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# Chosen by the DB_ENGINE environment variable: 'sqlite' (default) or
+# 'postgresql' (needs psycopg, and psycopg[pool] for DB_POOL_MAX_SIZE).
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'boxum'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Seconds a connection is reused across requests.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # A psycopg connection pool shared by the threads of each process.
+        # Django requires CONN_MAX_AGE = 0 with a pool.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # Reuse connections rather than reopening the file and rerunning
+            # the PRAGMAs below on every request.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is
+                # locked".
+                'timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 20)),
+                # Take the write lock at BEGIN, so concurrent transactions
+                # queue up instead of failing when they upgrade to writing.
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets reads run alongside the writer; NORMAL sync is
+                # durable enough in WAL mode and much cheaper.
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DB_ENGINE must be 'sqlite' or 'postgresql', not {DB_ENGINE!r}.")
+
+# A read replica, configured like the primary but for DB_REPLICA_NAME (SQLite
+# file, or database name) and DB_REPLICA_HOST. Views with read_replica = True
+# read from it, see apps.users.replicas. Locally, two SQLite files can stand
+# in for primary and replica, with `manage.py sync_replica` as replication.
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['NAME'] = os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME'])
+    DATABASES['replica']['HOST'] = os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', ''))
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['apps.users.replicas.ReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes.
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# Chosen by the CACHE_BACKEND environment variable:
+# - 'locmem' (default): private to each process. Only for runserver, tests
+#   and other single-process setups.
+# - 'redis': CACHE_URL, e.g. redis://host:6379/0 (needs redis-py).
+# - 'memcached': CACHE_URL, one or more comma-separated host:port (needs
+#   pymemcache).
+# - 'file': the CACHE_URL directory, shared by the processes of one host.
+#
+# Deployments with more than one worker process (gunicorn/uvicorn workers,
+# the registration and import workers) must use a shared backend. Profile
+# invalidation, the email membership cache, replica pinning, the
+# check-if-client token buckets and the cache token blacklist all assume
+# every process sees the same cache; `manage.py check --deploy` warns about
+# locmem.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # The default of 300 entries is far too few for the per-user and
+            # per-email entries cached below.
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_URL', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('CACHE_URL', '127.0.0.1:11211').split(','),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_URL', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+else:
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND must be 'locmem', 'redis', 'memcached' or 'file', not {CACHE_BACKEND!r}."
+    )
+
+# Seconds a cached /api/users/user/ payload is served before it is rebuilt.
+PROFILE_CACHE_TIMEOUT = 300
+
+# Seconds a rendered MFA enrollment QR code is cached for its unconfirmed device.
+MFA_ENROLLMENT_CACHE_TIMEOUT = 900
+
+# Email membership cache behind /api/users/check-if-client/: seconds known
+# and unknown emails are cached, and the Bloom filter of all emails (rebuilt
+# from the database when it expires) with its false positive rate.
+MEMBERSHIP_CACHE_TIMEOUT = 3600
+MEMBERSHIP_NEGATIVE_CACHE_TIMEOUT = 300
+MEMBERSHIP_FILTER_TIMEOUT = 3600
+MEMBERSHIP_FILTER_ERROR_RATE = 0.01
+
+# Token bucket per client IP for /api/users/check-if-client/: burst size and
+# tokens refilled per second.
+CHECK_IF_CLIENT_BURST = 20
+CHECK_IF_CLIENT_RATE = 2.0
+
+# Admin changelists count exactly up to this many rows, and beyond it use
+# the table statistics' estimate, or for filtered lists show e.g. 10000+
+# (apps.users.admin.EstimatedCountPaginator).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+# Most suppliers an admin full-text search returns.
+ADMIN_SEARCH_LIMIT = 200
+# The supplier company type filter lists this many of the most common types,
+# cached for ADMIN_FILTER_CACHE_TIMEOUT seconds.
+ADMIN_COMPANY_TYPE_FILTER_SIZE = 30
+ADMIN_FILTER_CACHE_TIMEOUT = 600
+
+# Online migrations (apps.users.online_migrations). Seconds a schema change
+# waits for its table lock before giving up, and how many times it retries
+# (only in migrations with atomic = False), so it never holds every other
+# query up behind it for long.
+ONLINE_MIGRATION_LOCK_TIMEOUT = 2
+ONLINE_MIGRATION_LOCK_RETRIES = 5
+# `manage.py backfill`: rows per batch to start with (it adapts to keep
+# batches near BACKFILL_TARGET_BATCH_SECONDS), and seconds to pause between
+# batches.
+BACKFILL_BATCH_SIZE = 1000
+BACKFILL_TARGET_BATCH_SECONDS = 0.5
+BACKFILL_PAUSE = 0.1
+
+# Queue client/supplier signups for `manage.py process_registrations` instead
+# of hashing the password and creating the user in the request.
+REGISTRATION_QUEUE_ENABLED = False
+REGISTRATION_WORKERS = 4
+# Times the worker tries a signup that fails for reasons other than its data
+# (storage, database, hashing errors) before marking it failed. The raw
+# password is scrubbed from the payload as soon as a row is done or failed.
+REGISTRATION_MAX_ATTEMPTS = 3
+
+# Dotted path to the supplier full-text search backend. None picks SQLite
+# FTS5 on SQLite and the unindexed database fallback elsewhere.
+SUPPLIER_SEARCH_BACKEND = None
+# Seconds the term lists used for typo-tolerant matching are cached.
+SUPPLIER_SEARCH_VOCABULARY_TIMEOUT = 600
+# Seconds nearest-supplier results are cached per postcode district.
+NEAREST_SUPPLIERS_CACHE_TIMEOUT = 3600
+
+# Supplier logo uploads: largest accepted file and side in pixels, the square
+# sizes resized variants are made at, and the threads that make them.
+LOGO_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+LOGO_MAX_DIMENSION = 2048
+LOGO_VARIANT_SIZES = (64, 256)
+LOGO_WORKERS = 2
+
+FILE_UPLOAD_HANDLERS = [
+    'apps.users.logos.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+# Password hashing (login, signup, password change) runs on this many worker
+# processes per server process, see apps.users.hashing. Up to
+# PASSWORD_HASHING_QUEUE_SIZE more hashes wait for a worker; beyond that API
+# requests get a 503 with Retry-After (seconds), while the admin, commands
+# and background work wait. 0 hashes in the request thread.
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 16))
+PASSWORD_HASHING_RETRY_AFTER = 2
+
+AUTHENTICATION_BACKENDS = [
+    'apps.users.backends.EmailMFABackend',
+]
+
+# Buffer OutstandingToken rows for new refresh tokens and bulk insert them
+# from a background thread every flush interval (seconds) or batch. Off by
+# default: each login then writes its own row.
+OUTSTANDING_TOKEN_DEFERRED = os.environ.get('OUTSTANDING_TOKEN_DEFERRED') == '1'
+OUTSTANDING_TOKEN_FLUSH_INTERVAL = 1.0
+OUTSTANDING_TOKEN_BATCH_SIZE = 200
+
+# Where issued/revoked refresh tokens are tracked: DatabaseBlacklist
+# (simplejwt's tables), CacheBlacklist or RevokedTokenBlacklist, all in
+# apps.users.blacklist; CacheBlacklist needs a shared cache (redis or
+# memcached). Expired entries are removed by
+# `manage.py compact_token_blacklist`, this many rows per delete.
+TOKEN_BLACKLIST_BACKEND = 'apps.users.blacklist.DatabaseBlacklist'
+TOKEN_BLACKLIST_COMPACT_BATCH_SIZE = 5000
+
+
+# Django's default hashers, with the cost parameters of the first one used
+# for new hashes taken from PASSWORD_HASHER_PARAMS, {algorithm: {parameter:
+# value}} (see apps.users.hashers and `manage.py benchmark_hashers`).
+# Changing them rehashes each user's password at their next login.
+PASSWORD_HASHERS = [
+    'apps.users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'apps.users.hashers.Argon2PasswordHasher',
+    'apps.users.hashers.BCryptSHA256PasswordHasher',
+    'apps.users.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHER_PARAMS = {}
 
 
 # Password validation
@@ -163,3 +454,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://localhost:5174",
 ]
+
+# The frontends revalidate GETs with the ETag (see apps.users.conditional).
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
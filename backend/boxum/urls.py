@@ -1,10 +1,16 @@
 # boxum/urls.py
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.users.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('apps.users.urls')),
     path('api/client/', include('apps.client.urls')),
     path('api/supplier/', include('apps.supplier.urls')),
 ]
+
+if settings.METRICS_ENDPOINT:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
@@ -1,4 +1,4 @@
-import axios from 'axios';
+import axios, { type AxiosResponse, type InternalAxiosRequestConfig } from 'axios';
 
 const axiosInstance = axios.create({
   baseURL: 'http://localhost:8000', // Adjust to your backend's base URL
@@ -20,9 +20,44 @@ axiosInstance.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Conditional GETs: remember the ETag and body of each GET response and send
+// If-None-Match next time, so an unchanged response comes back as an empty 304
+// and is answered from here.
+const etagCache = new Map<string, { etag: string; data: unknown }>();
+
+const isGet = (config: InternalAxiosRequestConfig) => (config.method ?? 'get').toLowerCase() === 'get';
+
+axiosInstance.interceptors.request.use((config) => {
+  if (isGet(config)) {
+    const cached = etagCache.get(axiosInstance.getUri(config));
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag;
+    }
+    // Let 304 through to the response interceptor instead of rejecting it.
+    config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+  }
+  return config;
+});
+
+const useCachedBody = (response: AxiosResponse) => {
+  if (!isGet(response.config)) {
+    return response;
+  }
+  const key = axiosInstance.getUri(response.config);
+  if (response.status === 304) {
+    const cached = etagCache.get(key);
+    if (cached) {
+      return { ...response, status: 200, data: cached.data };
+    }
+  } else if (response.headers['etag']) {
+    etagCache.set(key, { etag: response.headers['etag'], data: response.data });
+  }
+  return response;
+};
+
 // Response interceptor: On 401, try to refresh the token and retry the request
 axiosInstance.interceptors.response.use(
-  (response) => response,
+  useCachedBody,
   async (error) => {
     const originalRequest = error.config;
     // If error response is 401 and this request hasn't already been retried